@@ -0,0 +1,1372 @@
+#! /usr/bin/env python
+# -*-coding:utf-8 -*
+
+"""
+Benchmarks for the epath module
+
+run all of them with :
+    python bench.py
+
+run some of them, e.g. bench_hot_paths and bench_glob_scaling, with :
+    python bench.py hot_paths glob_scaling
+
+results are stored in benchmarks/<name>.json with --save <name>, and
+compared with stored ones with --compare <name> : metrics more than
+--threshold (10 % by default) worse are reported as regressions.
+Metrics are times, memory sizes or counts, the lower the better, but
+for the cache hits and throughputs listed in HIGHER_IS_BETTER.
+Only compare results of the same machine, stored files record it.
+    python bench.py hot_paths glob_scaling --save 1.0.0
+    python bench.py hot_paths glob_scaling --compare 1.0.0
+"""
+
+from __future__ import print_function
+import sys
+import os
+import re
+import json
+import platform
+import importlib.util
+import argparse
+import shutil
+import subprocess
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, "benchmarks")
+HEAVY_MODULES = ["cv2", "numpy", "pandas"]
+# metrics compared the other way round : cache hits, hit rates and
+# throughputs
+HIGHER_IS_BETTER = {"hits", "hit_rate", "files_per_s", "mb_per_s"}
+
+
+def bench_import_time(repeat=10):
+    """
+    measures the time of a cold `import epath` in a fresh interpreter
+    and checks that no heavy optional backend is imported with it
+
+    :returns: best import time in milliseconds
+    """
+    code = "\n".join([
+        "import sys, time",
+        "t0 = time.perf_counter()",
+        "from epath import EPath",
+        "t1 = time.perf_counter()",
+        "heavy = [m for m in {!r} if m in sys.modules]".format(HEAVY_MODULES),
+        "print((t1 - t0) * 1000., ','.join(heavy))",
+    ])
+    # bytecode is cached, as it is for an installed package
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    subprocess.check_call([sys.executable, "-c", "import epath"],
+                          cwd=HERE, env=env)
+    timings = []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, "-c", code], cwd=HERE,
+                                      env=env)
+        ms, _, heavy = out.decode().strip().partition(" ")
+        if heavy:
+            raise AssertionError("heavy modules imported with epath : "
+                                 "{}".format(heavy))
+        timings.append(float(ms))
+
+    best = min(timings)
+    print("import epath : best {:.2f} ms, median {:.2f} ms "
+          "(no heavy module imported)".format(
+              best, sorted(timings)[len(timings) // 2]))
+    return best
+
+
+def bench_epath_memory(n=100000):
+    """
+    measures the memory held by n EPath objects built from str,
+    before and after their components have been accessed
+
+    :returns: bytes per EPath (fresh, after components access)
+    """
+    from epath import EPath
+    names = ["/data/exp/run_{}/result_{}.csv".format(i % 100, i)
+             for i in range(n)]
+
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    paths = [EPath(name) for name in names]
+    fresh = (tracemalloc.get_traced_memory()[0] - start) / float(n)
+    for p in paths:
+        p.parent, p.stem, p.suffix, p.basename
+    accessed = (tracemalloc.get_traced_memory()[0] - start) / float(n)
+    tracemalloc.stop()
+
+    print("EPath memory : {:.0f} B/path fresh, {:.0f} B/path after "
+          "parent/stem/suffix/basename".format(fresh, accessed))
+    return fresh, accessed
+
+
+def bench_epath_array_memory(n=100000, long_length=4096):
+    """
+    measures the bytes per path held by n paths as a list of str, a list
+    of EPath and an EPathArray, for paths of similar lengths and for the
+    same paths with a single long_length path among them : NumPy string
+    arrays are fixed width, every element takes 4 bytes per character
+    of the longest path
+
+    :returns: dict of case: (list of str, list of EPath, EPathArray)
+              bytes per path
+    """
+    from epath import EPath, EPathArray
+    uniform = ["/data/exp/run_{}/result_{}.csv".format(i % 100, i)
+               for i in range(n)]
+    mixed = uniform[:-1] + ["/data/" + "x" * (long_length - 10) + ".csv"]
+
+    def held(build):
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        obj = build()
+        size = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+        del obj
+        return size / float(n)
+
+    results = {}
+    for case, names in [("similar lengths", uniform),
+                        ("one {} chars path".format(long_length), mixed)]:
+        strings = (sys.getsizeof(names)
+                   + sum(sys.getsizeof(name) for name in names)) / float(n)
+        epaths = strings + held(lambda: [EPath(name) for name in names])
+        array = held(lambda: EPathArray(names))
+        results[case] = (strings, epaths, array)
+        print("{} paths, {:20s}: list of str {:.0f} B/path, list of EPath "
+              "{:.0f} B/path, EPathArray {:.0f} B/path".format(
+                  n, case, strings, epaths, array))
+    return results
+
+
+def bench_epath_components(number=100000):
+    """
+    measures construction and component access latencies
+
+    :returns: dict of mean latencies in microseconds
+    """
+    from epath import EPath
+    path = EPath("/data/exp/run_1/result_1.ext1.csv")
+    statements = [
+        ("EPath(str)", lambda: EPath("/data/exp/run_1/result_1.csv")),
+        ("EPath(EPath)", lambda: EPath(path)),
+        ("p.parent", lambda: path.parent),
+        ("p.stem.stem", lambda: path.stem.stem),
+        ("p.suffix", lambda: path.suffix),
+        ("p.add_after_stem", lambda: path.add_after_stem("p1")),
+        ("p.replace_suffix", lambda: path.replace_suffix("txt")),
+    ]
+    results = {}
+    for name, stmt in statements:
+        best = min(timeit.repeat(stmt, number=number, repeat=3))
+        results[name] = best / number * 1e6
+        print("{:<20} : {:.3f} us".format(name, results[name]))
+    return results
+
+
+def bench_epath_array(n=100000):
+    """
+    compares renaming n paths in a Python loop of EPath objects
+    against one vectorized EPathArray call
+
+    :returns: (loop seconds, vectorized seconds)
+    """
+    from epath import EPath, EPathArray
+    names = ["/data/exp/run_{}/result_{}.png".format(i % 100, i)
+             for i in range(n)]
+    params = ["{}_{}".format(i % 10, i % 7) for i in range(n)]
+
+    def loop():
+        return [EPath(name).add_after_stem(param).replace_suffix("csv")
+                .replace_parents("/data/csv")
+                for name, param in zip(names, params)]
+
+    def vectorized():
+        return (EPathArray(names).add_after_stem(params).replace_suffix("csv")
+                .replace_parents("/data/csv"))
+
+    loop_time = min(timeit.repeat(loop, number=1, repeat=3))
+    vectorized_time = min(timeit.repeat(vectorized, number=1, repeat=3))
+    print("rename {} paths : loop {:.3f} s, EPathArray {:.3f} s "
+          "(x{:.1f})".format(n, loop_time, vectorized_time,
+                             loop_time / vectorized_time))
+    return loop_time, vectorized_time
+
+
+def make_tree(root, n_files, n_dirs=100, depth=2, suffix=".png"):
+    """creates n_files empty files spread over n_dirs directories
+    nested depth levels below root"""
+    dirs = []
+    for i in range(n_dirs):
+        parts = ["d{}_{}".format(level, (i * (level + 1)) % n_dirs)
+                 for level in range(depth)]
+        dirname = os.path.join(root, *parts)
+        os.makedirs(dirname, exist_ok=True)
+        dirs.append(dirname)
+    for i in range(n_files):
+        fname = os.path.join(dirs[i % len(dirs)],
+                             "frame_{:07d}{}".format(i, suffix))
+        open(fname, "w").close()
+    return root
+
+
+def bench_iglob(n=50000):
+    """
+    compares EPath.glob and EPath.iglob over a synthetic tree :
+    time to the first result, total time and peak memory
+
+    :returns: dict of timings
+    """
+    from epath import EPath
+    tmp = tempfile.mkdtemp()
+    try:
+        make_tree(tmp, n)
+        root = EPath(tmp)
+        results = {}
+        for name, run in [("glob", lambda: iter(root.glob("*/*/*.png"))),
+                          ("iglob", lambda: root.iglob("*/*/*.png"))]:
+            tracemalloc.start()
+            t0 = timeit.default_timer()
+            iterator = run()
+            next(iterator)
+            first = timeit.default_timer() - t0
+            count = 1 + sum(1 for _ in iterator)
+            total = timeit.default_timer() - t0
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[name] = (first, total, peak)
+            print("{:<5} {} files : first result {:.4f} s, total {:.3f} s, "
+                  "peak memory {:.1f} MB".format(name, count, first, total,
+                                                 peak / 1e6))
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+def make_deep_tree(root, depth=4, branching=4, files_per_dir=5):
+    """creates a tree of branching**depth leaf directories,
+    each directory holding files_per_dir files"""
+    if depth < 0:
+        return
+    for i in range(files_per_dir):
+        open(os.path.join(root, "out_{}.csv".format(i)), "w").close()
+    if depth == 0:
+        return
+    for i in range(branching):
+        subdir = os.path.join(root, "level{}_{}".format(depth, i))
+        os.mkdir(subdir)
+        make_deep_tree(subdir, depth - 1, branching, files_per_dir)
+
+
+def bench_parallel_iglob(latency=0.002, workers=(1, 4, 16, 32)):
+    """
+    compares serial and parallel EPath.iglob over a deep synthetic tree,
+    with latency seconds injected in every os.scandir call to simulate
+    a network filesystem round trip (NFS, Lustre)
+
+    :returns: dict of total seconds by number of workers (None = serial)
+    """
+    from epath import EPath
+    tmp = tempfile.mkdtemp()
+    scandir = os.scandir
+
+    def slow_scandir(path):
+        time.sleep(latency)
+        return scandir(path)
+
+    try:
+        make_deep_tree(tmp)
+        root = EPath(tmp)
+        reference = sorted(p.s for p in root.iglob("**/*.csv"))
+        os.scandir = slow_scandir
+        results = {}
+        for n_workers in (None,) + tuple(workers):
+            t0 = timeit.default_timer()
+            found = [p.s for p in root.iglob("**/*.csv", workers=n_workers,
+                                             ordered=True)]
+            results[n_workers] = timeit.default_timer() - t0
+            assert found == reference, "results differ from the serial scan"
+            print("iglob {} files, {:.0f} ms latency, {} : {:.3f} s".format(
+                len(found), latency * 1000,
+                "serial" if n_workers is None
+                else "{} workers".format(n_workers),
+                results[n_workers]))
+        return results
+    finally:
+        os.scandir = scandir
+        shutil.rmtree(tmp)
+
+
+def bench_stat_cache(n=2000, queries=5):
+    """
+    compares exists/is_file/is_dir/file_size/is_readable queries on n
+    files, each asked queries times, with and without the stat cache
+
+    :returns: (seconds without cache, seconds with cache, cache info)
+    """
+    from epath import EPath, StatCache
+    tmp = tempfile.mkdtemp()
+    try:
+        make_tree(tmp, n, n_dirs=10, depth=1)
+        paths = [EPath(p.s) for p in EPath(tmp).iglob("*/*")]
+
+        def run():
+            for _ in range(queries):
+                for p in paths:
+                    p.exists() and p.is_file() and not p.is_dir() \
+                        and p.is_readable() and p.file_size >= 0
+
+        plain = min(timeit.repeat(run, number=1, repeat=3))
+        with StatCache(ttl=60.) as cache:
+            cached = min(timeit.repeat(run, number=1, repeat=3))
+        print("{} queries : {:.3f} s without stat cache, {:.3f} s with "
+              "(hit rate {:.1%})".format(5 * queries * n, plain, cached,
+                                         cache.info()["hit_rate"]))
+        return plain, cached, cache.info()
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_index(n=50000, queries=1000):
+    """
+    builds an EPathIndex over n files, then compares a refresh after a
+    few changes, and glob/exists queries, against the filesystem
+
+    :returns: dict of timings in seconds
+    """
+    from epath import EPath
+    tmp = tempfile.mkdtemp()
+    try:
+        make_tree(tmp, n)
+        root = EPath(tmp)
+        db = os.path.join(tempfile.mkdtemp(), "index.sqlite")
+        results = {}
+        t0 = timeit.default_timer()
+        index = root.build_index(db=db)
+        results["build"] = timeit.default_timer() - t0
+        for i in range(10):
+            root.join("d0_{}/d1_{}/new.png".format(i, 2 * i)).touch()
+        t0 = timeit.default_timer()
+        info = index.refresh()
+        results["refresh"] = timeit.default_timer() - t0
+
+        paths = [root.join("d0_{}/d1_{}/frame_{:07d}.png".format(
+            i % 100, (2 * i) % 100, i)) for i in range(queries)]
+        results["exists_fs"] = min(timeit.repeat(
+            lambda: [p.exists() for p in paths], number=1, repeat=3))
+        results["glob_fs"] = min(timeit.repeat(
+            lambda: root.glob("d0_1*/*/*.png"), number=1, repeat=3))
+        with index:
+            results["exists_index"] = min(timeit.repeat(
+                lambda: [p.exists() for p in paths], number=1, repeat=3))
+            results["glob_index"] = min(timeit.repeat(
+                lambda: root.glob("d0_1*/*/*.png"), number=1, repeat=3))
+        index.close()
+        print("index {} files : build {:.3f} s, refresh {:.3f} s "
+              "({} of {} dirs listed)".format(n, results["build"],
+                                              results["refresh"],
+                                              info["scanned_dirs"],
+                                              info["checked_dirs"]))
+        print("{} exists : {:.4f} s filesystem, {:.4f} s index".format(
+            queries, results["exists_fs"], results["exists_index"]))
+        print("glob : {:.4f} s filesystem, {:.4f} s index".format(
+            results["glob_fs"], results["glob_index"]))
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_async(n=2000):
+    """
+    writes, copies and removes n files with the EPath coroutines while
+    measuring the worst event loop stall with a ticking task
+
+    :returns: (total seconds, worst loop stall in seconds)
+    """
+    import asyncio
+    from epath import EPath, acopy_all, aremove_all
+    tmp = tempfile.mkdtemp()
+    try:
+        src, dst = EPath(tmp).join("src"), EPath(tmp).join("dst")
+        src.mkdir()
+        dst.mkdir()
+        paths = [src.join("file_{}.txt".format(i)) for i in range(n)]
+
+        async def ticker(stop, stalls):
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                await asyncio.sleep(0.001)
+                stalls.append(time.perf_counter() - t0 - 0.001)
+
+        async def run():
+            stop, stalls = asyncio.Event(), []
+            tick = asyncio.ensure_future(ticker(stop, stalls))
+            t0 = time.perf_counter()
+            await asyncio.gather(*(p.awrite("some result\n") for p in paths))
+            await acopy_all(paths, dst)
+            copies = [p async for p in dst.aiglob("*.txt")]
+            await aremove_all(paths + copies)
+            total = time.perf_counter() - t0
+            stop.set()
+            await tick
+            return total, max(stalls)
+
+        total, stall = asyncio.run(run())
+        print("async write+copy+remove of {} files : {:.3f} s, worst loop "
+              "stall {:.1f} ms".format(n, total, stall * 1000))
+        return total, stall
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_copy_files(n=5000, size=64 * 1024):
+    """
+    compares a loop of EPath.copyto with copy_files on n files of size
+    bytes, then a second copy_files where every file is unchanged
+
+    :returns: (loop seconds, CopyReport, CopyReport of the second run)
+    """
+    from epath import EPath, copy_files
+    tmp = tempfile.mkdtemp()
+    try:
+        src, dst1, dst2 = [EPath(os.path.join(tmp, name), mkdir=True)
+                           for name in ("src", "dst1", "dst2")]
+        content = os.urandom(size)
+        paths = []
+        for i in range(n):
+            path = src.join("frame_{}.bin".format(i))
+            with open(path.s, "wb") as fd:
+                fd.write(content)
+            paths.append(path)
+
+        t0 = timeit.default_timer()
+        for path in paths:
+            path.copyto(dst1)
+        loop = timeit.default_timer() - t0
+        first = copy_files(paths, dst2)
+        second = copy_files(paths, dst2)
+        print("copy {} files of {} kB : copyto loop {:.3f} s ({:.0f} MB/s), "
+              "copy_files {:.3f} s ({:.0f} MB/s), unchanged {:.3f} s "
+              "({} skipped)".format(n, size // 1024, loop,
+                                    n * size / 1e6 / loop, first.seconds,
+                                    first.mb_per_s, second.seconds,
+                                    second.skipped))
+        return loop, first, second
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_writer(n=20000):
+    """
+    compares n small appends made with EPath.write against one
+    EPath.writer handle, plain and atomic
+
+    :returns: dict of seconds
+    """
+    from epath import EPath
+    tmp = tempfile.mkdtemp()
+    try:
+        path = EPath(tmp).join("log.txt")
+        records = ["epoch {};loss {:.4f}\n".format(i, 1. / (i + 1))
+                   for i in range(n)]
+        results = {}
+        t0 = timeit.default_timer()
+        for record in records:
+            path.write(record, mode="a")
+        results["write"] = timeit.default_timer() - t0
+        for atomic in (False, True):
+            t0 = timeit.default_timer()
+            with path.writer(atomic=atomic, flush_every=1000) as writer:
+                for record in records:
+                    writer.write(record)
+            results["writer_atomic" if atomic else "writer"] = \
+                timeit.default_timer() - t0
+        print("{} records : write loop {:.3f} s, writer {:.4f} s, "
+              "atomic writer {:.4f} s".format(n, results["write"],
+                                              results["writer"],
+                                              results["writer_atomic"]))
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_imread_batch(n=300, shape=(512, 512, 3), workers=8):
+    """
+    compares a loop of EPath.imread with imread_batch, and a loop of
+    EPath.imwrite with imwrite_batch, on n PNG images
+
+    :returns: dict of seconds, None if OpenCV is not installed
+    """
+    from epath import EPath, imread_batch, imwrite_batch
+    if importlib.util.find_spec("cv2") is None:
+        print("imread_batch : skipped, OpenCV is not installed")
+        return None
+    import numpy as np
+    tmp = tempfile.mkdtemp()
+    try:
+        root = EPath(tmp)
+        rng = np.random.RandomState(0)
+        images = [rng.randint(0, 255, shape).astype(np.uint8)
+                  for _ in range(8)]
+        paths = [root.join("frame_{:05d}.png".format(i)) for i in range(n)]
+        results = {}
+        t0 = timeit.default_timer()
+        for i, path in enumerate(paths):
+            path.imwrite(images[i % len(images)])
+        results["imwrite"] = timeit.default_timer() - t0
+        t0 = timeit.default_timer()
+        imwrite_batch(((path, images[i % len(images)])
+                       for i, path in enumerate(paths)), workers=workers)
+        results["imwrite_batch"] = timeit.default_timer() - t0
+        t0 = timeit.default_timer()
+        for path in paths:
+            path.imread()
+        results["imread"] = timeit.default_timer() - t0
+        t0 = timeit.default_timer()
+        for _ in imread_batch(paths, workers=workers):
+            pass
+        results["imread_batch"] = timeit.default_timer() - t0
+        print("{} images {} : imread loop {:.2f} s, imread_batch {:.2f} s, "
+              "imwrite loop {:.2f} s, imwrite_batch {:.2f} s "
+              "({} workers)".format(n, shape, results["imread"],
+                                    results["imread_batch"],
+                                    results["imwrite"],
+                                    results["imwrite_batch"], workers))
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_image_cache(n_images=20, repeat=50, shape=(512, 512, 3)):
+    """
+    decodes the same n_images reference images repeat times,
+    with and without the image cache
+
+    :returns: (seconds without cache, seconds with cache, cache info),
+              None if OpenCV is not installed
+    """
+    from epath import EPath, ImageCache
+    if importlib.util.find_spec("cv2") is None:
+        print("image cache : skipped, OpenCV is not installed")
+        return None
+    import numpy as np
+    tmp = tempfile.mkdtemp()
+    try:
+        rng = np.random.RandomState(0)
+        paths = [EPath(tmp).join("ref_{}.png".format(i))
+                 for i in range(n_images)]
+        for path in paths:
+            path.imwrite(rng.randint(0, 255, shape).astype(np.uint8))
+
+        def run():
+            for _ in range(repeat):
+                for path in paths:
+                    path.imread()
+
+        t0 = timeit.default_timer()
+        run()
+        plain = timeit.default_timer() - t0
+        with ImageCache(max_bytes=256 * 2 ** 20) as cache:
+            t0 = timeit.default_timer()
+            run()
+            cached = timeit.default_timer() - t0
+        info = cache.info()
+        print("{} reads of {} images : {:.2f} s without cache, {:.3f} s "
+              "with (hit rate {:.1%}, {:.1f} MB held)".format(
+                  n_images * repeat, n_images, plain, cached,
+                  info["hit_rate"], info["bytes"] / 1e6))
+        return plain, cached, info
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_read_buffer(size=200 * 2 ** 20):
+    """
+    reads 1 MB in the middle of a size bytes file, with a full
+    open().read() copy and with EPath.read_buffer
+
+    :returns: dict of (seconds, peak traced memory in bytes)
+    """
+    from epath import EPath
+    tmp = tempfile.mkdtemp()
+    try:
+        path = EPath(tmp).join("features.bin")
+        with open(path.s, "wb") as fd:
+            fd.write(os.urandom(2 ** 20) * (size // 2 ** 20))
+        middle = slice(size // 2, size // 2 + 2 ** 20)
+
+        def full_read():
+            with open(path.s, "rb") as fd:
+                return sum(fd.read()[middle][::4096])
+
+        def buffer_read():
+            return sum(path.read_buffer()[middle][::4096])
+
+        results = {}
+        for name, run in [("read", full_read), ("read_buffer", buffer_read)]:
+            tracemalloc.start()
+            t0 = timeit.default_timer()
+            run()
+            results[name] = (timeit.default_timer() - t0,
+                             tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        print("1 MB slice of a {} MB file : read() {:.3f} s / {:.0f} MB, "
+              "read_buffer() {:.4f} s / {:.1f} MB".format(
+                  size // 2 ** 20, results["read"][0],
+                  results["read"][1] / 2 ** 20, results["read_buffer"][0],
+                  results["read_buffer"][1] / 2 ** 20))
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_writedf(n_rows=2 * 10 ** 5, chunksize=2 * 10 ** 4):
+    """
+    writes a n_rows DataFrame with pandas.DataFrame.to_csv in one call and
+    with EPath.writedf streamed by chunks, in each supported format
+
+    :returns: dict of (seconds, peak traced memory in bytes, file size)
+    """
+    import numpy as np
+    import pandas as pd
+    from epath import EPath
+    tmp = tempfile.mkdtemp()
+    try:
+        df = pd.DataFrame({"id": np.arange(n_rows),
+                           "x": np.random.rand(n_rows),
+                           "y": np.random.rand(n_rows)})
+        root = EPath(tmp)
+        runs = [("to_csv", "full.csv", lambda p: df.to_csv(p.s, sep=";"))]
+        runs += [(name, name, lambda p: p.writedf(df, chunksize=chunksize))
+                 for name in ["chunked.csv", "chunked.csv.gz", "chunked.parquet",
+                              "chunked.feather"]]
+        results = {}
+        for name, fname, run in runs:
+            path = root.join(fname)
+            t0 = timeit.default_timer()
+            run(path)
+            elapsed = timeit.default_timer() - t0
+            # traced separately : tracemalloc slows down the csv writers
+            tracemalloc.start()
+            run(path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[name] = (elapsed, peak, path.file_size)
+            print("{} rows {:16s}: {:.2f} s, peak {:.0f} MB, {:.1f} MB "
+                  "on disk".format(n_rows, name, elapsed, peak / 2 ** 20,
+                                   path.file_size / 2 ** 20))
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+def _sink_worker(args):
+    from epath import EPath
+    path, worker, n_records = args
+    with EPath(path).sink() as sink:
+        for i in range(n_records):
+            sink.append({"worker": worker, "step": i, "loss": 1. / (i + 1)})
+
+
+def _csv_worker(args):
+    import pandas as pd
+    from epath import EPath
+    path, worker, n_records = args
+    df = pd.DataFrame({"worker": [worker] * n_records,
+                       "step": range(n_records),
+                       "loss": [1. / (i + 1) for i in range(n_records)]})
+    EPath(path).add_after_stem("worker{}".format(worker)).writedf_tocsv(df)
+
+
+def bench_sink(n_workers=200, n_records=100, processes=8):
+    """
+    n_workers tasks, each producing n_records results, aggregated into one
+    csv : one csv per task merged with glob + pandas.concat, against one
+    EPathSink per task compacted at the end
+
+    :returns: dict of (seconds, number of files left)
+    """
+    import multiprocessing
+    import pandas as pd
+    from epath import EPath, EPathSink
+    tmp = tempfile.mkdtemp()
+    try:
+        results = {}
+        with multiprocessing.Pool(processes) as pool:
+            root = EPath(os.path.join(tmp, "csv"), mkdir=True)
+            t0 = timeit.default_timer()
+            pool.map(_csv_worker, [(root.join("results").s, w, n_records)
+                                   for w in range(n_workers)])
+            merged = pd.concat(pd.read_csv(p.s, sep=";", index_col=0)
+                               for p in root.glob("results_worker*.csv"))
+            root.join("results.csv").writedf(merged, index=False)
+            results["csv + merge"] = (timeit.default_timer() - t0,
+                                      len(os.listdir(root.s)))
+
+            root = EPath(os.path.join(tmp, "sink"), mkdir=True)
+            path = root.join("results.csv")
+            t0 = timeit.default_timer()
+            pool.map(_sink_worker, [(path.s, w, n_records)
+                                    for w in range(n_workers)])
+            assert EPathSink.compact(path) == n_workers * n_records
+            results["sink + compact"] = (timeit.default_timer() - t0,
+                                         len(os.listdir(root.s)) + len(
+                                             os.listdir(root.join(
+                                                 ".results.csv.parts").s)))
+        for name, (elapsed, n_files) in results.items():
+            print("{} tasks x {} records, {:15s}: {:.3f} s, {} files "
+                  "left".format(n_workers, n_records, name, elapsed, n_files))
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_param_codec(n_paths=10 ** 6, n_queries=20):
+    """
+    recovers 3 parameters from n_paths file names with a python loop of
+    re.search and with ParamCodec.decode_many, then answers n_queries
+    lookups (files with given lr and bs) by re-parsing the names, against
+    boolean masks over the decoded columns
+
+    :returns: dict of seconds
+    """
+    import numpy as np
+    from epath import ParamCodec
+    codec = ParamCodec({"lr": float, "bs": int, "model": str})
+    paths = ["/results/run{}_{}.csv".format(i, codec.encode(
+        {"lr": 1. / (i % 97 + 1), "bs": 2 ** (i % 8), "model": "m{}".format(
+            i % 5)})) for i in range(n_paths)]
+    regex = re.compile(r"_lr([^_]+)_bs(\d+)_model([^_.]+)\.csv$")
+
+    def loop():
+        lrs, bss, models = [], [], []
+        for path in paths:
+            match = regex.search(path)
+            lrs.append(float(match.group(1).replace("f", ".")))
+            bss.append(int(match.group(2)))
+            models.append(match.group(3))
+        return np.array(lrs), np.array(bss), np.array(models)
+
+    def loop_queries():
+        for q in range(n_queries):
+            lr, bs = 1. / (q + 1), 2 ** (q % 8)
+            [path for path in paths
+             if float(regex.search(path).group(1).replace("f", ".")) == lr
+             and int(regex.search(path).group(2)) == bs]
+
+    columns = codec.decode_many(paths)
+
+    def column_queries():
+        for q in range(n_queries):
+            lr, bs = 1. / (q + 1), 2 ** (q % 8)
+            columns["path"][(columns["lr"] == lr) & (columns["bs"] == bs)]
+
+    results = {}
+    for name, run in [("re loop", loop),
+                      ("decode_many", lambda: codec.decode_many(paths)),
+                      ("re loop queries", loop_queries),
+                      ("column queries", column_queries)]:
+        t0 = timeit.default_timer()
+        run()
+        results[name] = timeit.default_timer() - t0
+    print("{} file names, decode : re loop {:.2f} s, decode_many {:.2f} s"
+          "".format(n_paths, results["re loop"], results["decode_many"]))
+    print("{} lookups : re-parsing {:.2f} s, decoded columns {:.3f} s".format(
+        n_queries, results["re loop queries"], results["column queries"]))
+    return results
+
+
+def bench_make_tree(n_models=10, n_seeds=10, n_lrs=20, workers=8):
+    """
+    creates root/experiments/<model>/<seed>/<lr>/{logs,ckpt} directories
+    with one EPath.mkdir call per directory, parents first, against
+    EPath.make_tree, serial and parallel, then again on the complete tree
+
+    :returns: dict of seconds
+    """
+    from epath import EPath
+    tmp = tempfile.mkdtemp()
+    models = ["model{}".format(i) for i in range(n_models)]
+    seeds, lrs = range(n_seeds), range(n_lrs)
+    spec = {"experiments": {"{model}/seed{seed}/lr{lr}": ["logs", "ckpt"]}}
+    values = {"model": models, "seed": seeds, "lr": lrs}
+
+    def mkdirs(root):
+        root.mkdir()
+        exp_dir = root.join("experiments")
+        exp_dir.mkdir()
+        for model in models:
+            model_dir = exp_dir.join(model)
+            model_dir.mkdir()
+            for seed in seeds:
+                seed_dir = model_dir.join("seed{}".format(seed))
+                seed_dir.mkdir()
+                for lr in lrs:
+                    lr_dir = seed_dir.join("lr{}".format(lr))
+                    lr_dir.mkdir()
+                    lr_dir.join("logs").mkdir()
+                    lr_dir.join("ckpt").mkdir()
+
+    try:
+        results = {}
+        for name, run in [
+                ("mkdir loop", mkdirs),
+                ("make_tree", lambda root: root.make_tree(spec, values)),
+                ("make_tree parallel", lambda root: root.make_tree(
+                    spec, values, workers=workers))]:
+            root = EPath(os.path.join(tmp, name.replace(" ", "_")))
+            t0 = timeit.default_timer()
+            run(root)
+            results[name] = timeit.default_timer() - t0
+            t0 = timeit.default_timer()
+            run(root)
+            results[name + " again"] = timeit.default_timer() - t0
+        n_dirs = 2 + n_models * (1 + n_seeds * (1 + n_lrs * 3))
+        for name, elapsed in results.items():
+            print("{} dirs, {:24s}: {:.3f} s".format(n_dirs, name, elapsed))
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_hot_paths(number=20000):
+    """
+    mean latencies of the EPath operations found in the inner loops of
+    experiment scripts : construction, properties, renaming, joining,
+    indexing, and writing and copying a small file
+
+    :returns: dict of mean latencies in microseconds
+    """
+    import pathlib
+    from epath import EPath
+    tmp = tempfile.mkdtemp()
+    try:
+        path = EPath("/data/exp/run_1/result_1.ext1.csv")
+        path_obj = pathlib.Path(path.s)
+        src = EPath(tmp).join("result.csv")
+        src.write("x" * 4096)
+        dst_dir = EPath(os.path.join(tmp, "copies"), mkdir=True)
+        statements = [
+            ("EPath(str)", number,
+             lambda: EPath("/data/exp/run_1/result_1.csv")),
+            ("EPath(pathlib.Path)", number, lambda: EPath(path_obj)),
+            ("EPath(EPath)", number, lambda: EPath(path)),
+            ("p.stem.stem", number,
+             lambda: EPath("/data/exp/run_1/result_1.ext1.csv").stem.stem),
+            ("p.parent.parent", number,
+             lambda: EPath("/data/exp/run_1/result_1.csv").parent.parent),
+            ("p.add_after_stem", number, lambda: path.add_after_stem("p1")),
+            ("p.replace_parents", number,
+             lambda: path.replace_parents("/data/csv")),
+            ("p.join", number, lambda: path.parent.join("other.csv")),
+            ("p[i]", number, lambda: path[2]),
+            ("p.write 4 KB", number // 20,
+             lambda: src.write("x" * 4096)),
+            ("p.copyto 4 KB", number // 20, lambda: src.copyto(dst_dir)),
+        ]
+        results = {}
+        for name, n, stmt in statements:
+            best = min(timeit.repeat(stmt, number=n, repeat=5))
+            results[name] = best / n * 1e6
+            print("{:<20} : {:.3f} us".format(name, results[name]))
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_glob_scaling(sizes=(10 ** 3, 10 ** 4, 10 ** 5), repeat=3):
+    """
+    EPath.glob and EPath.iglob over synthetic trees of growing sizes,
+    10 ** 6 files is added by the --full option
+
+    :returns: dict of best seconds, by method and number of files
+    """
+    from epath import EPath
+    results = {}
+    for n in sizes:
+        tmp = tempfile.mkdtemp()
+        try:
+            make_tree(tmp, n, n_dirs=max(10, n // 1000))
+            root = EPath(tmp)
+            for name, run in [
+                    ("glob", lambda: root.glob("*/*/*.png")),
+                    ("iglob", lambda: list(root.iglob("*/*/*.png")))]:
+                best = min(timeit.repeat(run, number=1, repeat=repeat))
+                results["{} {}".format(name, n)] = best
+                print("{:<5} {:>8} files : {:.4f} s".format(name, n, best))
+        finally:
+            shutil.rmtree(tmp)
+    return results
+
+
+def bench_profiler(number=20000):
+    """
+    latency of a few EPath calls without profiler, and under a Profiler
+
+    :returns: dict of mean latencies in microseconds
+    """
+    from epath import EPath, Profiler
+    path = EPath("/data/exp/run_1/result_1.csv")
+    statements = [("p.stem.stem", lambda: path.stem.stem),
+                  ("p.exists", lambda: EPath(HERE).exists())]
+    results = {}
+    for name, stmt in statements:
+        results[name] = min(timeit.repeat(stmt, number=number,
+                                          repeat=3)) / number * 1e6
+        with Profiler(max_events=0):
+            results[name + " profiled"] = min(timeit.repeat(
+                stmt, number=number, repeat=3)) / number * 1e6
+        print("{:<12} : {:.3f} us, profiled {:.3f} us".format(
+            name, results[name], results[name + " profiled"]))
+    return results
+
+
+def bench_path_trie(n=5 * 10 ** 5, queries=10 ** 5):
+    """
+    memory of n result paths stored in a set of str and in a PathTrie,
+    membership and prefix query latencies
+
+    :returns: dict of bytes per path and microseconds
+    """
+    from epath import EPath, PathTrie
+    names = ["/home/user/root_dir/experiments/model{}/seed{}/lr{}/"
+             "epoch_{:04d}.csv".format(i % 7, i // 7 % 10, i // 70 % 10,
+                                       i // 700) for i in range(n)]
+    results = {}
+    for name, build in [("set[str]", set), ("PathTrie", PathTrie)]:
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        # fresh strings, as when read from a file or a listing, counted
+        # when the container keeps them
+        copies = [path.encode().decode() for path in names]
+        container = build(copies)
+        del copies
+        results[name + " B/path"] = (tracemalloc.get_traced_memory()[0]
+                                     - start) / float(n)
+        tracemalloc.stop()
+        probes = [EPath(names[i * 7919 % n]) for i in range(queries)]
+        t0 = timeit.default_timer()
+        for probe in probes:
+            probe in container
+        results[name + " in us"] = ((timeit.default_timer() - t0)
+                                    / queries * 1e6)
+        prefix = "/home/user/root_dir/experiments/model3/seed4"
+        t0 = timeit.default_timer()
+        if name == "PathTrie":
+            count = sum(1 for _ in container.iter_prefix(prefix))
+        else:
+            count = sum(1 for path in container
+                        if path.startswith(prefix + "/"))
+        results[name + " prefix ms"] = (timeit.default_timer() - t0) * 1e3
+        print("{} paths, {:8s}: {:.0f} B/path, membership {:.2f} us, "
+              "{} paths under a prefix in {:.2f} ms".format(
+                  n, name, results[name + " B/path"],
+                  results[name + " in us"], count,
+                  results[name + " prefix ms"]))
+    return results
+
+
+def bench_digest(n=200, size=2 ** 20, workers=8):
+    """
+    hashes n files of size bytes with a loop of hashlib.sha256(read()),
+    with digest_files, and with digest_files and a warm HashCache
+
+    :returns: dict of seconds
+    """
+    import hashlib
+    from epath import EPath, HashCache, digest_files
+    tmp = tempfile.mkdtemp()
+    try:
+        root = EPath(tmp)
+        block = os.urandom(size)
+        for i in range(n):
+            with open(root.join("blob_{}.bin".format(i)).s, "wb") as fd:
+                fd.write(block[i:] + block[:i])
+        paths = root.glob("*.bin")
+
+        def loop():
+            digests = {}
+            for path in paths:
+                with open(path.s, "rb") as fd:
+                    digests[path] = hashlib.sha256(fd.read()).hexdigest()
+            return digests
+
+        cache = HashCache(os.path.join(tmp, "hashes.sqlite"))
+        results = {}
+        for name, run in [
+                ("read loop", loop),
+                ("digest_files", lambda: digest_files(paths,
+                                                      workers=workers)),
+                ("digest_files cold cache", lambda: digest_files(
+                    paths, workers=workers, cache=cache)),
+                ("digest_files warm cache", lambda: digest_files(
+                    paths, workers=workers, cache=cache))]:
+            t0 = timeit.default_timer()
+            run()
+            results[name] = timeit.default_timer() - t0
+            print("{} files of {} MB, {:24s}: {:.3f} s".format(
+                n, size // 2 ** 20, name, results[name]))
+        cache.close()
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_sync(n=20000, changed=0.01, workers=8):
+    """
+    mirrors a tree of n small files : copyto loop over every file, first
+    EPath.sync, sync with nothing changed (serial and parallel scans),
+    and sync after changed * n files were rewritten
+
+    :returns: dict of seconds
+    """
+    from epath import EPath
+    tmp = tempfile.mkdtemp()
+    try:
+        src = os.path.join(tmp, "src")
+        os.makedirs(src)
+        make_tree(src, n, suffix=".csv")
+        src = EPath(src)
+        files = list(src.iglob("**/*.csv"))
+
+        def copyto_loop():
+            dst = os.path.join(tmp, "copyto")
+            for path in files:
+                dst_dir = EPath(os.path.join(
+                    dst, os.path.relpath(path.parent.s, src.s)))
+                if not dst_dir.is_dir():
+                    os.makedirs(dst_dir.s)
+                path.copyto(dst_dir)
+
+        def rewrite():
+            for path in files[::int(1 / changed)]:
+                path.write("new content")
+
+        dst = EPath(os.path.join(tmp, "dst"))
+        results = {}
+        for name, prepare, run in [
+                ("copyto loop", None, copyto_loop),
+                ("first sync", None, lambda: src.sync(dst, workers=workers)),
+                ("no-op sync, serial scan", None,
+                 lambda: src.sync(dst, workers=None)),
+                ("no-op sync", None, lambda: src.sync(dst, workers=workers)),
+                ("sync {:.0%} changed".format(changed), rewrite,
+                 lambda: src.sync(dst, workers=workers))]:
+            if prepare is not None:
+                prepare()
+            t0 = timeit.default_timer()
+            run()
+            results[name] = timeit.default_timer() - t0
+            print("{} files, {:24s}: {:.3f} s".format(n, name,
+                                                      results[name]))
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_removetree(n=20000, workers=8):
+    """
+    removes a tree of n small files : removefile / removedir loop over an
+    iglob, shutil.rmtree, and EPath.removetree serial and parallel
+
+    :returns: dict of seconds
+    """
+    from epath import EPath
+    tmp = tempfile.mkdtemp()
+    try:
+        root = EPath(tmp)
+
+        def remove_loop(path):
+            for sub in sorted(path.iglob("**/*"), key=lambda p: -len(p.s)):
+                if sub.is_dir():
+                    sub.removedir()
+                else:
+                    sub.removefile()
+            path.removedir()
+
+        results = {}
+        for name, run in [
+                ("removefile loop", remove_loop),
+                ("shutil.rmtree", lambda path: shutil.rmtree(path.s)),
+                ("removetree, serial", lambda path: path.removetree(root)),
+                ("removetree", lambda path: path.removetree(
+                    root, workers=workers))]:
+            path = root.join("tree")
+            os.makedirs(path.s)
+            make_tree(path.s, n, suffix=".csv")
+            t0 = timeit.default_timer()
+            run(path)
+            results[name] = timeit.default_timer() - t0
+            assert not path.exists()
+            print("{} files, {:20s}: {:.3f} s".format(n, name,
+                                                      results[name]))
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_watch(n=20000, new_files=50, interval=0.01):
+    """
+    detects new_files files written every interval seconds in a tree
+    of n files : glob polling as fast as possible, and EPath.watch.
+    Reports the cost of one poll, the mean detection latency and the
+    number of directory listings (polls) or reads (watch) made
+
+    :returns: dict of (mean latency, seconds per poll or read, count)
+    """
+    import threading
+    from epath import EPath
+    tmp = tempfile.mkdtemp()
+    try:
+        make_tree(tmp, n, suffix=".csv")
+        root = EPath(tmp)
+        dirs = sorted({path.parent.s for path in root.iglob("**/*.csv")})
+
+        def writer(written, prefix):
+            for i in range(new_files):
+                time.sleep(interval)
+                path = os.path.join(dirs[i % len(dirs)],
+                                    "{}_{}.out".format(prefix, i))
+                written[path] = timeit.default_timer()
+                open(path, "w").close()
+
+        def poll(written):
+            seen, latencies, polls, busy = set(), [], 0, 0.
+            while len(seen) < new_files:
+                t0 = timeit.default_timer()
+                found = {p.s for p in root.glob("*/*/poll_*.out")}
+                now = timeit.default_timer()
+                busy += now - t0
+                polls += 1
+                latencies += [now - written[p] for p in found - seen]
+                seen |= found
+            return latencies, busy / polls, polls
+
+        def watch(written):
+            latencies, reads, busy = [], 0, 0.
+            with root.watch() as watcher:
+                thread.start()
+                while len(latencies) < new_files:
+                    events = watcher.read()
+                    now = timeit.default_timer()
+                    reads += 1
+                    latencies += [now - written[e.path.s] for e in events
+                                  if e.kind == "created"]
+                    busy += timeit.default_timer() - now
+            return latencies, busy / reads, reads
+
+        results = {}
+        for name, run in [("poll", poll), ("watch", watch)]:
+            written = {}
+            thread = threading.Thread(target=writer, args=(written, name))
+            if name == "poll":
+                thread.start()
+            latencies, per_call, calls = run(written)
+            thread.join()
+            results[name] = (sum(latencies) / len(latencies), per_call,
+                             calls)
+            call = "glob" if name == "poll" else "read"
+            print("{} files, {:5s}: mean latency {:.4f} s, {:.5f} s per "
+                  "{}, {} {}s".format(n, name, results[name][0], per_call,
+                                      call, calls, call))
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+def bench_memoize(n=200, size=100000, max_bytes=None):
+    """
+    calls a function of n parameter sets returning size float64 values
+    (about 5 ms of NumPy work each), plain and memoized on disk in each
+    format : first run (compute and store), second run (load), cost of
+    building the file names, and a run with a max_bytes budget
+
+    :returns: dict of seconds per call
+    """
+    import numpy as np
+    import pandas as pd
+    from epath import memoize
+    tmp = tempfile.mkdtemp()
+
+    def simulate(seed, lr=0.01, model="cnn"):
+        values = np.random.default_rng(seed).standard_normal(size)
+        for _ in range(20):
+            values = np.tanh(values * lr + 1.)
+        return values
+
+    def stored_as(wrap):
+        def simulate_result(seed, lr=0.01, model="cnn"):
+            return wrap(simulate(seed, lr, model))
+        return simulate_result
+
+    try:
+        results = {}
+
+        def timed(name, run):
+            t0 = timeit.default_timer()
+            for seed in range(n):
+                run(seed)
+            results[name] = (timeit.default_timer() - t0) / n
+            print("{} calls, {:28s}: {:.5f} s per call".format(
+                n, name, results[name]))
+
+        timed("plain", simulate)
+        for format, wrap in [("pickle", lambda x: x), ("npz", lambda x: x),
+                             ("csv", lambda x: pd.DataFrame({"v": x}))]:
+            memo = memoize(os.path.join(tmp, format), format=format)(
+                stored_as(wrap))
+            timed("{}, first run".format(format), memo)
+            timed("{}, second run".format(format), memo)
+        timed("path only", memo.path)
+        budget = max_bytes or n * size * 8 // 2
+        memo = memoize(os.path.join(tmp, "lru"), max_bytes=budget)(simulate)
+        timed("pickle, max_bytes 50%", memo)
+        print("evictions : {}".format(memo.info()["evictions"]))
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+BENCHMARKS = [
+    bench_import_time, bench_epath_memory, bench_epath_array_memory,
+    bench_epath_components, bench_hot_paths, bench_epath_array,
+    bench_iglob, bench_glob_scaling,
+    bench_parallel_iglob, bench_stat_cache, bench_index, bench_async,
+    bench_copy_files, bench_writer, bench_imread_batch, bench_image_cache,
+    bench_read_buffer, bench_writedf, bench_sink, bench_param_codec,
+    bench_make_tree, bench_profiler, bench_path_trie, bench_digest,
+    bench_sync, bench_removetree, bench_watch, bench_memoize,
+]
+
+
+def flatten(result, prefix=""):
+    """numeric metrics of a benchmark result (a number, tuples and dicts
+    of them, or report objects like CopyReport, whose public attributes
+    and properties are read) as a flat dict of 'key/key/index': value"""
+    if isinstance(result, dict):
+        items = result.items()
+    elif hasattr(result, "_asdict"):
+        items = result._asdict().items()
+    elif isinstance(result, (list, tuple)):
+        items = enumerate(result)
+    elif isinstance(result, (int, float)) and not isinstance(result, bool):
+        return {prefix: float(result)}
+    elif hasattr(result, "__dict__") and not isinstance(result, type):
+        names = [name for name in vars(result) if not name.startswith("_")]
+        names += [name for name, attr in vars(type(result)).items()
+                  if isinstance(attr, property)]
+        items = [(name, getattr(result, name)) for name in names]
+    else:
+        return {}
+    metrics = {}
+    for key, value in items:
+        metrics.update(flatten(value, "{}/{}".format(prefix, key)
+                               if prefix else str(key)))
+    return metrics
+
+
+def environment():
+    """what the results depend on : machine, python and epath version"""
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(),
+            "machine": platform.machine(), "system": platform.system(),
+            "cpus": os.cpu_count(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def save_results(metrics, name):
+    """stores metrics in benchmarks/<name>.json, updating the metrics of
+    an existing file"""
+    fname = os.path.join(RESULTS_DIR, name + ".json")
+    stored = {"metrics": {}}
+    if os.path.exists(fname):
+        with open(fname) as fd:
+            stored = json.load(fd)
+    stored["environment"] = environment()
+    stored["metrics"].update(metrics)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(fname, "w") as fd:
+        json.dump(stored, fd, indent=1, sort_keys=True)
+        fd.write("\n")
+    print("results saved to {}".format(fname))
+
+
+def compare_results(metrics, name, threshold=0.1):
+    """
+    compares metrics with the ones stored in benchmarks/<name>.json
+
+    :returns: list of the metrics more than threshold worse
+    """
+    with open(os.path.join(RESULTS_DIR, name + ".json")) as fd:
+        stored = json.load(fd)
+    print("compared with {} (commit {}, python {})".format(
+        name, stored["environment"]["commit"],
+        stored["environment"]["python"]))
+    regressions = []
+    for key in sorted(metrics):
+        old = stored["metrics"].get(key)
+        if not old:
+            continue
+        if key.rsplit("/", 1)[-1] in HIGHER_IS_BETTER:
+            # inverted, so that above 1 is always worse
+            ratio = old / metrics[key] if metrics[key] else float("inf")
+        else:
+            ratio = metrics[key] / old
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "REGRESSION"
+            regressions.append(key)
+        elif ratio < 1 - threshold:
+            flag = "improvement"
+        print("{:<48} {:>12.4g} -> {:<12.4g} x{:.2f} {}".format(
+            key, old, metrics[key], ratio, flag))
+    print("{} regression(s)".format(len(regressions)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="epath benchmarks")
+    parser.add_argument("names", nargs="*",
+                        help="benchmarks to run, e.g. hot_paths, all "
+                             "by default")
+    parser.add_argument("--save", help="stores results under this name")
+    parser.add_argument("--compare", help="compares with stored results")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--full", action="store_true",
+                        help="glob_scaling up to 10 ** 6 files")
+    args = parser.parse_args(argv)
+
+    benchmarks = BENCHMARKS
+    if args.names:
+        benchmarks = [bench for bench in BENCHMARKS
+                      if bench.__name__[len("bench_"):] in args.names]
+    metrics = {}
+    for bench in benchmarks:
+        name = bench.__name__[len("bench_"):]
+        if bench is bench_glob_scaling and args.full:
+            result = bench(sizes=(10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6))
+        else:
+            result = bench()
+        metrics.update(flatten(result, name))
+
+    if args.save:
+        save_results(metrics, args.save)
+    if args.compare:
+        return 1 if compare_results(metrics, args.compare,
+                                    args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
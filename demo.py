@@ -4,10 +4,11 @@
 from __future__ import print_function
 import sys
 import os
+import tempfile
 HOME = os.environ["HOME"]
 import numpy as np
 import pandas as pd
-from epath import EPath
+from epath import EPath, EPathArray
 
 
 
@@ -73,9 +74,14 @@ def demo_path_manipulations():
     print(p_final2)
 
     # joining
-    p_final3 = p_final.parent().join("../proc/omgdontsavehere")
+    p_final3 = p_final.parent.join("../proc/omgdontsavehere")
     print(p_final3)
 
+    # the same loop over i, j in one call for the whole batch
+    params = ["{}_{}".format(i, j) for i in range(10) for j in range(10)]
+    paths = EPathArray([file_name] * len(params)).add_after_stem(params)
+    print(paths)
+
 
 def demo_experiment_tree_directories():
     """
@@ -149,6 +155,20 @@ def demo_experiment_tree_directories():
     print(tex_fname)
 
 
+def demo_make_tree():
+    """demo creating the tree of demo_experiment_tree_directories
+    in one call, its directories are attributes of the tree"""
+    root_dir = EPath(tempfile.mkdtemp()).join("root_dir")
+    tree = root_dir.make_tree({"data": ["csv", "tex"], "images": None,
+                               "article": None, "experiments": None})
+    tex_fname = tree.data.tex.join("preciousresults.tex")
+    tex_fname.write_tex("\\section{Results}")
+
+    print("{} directories created".format(tree.created))
+    print(tex_fname, tex_fname.exists())
+    root_dir.parent.removetree(tempfile.gettempdir())
+
+
 def demo_experimental_feature_setitem():
     """
     Experimental feature with __setitem__
@@ -171,6 +191,7 @@ def demo_experimental_feature_setitem():
 
 def main():
     demo_experiment_tree_directories()
+    demo_make_tree()
 
 
 if __name__ == '__main__':
@@ -17,8 +17,13 @@ When developing, the number of bugs is also greatly reduced
 
 
 # Required modules
-    pathlib
-    opencv-python
+    pathlib (standard library)
+
+# Optional modules, imported on first use only
+    opencv-python : imread, imwrite
+    pandas        : writedf_tocsv, writedf
+    pyarrow       : writedf to .parquet and .feather files
+    numpy         : EPathArray
 
 
 # simple example:
@@ -33,19 +38,1373 @@ When developing, the number of bugs is also greatly reduced
 
 # how functions globally work : 
     example file path  : /a/b/dir/image.jpg.png
-    basename()         : image.jpg.png
-    stem()             : image.jpg
-    stem().stem()      : image
-    parent()           : /a/b/dir
-    suffix()           : .png 
+    basename           : image.jpg.png
+    stem               : image.jpg
+    stem.stem          : image
+    parent             : /a/b/dir
+    suffix             : .png 
 """
 
 
 import os
+import sys
+import re
+import stat
+import errno
+import mmap
+import time
+import collections
 import glob
-from shutil import copyfile
+import fnmatch
+import queue
+import weakref
+import threading
+import itertools
+import functools
+import builtins
+import numbers
+import importlib.util
+from shutil import copyfileobj, SameFileError
 import pathlib
-import cv2
+
+
+class LazyModule:
+    """
+    Proxy for an optional backend module (cv2, pandas, numpy...)
+    which is imported on first attribute access only, so that
+    importing epath stays cheap and only depends on the standard library.
+    The methods of the proxy are private, every public attribute is
+    the one of the module (np.load is numpy.load).
+
+    :Example:
+    >>> json = LazyModule("json")
+    >>> json._is_loaded()
+    False
+    >>> json.dumps([1])
+    '[1]'
+    >>> json._is_loaded()
+    True
+    """
+
+    def __init__(self, name, package=None):
+        """name is the module to import, package the pip package
+        that provides it (used in the error message)"""
+        self._name = name
+        self._package = package or name
+        self._module = None
+
+    def _load(self):
+        """imports the module if needed and returns it"""
+        if self._module is None:
+            try:
+                self._module = importlib.import_module(self._name)
+            except ImportError as err:
+                msg = "optional module '{}' is required for this feature, " \
+                      "install it with : pip install {}"
+                raise ImportError(msg.format(self._name,
+                                             self._package)) from err
+        return self._module
+
+    def _is_loaded(self):
+        """tests if the module has already been imported"""
+        return self._module is not None
+
+    def _is_available(self):
+        """tests if the module can be imported, without importing it"""
+        if self._module is not None:
+            return True
+        return importlib.util.find_spec(self._name) is not None
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            # introspection (doctest, pickle, copy...) must not import
+            raise AttributeError(attr)
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._is_loaded() else "not loaded"
+        return "<LazyModule {} ({})>".format(self._name, state)
+
+
+# optional backends, only imported by the methods that need them
+cv2 = LazyModule("cv2", "opencv-python")
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+pa = LazyModule("pyarrow")
+pq = LazyModule("pyarrow.parquet", "pyarrow")
+# standard library modules only needed by some features
+asyncio = LazyModule("asyncio")
+futures = LazyModule("concurrent.futures")
+hashlib = LazyModule("hashlib")
+sqlite3 = LazyModule("sqlite3")
+tempfile = LazyModule("tempfile")
+pickle = LazyModule("pickle")
+json = LazyModule("json")
+inspect = LazyModule("inspect")
+atexit = LazyModule("atexit")
+fcntl = LazyModule("fcntl")
+ctypes = LazyModule("ctypes")
+select = LazyModule("select")
+struct = LazyModule("struct")
+
+
+# marker of a '**' component in a glob pattern
+_RECURSIVE = object()
+
+
+def _scandir(dirname):
+    """os.scandir entries of dirname, nothing if it cannot be listed"""
+    try:
+        with os.scandir(dirname) as entries:
+            for entry in entries:
+                yield entry
+    except OSError:
+        return
+
+
+def _compile_part(part):
+    """compiles one component of a glob pattern to a matcher :
+       - _RECURSIVE for '**'
+       - the component itself when it has no wildcard
+       - a compiled regex match function otherwise, which only matches
+         hidden names when the component starts with '.', like glob"""
+    if part == "**":
+        return _RECURSIVE
+    if not glob.has_magic(part):
+        return part
+    regex = fnmatch.translate(part)
+    if not part.startswith('.'):
+        regex = r"(?!\.)" + regex
+    return re.compile(regex).match
+
+
+def _match_part(matcher, name):
+    """tests a name against a compiled glob component"""
+    if isinstance(matcher, str):
+        return name == matcher
+    return matcher(name) is not None
+
+
+def _is_subdir(entry):
+    """tests if a DirEntry is a directory to recurse into with '**' :
+    hidden directories and symlinks are not followed"""
+    try:
+        return (not entry.name.startswith('.')
+                and entry.is_dir(follow_symlinks=False))
+    except OSError:
+        return False
+
+
+def _iglob_scan(dirname, matchers):
+    """one step of glob matching in dirname, yields while scanning :
+       - (entry, None) for each DirEntry matching the pattern
+       - (None, (subdirname, matchers)) for each directory where the
+         matching goes on"""
+    matcher, rest = matchers[0], matchers[1:]
+    if matcher is _RECURSIVE:
+        if not rest:
+            # trailing '**' matches everything below dirname
+            for entry in _scandir(dirname):
+                if entry.name.startswith('.'):
+                    continue
+                yield entry, None
+                if _is_subdir(entry):
+                    yield None, (entry.path, matchers)
+        elif len(rest) == 1:
+            # '**/last' : one scan per directory matches and recurses
+            for entry in _scandir(dirname):
+                if _match_part(rest[0], entry.name):
+                    yield entry, None
+                if _is_subdir(entry):
+                    yield None, (entry.path, matchers)
+        else:
+            yield None, (dirname, rest)
+            for entry in _scandir(dirname):
+                if _is_subdir(entry):
+                    yield None, (entry.path, matchers)
+    elif isinstance(matcher, str) and rest:
+        # literal directory component, no need to list dirname
+        yield None, (os.path.join(dirname, matcher), rest)
+    else:
+        for entry in _scandir(dirname):
+            if not _match_part(matcher, entry.name):
+                continue
+            if not rest:
+                yield entry, None
+            elif entry.is_dir():
+                yield None, (entry.path, rest)
+
+
+def _scan_key(dirname, item):
+    """sort key of the _iglob_scan items of dirname : by name of the
+    entry or of the directory of the task, a task continuing in dirname
+    itself comes first"""
+    entry, task = item
+    if entry is not None:
+        return entry.name
+    return "" if task[0] == dirname else os.path.basename(task[0])
+
+
+def _iglob_items(dirname, matchers, accept=None, ordered=False):
+    """runs _iglob_scan in dirname, filters the matching entries with
+    accept, sorts by name when ordered"""
+    items = _iglob_scan(dirname, matchers)
+    if accept is not None:
+        items = (item for item in items
+                 if item[0] is None or accept(item[0]))
+    if ordered:
+        items = sorted(items, key=functools.partial(_scan_key, dirname))
+    return items
+
+
+def _iglob_entries(dirname, matchers, accept=None, ordered=False):
+    """yields the DirEntry objects under dirname matching the compiled
+    glob components, while dirname is being scanned (depth first)"""
+    for entry, task in _iglob_items(dirname, matchers, accept, ordered):
+        if task is None:
+            yield entry
+        else:
+            yield from _iglob_entries(task[0], task[1], accept, ordered)
+
+
+def _iglob_entries_parallel(dirname, matchers, accept=None, ordered=False,
+                            workers=8):
+    """parallel version of _iglob_entries : each directory is scanned by
+    a pool of worker threads, which submit the subdirectories they find
+    to the pool right away. Entries are yielded as directories complete,
+    or in the same depth first order as _iglob_entries when ordered."""
+    pool = futures.ThreadPoolExecutor(max_workers=workers)
+    done = queue.Queue()
+    # tasks submitted and not yet reported, counted before submission
+    # so that it cannot drop to 0 while a subdirectory is still queued
+    pending = [1]
+    lock = threading.Lock()
+
+    def scan(task):
+        try:
+            entries = []
+            for entry, subtask in _iglob_items(task[0], task[1],
+                                               accept, ordered):
+                if subtask is None:
+                    entries.append(entry)
+                else:
+                    with lock:
+                        pending[0] += 1
+                    future = pool.submit(scan, subtask)
+                    if ordered:
+                        entries.append(future)
+        except BaseException as err:
+            done.put(([], err))
+            raise
+        if ordered:
+            return entries
+        done.put((entries, None))
+
+    def unroll(future):
+        # depth first walk of the futures tree, releasing what is yielded
+        items = future.result()
+        for i, item in enumerate(items):
+            items[i] = None
+            if isinstance(item, futures.Future):
+                yield from unroll(item)
+            else:
+                yield item
+
+    try:
+        root = pool.submit(scan, (dirname, matchers))
+        if ordered:
+            yield from unroll(root)
+            return
+        left = 1
+        while left:
+            entries, err = done.get()
+            if err is not None:
+                raise err
+            with lock:
+                pending[0] -= 1
+                left = pending[0]
+            yield from entries
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _entry_filter(suffix=None, min_size=None, max_size=None,
+                  newer_than=None, older_than=None, only=None):
+    """builds a DirEntry predicate from iglob pre-filters,
+    None when there is nothing to filter"""
+    checks = []
+    if suffix is not None:
+        suffixes = (suffix,) if isinstance(suffix, str) else tuple(suffix)
+        suffixes = tuple(s if s.startswith('.') else '.' + s
+                         for s in suffixes)
+        checks.append(lambda entry: entry.name.endswith(suffixes))
+    if only == "file" or min_size is not None or max_size is not None:
+        checks.append(lambda entry: entry.is_file())
+    elif only == "dir":
+        checks.append(lambda entry: entry.is_dir())
+    elif only is not None:
+        raise ValueError("only must be None, 'file' or 'dir'")
+    if min_size is not None:
+        checks.append(lambda entry: entry.stat().st_size >= min_size)
+    if max_size is not None:
+        checks.append(lambda entry: entry.stat().st_size <= max_size)
+    if newer_than is not None:
+        checks.append(lambda entry: entry.stat().st_mtime > newer_than)
+    if older_than is not None:
+        checks.append(lambda entry: entry.stat().st_mtime < older_than)
+    if not checks:
+        return None
+
+    def accept(entry):
+        try:
+            return all(check(entry) for check in checks)
+        except OSError:
+            # broken symlink or entry removed since the scan
+            return False
+    return accept
+
+
+class StatCache:
+    """
+    Size bounded LRU cache of os.stat results, with a time to live,
+    behind EPath.exists, is_dir, is_file, file_size, is_readable,
+    is_writable and is_executable : all of them are answered from a
+    single os.stat call per path. Missing paths are cached too.
+
+    The cache is opt-in, it is used by EPath once installed with
+    enable_stat_cache() or as a context manager. EPath methods changing
+    the filesystem (mkdir, touch, write, removefile, removedir,
+    copyto...) invalidate the paths they modify; changes made by other
+    programs are seen once entries expire after ttl seconds.
+
+    Access rights are computed from the permission bits, ACLs and
+    read-only mounts are not taken into account.
+
+    :Example:
+    >>> with StatCache(maxsize=1000, ttl=10.) as cache:
+    ...     path = EPath("/")
+    ...     path.exists(), path.is_dir(), path.is_file()
+    (True, True, False)
+    >>> cache.hits, cache.misses
+    (2, 1)
+    >>> with StatCache():
+    ...     EPath("/" + "x" * 5000).exists(), EPath("/a\\0b").is_file()
+    (False, False)
+    """
+
+    def __init__(self, maxsize=65536, ttl=2.):
+        """maxsize is the maximum number of cached paths and ttl the
+        number of seconds a stat result is trusted, None for no expiry"""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._previous = None
+
+    def stat(self, path_str):
+        """:returns: os.stat result of path_str, None if it can not be
+        stat'ed (missing, name too long, symlink loop, no permission...),
+        as os.path.exists answers False"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(path_str)
+            if cached is not None and (cached[1] is None or cached[1] > now):
+                self._entries.move_to_end(path_str)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+        try:
+            result = os.stat(path_str)
+        except (OSError, ValueError):
+            result = None
+        expiry = None if self.ttl is None else now + self.ttl
+        with self._lock:
+            self._entries[path_str] = (result, expiry)
+            self._entries.move_to_end(path_str)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def invalidate(self, path_str=None):
+        """forgets path_str and its parent directory, or everything
+        when path_str is None"""
+        with self._lock:
+            if path_str is None:
+                self._entries.clear()
+                return
+            self._entries.pop(path_str, None)
+            self._entries.pop(os.path.dirname(path_str) or ".", None)
+
+    def info(self):
+        """:returns: dict of hit/miss counters and current size"""
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hit_rate": self.hits / float(total) if total else 0.}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __enter__(self):
+        global _stat_cache
+        self._previous, _stat_cache = _stat_cache, self
+        return self
+
+    def __exit__(self, *exc_info):
+        global _stat_cache
+        _stat_cache, self._previous = self._previous, None
+
+    def __repr__(self):
+        return "<StatCache {}>".format(self.info())
+
+
+# stat cache used by EPath, None when disabled
+_stat_cache = None
+
+
+def enable_stat_cache(maxsize=65536, ttl=2.):
+    """installs a new StatCache used by all EPath objects
+
+    :rtype: StatCache
+    """
+    global _stat_cache
+    _stat_cache = StatCache(maxsize=maxsize, ttl=ttl)
+    return _stat_cache
+
+
+def disable_stat_cache():
+    """stops using the stat cache"""
+    global _stat_cache
+    _stat_cache = None
+
+
+def get_stat_cache():
+    """:returns: the StatCache in use, None if disabled"""
+    return _stat_cache
+
+
+# installed EPathIndex objects, see EPathIndex.install
+_indexes = []
+
+
+def _index_for(path_str):
+    """:returns: (installed EPathIndex covering path_str, absolute path)
+                 or (None, None)"""
+    abs_path = os.path.abspath(path_str)
+    for index in _indexes:
+        if index.covers(abs_path):
+            return index, abs_path
+    return None, None
+
+
+def _changed(path_str):
+    """tells the stat cache, the image cache and the installed indexes
+    that path_str has been modified"""
+    if _stat_cache is not None:
+        _stat_cache.invalidate(path_str)
+    if _image_cache is not None:
+        _image_cache.invalidate(path_str)
+    if _indexes:
+        index, abs_path = _index_for(path_str)
+        if index is not None:
+            index.update(abs_path)
+
+
+def _access(st, mode):
+    """os.access like test answered from a stat result"""
+    if st is None:
+        return False
+    if os.getuid() == 0:
+        # root reads and writes anything, executes if any x bit is set
+        if mode == os.X_OK:
+            return bool(st.st_mode & 0o111) or stat.S_ISDIR(st.st_mode)
+        return True
+    if st.st_uid == os.getuid():
+        shift = 6
+    elif st.st_gid == os.getgid() or st.st_gid in os.getgroups():
+        shift = 3
+    else:
+        shift = 0
+    return bool((st.st_mode >> shift) & mode)
+
+
+# errors meaning a zero-copy system call is not supported for these files
+_UNSUPPORTED_COPY = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.ENOTSUP,
+                     errno.EOPNOTSUPP, errno.ETXTBSY, errno.EBADF}
+
+
+def _copy_file(src, dst):
+    """
+    copies the content of the file src to dst, inside the kernel with
+    os.copy_file_range (which also lets filesystems share blocks or copy
+    server side) or os.sendfile, falling back to a buffered copy. A call
+    copying nothing from a non-empty file (some overlay, FUSE or NFS
+    mounts) is taken as unsupported.
+
+    :returns: number of bytes copied
+
+    :Example:
+    >>> import tempfile
+    >>> src = os.path.join(tempfile.mkdtemp(), "a.bin")
+    >>> with open(src, "wb") as fd:
+    ...     _ = fd.write(b"x" * 100)
+    >>> def unsupported(*args):
+    ...     raise OSError(errno.EXDEV, "cross-device")
+    >>> saved = os.copy_file_range, os.sendfile
+    >>> os.copy_file_range = os.sendfile = unsupported
+    >>> try:
+    ...     _copy_file(src, src + ".copy")
+    ... finally:
+    ...     os.copy_file_range, os.sendfile = saved
+    100
+    >>> os.path.getsize(src + ".copy")
+    100
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        copied = 0
+        for zero_copy in ("copy_file_range", "sendfile"):
+            if not hasattr(os, zero_copy):
+                continue
+            try:
+                while True:
+                    if zero_copy == "copy_file_range":
+                        n = os.copy_file_range(infd, outfd, 1 << 30)
+                    else:
+                        n = os.sendfile(outfd, infd, None, 1 << 30)
+                    if n == 0:
+                        break
+                    copied += n
+            except OSError as err:
+                if err.errno not in _UNSUPPORTED_COPY:
+                    raise
+                continue
+            if copied or os.fstat(infd).st_size == 0:
+                return copied
+        # both calls continue from the current offsets, so does this one
+        copyfileobj(fsrc, fdst, 1 << 20)
+        # position in dst, buffered bytes included
+        return fdst.tell()
+
+
+def _copy_one(src, dst, skip_unchanged=False, preserve_mtime=False):
+    """
+    copies the file src to the file path dst
+
+    :returns: (copied, number of bytes), copied being False when dst
+              already has the size and mtime of src
+    """
+    src_stat = os.stat(src)
+    try:
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        dst_stat = None
+    if dst_stat is not None:
+        if (src_stat.st_dev, src_stat.st_ino) == (dst_stat.st_dev,
+                                                  dst_stat.st_ino):
+            raise SameFileError("{} and {} are the same file".format(src,
+                                                                     dst))
+        if (skip_unchanged and dst_stat.st_size == src_stat.st_size
+                and dst_stat.st_mtime_ns == src_stat.st_mtime_ns):
+            return False, 0
+    try:
+        size = _copy_file(src, dst)
+        if preserve_mtime:
+            os.utime(dst, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+    finally:
+        _changed(dst)
+    return True, size
+
+
+class CopyReport:
+    """
+    summary of a copy_files call
+
+    :attr:
+    copied : int
+        number of files copied
+    skipped : int
+        number of files skipped because they were unchanged
+    bytes : int
+        number of bytes copied
+    seconds : float
+        wall time of the copy
+    errors : list
+        (source, destination, exception) of the failed copies
+    """
+
+    def __init__(self):
+        self.copied = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.seconds = 0.
+        self.errors = []
+
+    @property
+    def files_per_s(self):
+        """files processed (copied or skipped) per second"""
+        if not self.seconds:
+            return 0.
+        return (self.copied + self.skipped) / self.seconds
+
+    @property
+    def mb_per_s(self):
+        """throughput in MB (10^6 bytes) per second"""
+        if not self.seconds:
+            return 0.
+        return self.bytes / 1e6 / self.seconds
+
+    def __repr__(self):
+        return ("<CopyReport {} copied, {} skipped, {} errors, {:.1f} MB "
+                "in {:.3f} s : {:.0f} files/s, {:.1f} MB/s>").format(
+                    self.copied, self.skipped, len(self.errors),
+                    self.bytes / 1e6, self.seconds, self.files_per_s,
+                    self.mb_per_s)
+
+
+def copy_files(sources, dir=None, workers=8, skip_unchanged=True,
+               preserve_mtime=True, raise_errors=True):
+    """
+    copies many files at once, in a pool of threads, with in-kernel
+    copies (see EPath.copyto)
+
+    :param sources: paths of the files to copy into dir, or
+                    (source, destination file) pairs when dir is None
+    :param dir: destination directory, checked once
+    :param workers: number of copying threads
+    :param skip_unchanged: does not copy a file whose destination has
+                           the same size and mtime
+    :param preserve_mtime: gives copies the mtime of their source, which
+                           is what makes skip_unchanged work next time
+    :param raise_errors: raises the first error once all copies are
+                         done, otherwise errors are only reported
+    :rtype: CopyReport
+
+    :Example:
+    >>> import tempfile
+    >>> src, dst = EPath(tempfile.mkdtemp()), EPath(tempfile.mkdtemp())
+    >>> paths = [src.join("res_{}.txt".format(i)) for i in range(3)]
+    >>> for path in paths:
+    ...     path.write("some result", mode="w")
+    >>> report = copy_files(paths, dst)
+    >>> report.copied, report.skipped, report.bytes
+    (3, 0, 33)
+    >>> report = copy_files(paths, dst)
+    >>> report.copied, report.skipped
+    (0, 3)
+    """
+    if dir is not None:
+        if not EPath(dir).is_dir():
+            raise ValueError("cannot copy, not a dir")
+        dir = str(dir)
+        pairs = [(str(src), os.path.join(dir, os.path.basename(str(src))))
+                 for src in sources]
+    else:
+        pairs = [(str(src), str(dst)) for src, dst in sources]
+
+    def copy(pair):
+        try:
+            return pair, _copy_one(pair[0], pair[1], skip_unchanged,
+                                   preserve_mtime), None
+        except Exception as err:
+            return pair, None, err
+
+    report = CopyReport()
+    t0 = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for pair, result, err in pool.map(copy, pairs):
+            if err is not None:
+                report.errors.append((EPath(pair[0]), EPath(pair[1]), err))
+            elif result[0]:
+                report.copied += 1
+                report.bytes += result[1]
+            else:
+                report.skipped += 1
+    report.seconds = time.perf_counter() - t0
+    if report.errors and raise_errors:
+        raise report.errors[0][2]
+    return report
+
+
+def _scan_trees(roots, workers=None):
+    """
+    files and directories below each root, one scandir per directory.
+    Directories of all the roots are scanned in a pool of workers
+    threads, or serially when workers is None. Symlinks to directories
+    are not followed.
+
+    :returns: list of ({relative path: (size, mtime_ns)} of the files,
+              set of the relative paths of the directories), one per root
+    """
+    trees = [({}, set()) for _ in roots]
+
+    def scan(i, rel):
+        files, dirs = [], []
+        for entry in _scandir(os.path.join(roots[i], rel) if rel
+                              else roots[i]):
+            name = rel + "/" + entry.name if rel else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(name)
+                elif entry.is_file():
+                    st = entry.stat()
+                    files.append((name, st.st_size, st.st_mtime_ns))
+            except OSError:
+                # removed while scanned
+                continue
+        return i, files, dirs
+
+    def record(i, files, dirs):
+        tree_files, tree_dirs = trees[i]
+        for name, size, mtime_ns in files:
+            tree_files[name] = (size, mtime_ns)
+        tree_dirs.update(dirs)
+        return [(i, name) for name in dirs]
+
+    if not workers:
+        stack = [(i, "") for i in range(len(roots))]
+        while stack:
+            stack.extend(record(*scan(*stack.pop())))
+        return trees
+    with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(scan, i, "") for i in range(len(roots))}
+        while pending:
+            done, pending = futures.wait(
+                pending, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                pending.update(pool.submit(scan, i, name)
+                               for i, name in record(*future.result()))
+    return trees
+
+
+class RemoveReport:
+    """
+    summary of a tree removal, see EPath.removetree
+
+    :attr:
+    files : int
+        number of files (and symlinks...) removed
+    dirs : int
+        number of directories removed
+    seconds : float
+        wall time of the removal
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.dirs = 0
+        self.seconds = 0.
+        self._lock = threading.Lock()
+
+    def _add(self, files, dirs):
+        with self._lock:
+            self.files += files
+            self.dirs += dirs
+
+    def __repr__(self):
+        return "<RemoveReport {} files, {} dirs in {:.3f} s>".format(
+            self.files, self.dirs, self.seconds)
+
+
+_DIR_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW
+
+
+def _remove_contents(dir_fd, report):
+    """removes everything in the open directory dir_fd, depth first"""
+    with os.scandir(dir_fd) as entries:
+        entries = list(entries)
+    files = dirs = 0
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            fd = os.open(entry.name, _DIR_FLAGS, dir_fd=dir_fd)
+            try:
+                _remove_contents(fd, report)
+            finally:
+                os.close(fd)
+            os.rmdir(entry.name, dir_fd=dir_fd)
+            dirs += 1
+        else:
+            os.unlink(entry.name, dir_fd=dir_fd)
+            files += 1
+    report._add(files, dirs)
+
+
+def _remove_subtree(dir_fd, name, report):
+    """removes the subdirectory name of the open directory dir_fd"""
+    fd = os.open(name, _DIR_FLAGS, dir_fd=dir_fd)
+    try:
+        _remove_contents(fd, report)
+    finally:
+        os.close(fd)
+    os.rmdir(name, dir_fd=dir_fd)
+    report._add(0, 1)
+
+
+def _removetree(path_str, workers=None, contents_only=False):
+    """removes the directory path_str and its content, without the
+    checks of EPath.removetree
+
+    :rtype: RemoveReport
+    """
+    report = RemoveReport()
+    t0 = time.perf_counter()
+    fd = os.open(path_str, _DIR_FLAGS)
+    try:
+        if workers:
+            # files here, subdirectories in parallel
+            with os.scandir(fd) as entries:
+                entries = list(entries)
+            subdirs = []
+            files = 0
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                else:
+                    os.unlink(entry.name, dir_fd=fd)
+                    files += 1
+            report._add(files, 0)
+            with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(lambda name: _remove_subtree(fd, name, report),
+                              subdirs))
+        else:
+            _remove_contents(fd, report)
+    finally:
+        os.close(fd)
+        # removed paths below path_str can be anywhere in the caches
+        if _stat_cache is not None:
+            _stat_cache.invalidate()
+        if _image_cache is not None:
+            _image_cache.invalidate()
+        _changed(path_str)
+    if not contents_only:
+        os.rmdir(path_str)
+        report.dirs += 1
+        _changed(path_str)
+    report.seconds = time.perf_counter() - t0
+    return report
+
+
+class TreeDiff:
+    """
+    differences between a source and a destination directory tree, see
+    EPath.diff and EPath.sync. Paths are relative to the roots.
+
+    :attr:
+    new : list
+        files of src missing in dst
+    changed : list
+        files of both trees with a different size or mtime (or content,
+        when compared by checksum)
+    retimed : list
+        files with the same content but a different mtime, compared by
+        checksum : sync only sets their mtime
+    extra : list
+        files of dst missing in src, deleted by sync(delete=True).
+        A file of one tree which is a directory of the other is
+        replaced only then
+    new_dirs : list
+        directories of src missing in dst, parents first
+    extra_dirs : list
+        directories of dst missing in src, children first
+    unchanged : int
+        number of files identical in both trees
+    bytes : int
+        number of bytes to copy
+    report : CopyReport
+        copies done by sync, None for a diff or a dry run
+    deleted : int
+        number of files and directories deleted by sync
+    """
+
+    def __init__(self, src, dst):
+        self.src = src
+        self.dst = dst
+        self.new = []
+        self.changed = []
+        self.retimed = []
+        self.extra = []
+        self.new_dirs = []
+        self.extra_dirs = []
+        self.unchanged = 0
+        self.bytes = 0
+        self.report = None
+        self.deleted = 0
+
+    def __bool__(self):
+        return bool(self.new or self.changed or self.retimed or self.extra
+                    or self.new_dirs or self.extra_dirs)
+
+    def __repr__(self):
+        return ("<TreeDiff {} -> {} : {} new, {} changed, {} retimed, "
+                "{} extra, {} new dirs, {} extra dirs, {} unchanged, "
+                "{:.1f} MB to copy>").format(
+                    self.src, self.dst, len(self.new), len(self.changed),
+                    len(self.retimed), len(self.extra), len(self.new_dirs),
+                    len(self.extra_dirs), self.unchanged, self.bytes / 1e6)
+
+
+def _diff_trees(src, dst, checksum=False, algorithm="sha256", workers=8,
+                cache=None):
+    """compares the trees below src and dst, see EPath.diff
+
+    :rtype: TreeDiff
+    """
+    src, dst = EPath(os.path.abspath(str(src))), EPath(
+        os.path.abspath(str(dst)))
+    if not src.is_dir():
+        raise ValueError("cannot diff, not a dir")
+    if src == dst or dst.s.startswith(src.s.rstrip("/") + "/") \
+            or src.s.startswith(dst.s.rstrip("/") + "/"):
+        raise ValueError("cannot diff a tree with itself or a subtree")
+    diff = TreeDiff(src, dst)
+    trees = _scan_trees([src.s, dst.s] if dst.is_dir() else [src.s],
+                        workers)
+    (src_files, src_dirs), (dst_files, dst_dirs) = (
+        trees if len(trees) == 2 else trees + [({}, set())])
+    same_size = []
+    for name, (size, mtime_ns) in src_files.items():
+        other = dst_files.get(name)
+        if other is None:
+            diff.new.append(name)
+            diff.bytes += size
+        elif other[0] != size:
+            diff.changed.append(name)
+            diff.bytes += size
+        elif checksum:
+            same_size.append((name, other[1] != mtime_ns))
+        elif other[1] != mtime_ns:
+            diff.changed.append(name)
+            diff.bytes += size
+        else:
+            diff.unchanged += 1
+    if same_size:
+        if cache is None:
+            cache = _hash_cache
+        names = [name for name, _ in same_size]
+        with futures.ThreadPoolExecutor(max_workers=workers or 1) as pool:
+            src_digests = pool.map(lambda name: _digest(
+                os.path.join(src.s, name), algorithm, cache), names)
+            dst_digests = pool.map(lambda name: _digest(
+                os.path.join(dst.s, name), algorithm, cache), names)
+            for (name, retimed), a, b in zip(same_size, src_digests,
+                                             dst_digests):
+                if a != b:
+                    diff.changed.append(name)
+                    diff.bytes += src_files[name][0]
+                elif retimed:
+                    diff.retimed.append(name)
+                else:
+                    diff.unchanged += 1
+        if cache is not None:
+            cache.flush()
+    diff.extra = [name for name in dst_files if name not in src_files]
+    diff.new_dirs = sorted((name for name in src_dirs
+                            if name not in dst_dirs),
+                           key=lambda name: name.count("/"))
+    diff.extra_dirs = sorted((name for name in dst_dirs
+                              if name not in src_dirs),
+                             key=lambda name: -name.count("/"))
+    for changes in (diff.new, diff.changed, diff.retimed, diff.extra):
+        changes.sort()
+    return diff
+
+
+def _sync_trees(src, dst, delete=False, dry_run=False, checksum=False,
+                algorithm="sha256", workers=8, cache=None, raise_errors=True):
+    """makes dst a copy of src, see EPath.sync
+
+    :rtype: TreeDiff
+    """
+    diff = _diff_trees(src, dst, checksum=checksum, algorithm=algorithm,
+                       workers=workers, cache=cache)
+    if dry_run:
+        return diff
+    src, dst = diff.src.s, diff.dst.s
+    if delete:
+        # files first, then emptied directories, deepest first
+        for name in diff.extra:
+            path = os.path.join(dst, name)
+            os.remove(path)
+            _changed(path)
+            diff.deleted += 1
+        for name in diff.extra_dirs:
+            path = os.path.join(dst, name)
+            try:
+                os.rmdir(path)
+            except OSError:
+                # holds entries which are neither files nor directories
+                _removetree(path)
+            _changed(path)
+            diff.deleted += 1
+    os.makedirs(dst, exist_ok=True)
+    errors = []
+    for name in diff.new_dirs:
+        path = os.path.join(dst, name)
+        try:
+            os.makedirs(path, exist_ok=True)
+        except OSError as err:
+            # a file of dst, kept without delete=True
+            errors.append((EPath(os.path.join(src, name)), EPath(path), err))
+        _changed(path)
+    diff.report = copy_files(
+        [(os.path.join(src, name), os.path.join(dst, name))
+         for name in diff.new + diff.changed],
+        workers=workers or 1, skip_unchanged=False, preserve_mtime=True,
+        raise_errors=False)
+    diff.report.errors[:0] = errors
+    for name in diff.retimed:
+        st = os.stat(os.path.join(src, name))
+        os.utime(os.path.join(dst, name),
+                 ns=(st.st_atime_ns, st.st_mtime_ns))
+    if diff.report.errors and raise_errors:
+        raise diff.report.errors[0][2]
+    return diff
+
+
+class ImageCache:
+    """
+    LRU cache of decoded images, bounded by the total number of bytes of
+    the cached NumPy arrays, used by EPath.imread and imread_batch once
+    installed with enable_image_cache() or as a context manager.
+
+    Entries are keyed by (path, flags) and remember the mtime and size
+    of the file they were decoded from : a file that changed on disk is
+    decoded again. Cached arrays are read-only so that callers cannot
+    corrupt them, copy them (image.copy()) to modify them.
+
+    :Example:
+    >>> import tempfile
+    >>> path = EPath(tempfile.mkdtemp()).join("lena.png")
+    >>> path.imwrite(np.zeros((8, 8, 3), dtype=np.uint8))
+    >>> with ImageCache(max_bytes=10 ** 6) as cache:
+    ...     images = [path.imread() for _ in range(4)]
+    >>> cache.hits, cache.misses, cache.bytes
+    (3, 1, 192)
+    >>> images[0].flags.writeable
+    False
+    """
+
+    def __init__(self, max_bytes=512 * 2 ** 20):
+        """max_bytes bounds the total size of the cached arrays"""
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._previous = None
+
+    def imread(self, path, flags=None):
+        """
+        decoded image of the file path, from the cache if the file has
+        not changed since it was decoded
+
+        :rtype: read-only numpy.ndarray
+        """
+        st = os.stat(path)
+        key = (path, flags)
+        with self._lock:
+            cached = self._entries.get(key)
+            if (cached is not None and cached[0] == st.st_mtime_ns
+                    and cached[1] == st.st_size):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[2]
+            self.misses += 1
+        image = _decode(path, flags)
+        image.flags.writeable = False
+        if image.nbytes > self.max_bytes:
+            return image
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[2].nbytes
+            self._entries[key] = (st.st_mtime_ns, st.st_size, image)
+            self.bytes += image.nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+        return image
+
+    def invalidate(self, path=None):
+        """forgets the images decoded from path, or all of them"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self.bytes = 0
+                return
+            for key in [key for key in self._entries if key[0] == path]:
+                self.bytes -= self._entries.pop(key)[2].nbytes
+
+    def info(self):
+        """:returns: dict of hit/miss counters, bytes and images held"""
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "images": len(self._entries),
+                "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hit_rate": self.hits / float(total) if total else 0.}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __enter__(self):
+        global _image_cache
+        self._previous, _image_cache = _image_cache, self
+        return self
+
+    def __exit__(self, *exc_info):
+        global _image_cache
+        _image_cache, self._previous = self._previous, None
+
+    def __repr__(self):
+        return "<ImageCache {}>".format(self.info())
+
+
+# image cache used by imread, None when disabled
+_image_cache = None
+
+
+def enable_image_cache(max_bytes=512 * 2 ** 20):
+    """installs a new ImageCache used by EPath.imread and imread_batch
+
+    :rtype: ImageCache
+    """
+    global _image_cache
+    _image_cache = ImageCache(max_bytes=max_bytes)
+    return _image_cache
+
+
+def disable_image_cache():
+    """stops caching decoded images"""
+    global _image_cache
+    _image_cache = None
+
+
+def get_image_cache():
+    """:returns: the ImageCache in use, None if disabled"""
+    return _image_cache
+
+
+# compressed CSV files, by suffix
+_CSV_COMPRESSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "lzma",
+                     ".lzma": "lzma"}
+
+
+def _df_chunks(data, chunksize):
+    """row chunks of a pandas.DataFrame, or the chunks of an iterable
+    of DataFrames as they are produced"""
+    if isinstance(data, pd.DataFrame):
+        # an empty DataFrame still gives one chunk, for the header
+        for start in range(0, max(len(data), 1), chunksize):
+            yield data.iloc[start:start + chunksize]
+    else:
+        yield from data
+
+
+def _decode(path, flags=None):
+    """decodes the image at path with OpenCV, raises if it cannot"""
+    if flags is None:
+        image = cv2.imread(path)
+    else:
+        image = cv2.imread(path, flags)
+    if image is None:
+        raise ValueError("Could not read img at {}".format(path))
+    return image
+
+
+def _imread(path, flags=None):
+    """decodes the image at path, through the image cache if enabled"""
+    if _image_cache is not None:
+        return _image_cache.imread(path, flags)
+    return _decode(path, flags)
+
+
+def _imwrite(path, image, params=None):
+    """encodes image at path with OpenCV, raises if it cannot"""
+    try:
+        if params is None:
+            written = cv2.imwrite(path, image)
+        else:
+            written = cv2.imwrite(path, image, params)
+    finally:
+        _changed(path)
+    if not written:
+        raise ValueError("Could not write img at {}".format(path))
+
+
+def _prefetch(pool, func, items, prefetch, ordered):
+    """submits func(item) to pool for each item of the iterable items,
+    keeping at most prefetch calls in flight, and yields
+    (item, result) in the order of items or as calls complete"""
+    # ordered : deque of (item, future), otherwise {future: item}
+    inflight = collections.deque() if ordered else {}
+    try:
+        for item in items:
+            future = pool.submit(func, item)
+            if ordered:
+                inflight.append((item, future))
+                if len(inflight) >= prefetch:
+                    item, future = inflight.popleft()
+                    yield item, future.result()
+            else:
+                inflight[future] = item
+                if len(inflight) >= prefetch:
+                    done, _ = futures.wait(
+                        inflight, return_when=futures.FIRST_COMPLETED)
+                    for future in done:
+                        yield inflight.pop(future), future.result()
+        if ordered:
+            while inflight:
+                item, future = inflight.popleft()
+                yield item, future.result()
+        else:
+            for future in futures.as_completed(list(inflight)):
+                yield inflight.pop(future), future.result()
+    finally:
+        for future in (inflight if not ordered
+                       else (future for _, future in inflight)):
+            future.cancel()
+
+
+def imread_batch(paths, workers=8, prefetch=None, flags=None, ordered=True):
+    """
+    decodes images in a pool of threads (OpenCV releases the GIL while
+    decoding), reading ahead of the consumer while keeping at most
+    prefetch images in flight
+
+    :param paths: iterable of EPath or str (consumed lazily, e.g. from
+                  EPath.iglob), or a glob pattern
+    :param workers: number of decoding threads
+    :param prefetch: maximum number of images decoded ahead, by default
+                     twice the number of workers
+    :param flags: cv2.imread flags, e.g. cv2.IMREAD_GRAYSCALE
+    :param ordered: yields images in the order of paths, otherwise
+                    as soon as they are decoded
+    :rtype: generator of (EPath, numpy.ndarray)
+
+    :Example:
+    >>> import tempfile
+    >>> root = EPath(tempfile.mkdtemp())
+    >>> image = np.zeros((4, 6, 3), dtype=np.uint8)
+    >>> imwrite_batch((root.join("{}.png".format(i)), image)
+    ...               for i in range(3))
+    3
+    >>> [(p.basename.s, img.shape) for p, img in
+    ...  imread_batch(sorted(root.glob("*.png"), key=str))]
+    [('0.png', (4, 6, 3)), ('1.png', (4, 6, 3)), ('2.png', (4, 6, 3))]
+    """
+    if isinstance(paths, str):
+        paths = glob.iglob(paths)
+    paths = (EPath(path) for path in paths)
+    prefetch = prefetch or 2 * workers
+
+    def read(path):
+        return _imread(path.path_str, flags)
+
+    with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from _prefetch(pool, read, paths, prefetch, ordered)
+
+
+def imwrite_batch(items, workers=8, prefetch=None, params=None):
+    """
+    encodes and writes images in a pool of threads. Each write is
+    checked with the value returned by OpenCV, no exists() call needed.
+
+    :param items: iterable of (path, image) pairs, consumed lazily so
+                  that at most prefetch images wait in memory
+    :param workers: number of encoding threads
+    :param params: cv2.imwrite parameters, e.g. [cv2.IMWRITE_PNG_COMPRESSION, 1]
+    :returns: number of images written
+    """
+    prefetch = prefetch or 2 * workers
+
+    def write(item):
+        _imwrite(str(item[0]), item[1], params)
+
+    count = 0
+    with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in _prefetch(pool, write, items, prefetch, ordered=False):
+            count += 1
+    return count
+
+
+# executor running the EPath coroutines (a-prefixed methods)
+_async_workers = min(32, (os.cpu_count() or 1) + 4)
+_async_executor = None
+_async_limits = weakref.WeakKeyDictionary()
+
+
+def set_async_workers(workers):
+    """sets the number of threads running EPath coroutines, which is also
+    the global limit of file operations in flight at once"""
+    global _async_workers, _async_executor
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    _async_workers = workers
+    if _async_executor is not None:
+        _async_executor.shutdown(wait=False)
+        _async_executor = None
+    _async_limits.clear()
+
+
+def _async_limit():
+    """semaphore of the running event loop bounding operations in flight"""
+    loop = asyncio.get_running_loop()
+    limit = _async_limits.get(loop)
+    if limit is None:
+        limit = _async_limits[loop] = asyncio.Semaphore(_async_workers)
+    return limit
+
+
+async def _arun(func, *args):
+    """runs the blocking call func(*args) in the EPath executor without
+    blocking the event loop"""
+    global _async_executor
+    async with _async_limit():
+        if _async_executor is None:
+            _async_executor = futures.ThreadPoolExecutor(
+                max_workers=_async_workers,
+                thread_name_prefix="epath-async")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_async_executor, func, *args)
+
+
+def _take(iterator, size):
+    """next size items of iterator, as a list"""
+    return list(itertools.islice(iterator, size))
+
+
+async def acopy_all(paths, dir, return_exceptions=False):
+    """
+    copies concurrently every path of paths to the directory dir
+
+    :see: EPath.acopyto
+    :param return_exceptions: as in asyncio.gather, returns errors
+                              in the results instead of raising the first
+    :returns: list of results, in the order of paths
+    """
+    return await asyncio.gather(*(EPath(path).acopyto(dir)
+                                  for path in paths),
+                                return_exceptions=return_exceptions)
+
+
+async def aremove_all(paths, return_exceptions=False):
+    """
+    removes concurrently every file of paths
+
+    :see: EPath.aremovefile
+    :returns: list of results, in the order of paths
+    """
+    return await asyncio.gather(*(EPath(path).aremovefile()
+                                  for path in paths),
+                                return_exceptions=return_exceptions)
 
 
 # def replace_dir(path_obj, newdir):
@@ -96,11 +1455,24 @@ class EPath:
     path_str : str
         string representing the path
     path_obj : pathlib.Path
-        pathlib.Path object representing the path
+        pathlib.Path object representing the path, only built when
+        it is asked for
+
+    EPath instances are slotted and immutable : derived components
+    (parent, stem, suffix, basename) are computed from path_str once,
+    on first access, and kept on the instance.
+
+    EPath objects yielded by iglob and walk also keep the os.DirEntry
+    they were found with, so that exists, is_dir, is_file and file_size
+    are answered from the directory scan without any extra syscall.
+    This information is a snapshot, EPath(path) gives a fresh object.
 
     :methods:
     """
 
+    __slots__ = ("path_str", "_path_obj",
+                 "_parent", "_stem", "_suffix", "_basename", "_entry")
+
     def __init__(self, obj, mkdir=False):
         """init function can take different objects such as :
            - str obj
@@ -111,20 +1483,70 @@ class EPath:
                 self.path_str = obj[:-1]
             else:
                 self.path_str = obj
-            self.path_obj = pathlib.Path(self.path_str)
+            self._path_obj = None
         elif isinstance(obj, pathlib.Path):
-            self.path_obj = obj
+            self._path_obj = obj
             self.path_str = str(obj)
         elif isinstance(obj, EPath):
-            self.path_obj = obj.path_obj
+            self._path_obj = obj._path_obj
             self.path_str = obj.path_str
         else:
             raise ValueError("not a str, not a pathlib.Path obj, "
                              "not a EPath !")
+        self._parent = self._stem = self._suffix = self._basename = None
+        self._entry = None
 
         if mkdir:
             self.mkdir()
 
+    @classmethod
+    def _from_str(cls, path_str):
+        """fast constructor for already cleaned strings,
+        used internally to build derived EPath objects"""
+        path = object.__new__(cls)
+        path.path_str = path_str
+        path._path_obj = None
+        path._parent = path._stem = path._suffix = path._basename = None
+        path._entry = None
+        return path
+
+    @classmethod
+    def _from_entry(cls, entry):
+        """builds an EPath from an os.DirEntry, keeping the entry
+        as a cache of the file type and stat information"""
+        path = cls._from_str(entry.path)
+        path._entry = entry
+        return path
+
+    @property
+    def path_obj(self):
+        """pathlib.Path object representing the path, built on first use"""
+        if self._path_obj is None:
+            self._path_obj = pathlib.Path(self.path_str)
+        return self._path_obj
+
+    def _is_normalized(self):
+        """tests if path_str is already written the way pathlib would
+        write it, in which case components can be computed on the string"""
+        s = self.path_str
+        return not (s in ("", ".") or "//" in s or "/./" in s
+                    or s.startswith("./") or s.endswith("/.")
+                    or (s.endswith("/") and s != "/"))
+
+    def _name(self):
+        """last component of the path, as pathlib.Path.name"""
+        if self._is_normalized():
+            return self.path_str.rpartition('/')[2]
+        return self.path_obj.name
+
+    def _split_name(self):
+        """splits the name in (stem, suffix), as pathlib.Path does"""
+        name = self._name()
+        i = name.rfind('.')
+        if 0 < i < len(name) - 1:
+            return name[:i], name[i:]
+        return name, ""
+
     @property
     def parent(self):
         """
@@ -136,14 +1558,28 @@ class EPath:
 
         :Example:
         >>> path = EPath("/dirA/dirB/myfile.ext")
-        >>> path.parent()
+        >>> path.parent
         /dirA/dirB
-        >>> path.parent().parent()
+        >>> path.parent.parent
         /dirA
-        >>> isinstance(path.parent().parent(), EPath)
+        >>> isinstance(path.parent.parent, EPath)
         True
+        >>> EPath("myfile.ext").parent
+        .
         """
-        return EPath(self.path_obj.parent)
+        if self._parent is None:
+            if self._is_normalized():
+                head, sep, _ = self.path_str.rpartition('/')
+                if not sep:
+                    parent = "."
+                elif not head:
+                    parent = "/"
+                else:
+                    parent = head
+                self._parent = EPath._from_str(parent)
+            else:
+                self._parent = EPath(self.path_obj.parent)
+        return self._parent
 
     @property
     def stem(self):
@@ -156,14 +1592,19 @@ class EPath:
 
         :Example:
         >>> path = EPath("/dirA/dirB/myfile.ext1.ext2")
-        >>> path.stem()
+        >>> path.stem
         myfile.ext1
-        >>> path.stem().stem()
+        >>> path.stem.stem
         myfile
-        >>> path.stem().stem().stem()
+        >>> path.stem.stem.stem
         myfile
         """
-        return EPath(self.path_obj.stem)
+        if self._stem is None:
+            stem, suffix = self._split_name()
+            self._stem = EPath._from_str(stem)
+            if self._suffix is None:
+                self._suffix = EPath._from_str(suffix)
+        return self._stem
 
     # def stem_noparam(self):
     #     """:returns the current path stem without stem suffix"""
@@ -180,12 +1621,14 @@ class EPath:
 
         :Example:
         >>> path = EPath("/dirA/dirB/myfile.ext1.ext2")
-        >>> path.basename()
+        >>> path.basename
         myfile.ext1.ext2
-        >>> path.basename().basename()
+        >>> path.basename.basename
         myfile.ext1.ext2
         """
-        return EPath(os.path.basename(self.path_str))
+        if self._basename is None:
+            self._basename = EPath._from_str(os.path.basename(self.path_str))
+        return self._basename
 
     @property
     def suffix(self):
@@ -199,15 +1642,17 @@ class EPath:
 
         :Example:
         >>> path = EPath("/dirA/dirB/myfile.ext1.ext2")
-        >>> path.suffix()
+        >>> path.suffix
         .ext2
-        >>> path.stem().suffix()
+        >>> path.stem.suffix
         .ext1
-        >>> path.stem().stem().suffix().string()
+        >>> path.stem.stem.suffix.string()
         ''
 
         """
-        return EPath(self.path_obj.suffix)
+        if self._suffix is None:
+            self.stem
+        return self._suffix
 
     def has_suffix(self):
         """
@@ -225,7 +1670,7 @@ class EPath:
         >>> path.has_suffix()
         False
         """
-        if len(self.suffix()) == 0:
+        if len(self.suffix) == 0:
             return False
         else:
             return True
@@ -249,61 +1694,239 @@ class EPath:
         p = ".".join([self.path_str, suffix])
         return EPath(p)
 
+    def _changed(self):
+        """forgets cached filesystem information about the path,
+        called by the methods modifying it"""
+        self._entry = None
+        _changed(self.path_str)
+
     def exists(self):
         """tests if path exists on the hdd"""
+        if self._entry is not None:
+            return True
+        if _indexes:
+            index, abs_path = _index_for(self.path_str)
+            if index is not None:
+                return index.exists(abs_path)
+        if _stat_cache is not None:
+            return _stat_cache.stat(self.path_str) is not None
         return os.path.exists(self.path_str)
 
     def is_dir(self):
         """tests if path is a directory"""
+        if self._entry is not None:
+            return self._entry.is_dir()
+        if _indexes:
+            index, abs_path = _index_for(self.path_str)
+            if index is not None:
+                return index.is_dir(abs_path)
+        if _stat_cache is not None:
+            st = _stat_cache.stat(self.path_str)
+            return st is not None and stat.S_ISDIR(st.st_mode)
         return os.path.isdir(self.path_str)
 
     def is_file(self):
         """tests if path is a file"""
+        if self._entry is not None:
+            return self._entry.is_file()
+        if _indexes:
+            index, abs_path = _index_for(self.path_str)
+            if index is not None:
+                return index.is_file(abs_path)
+        if _stat_cache is not None:
+            st = _stat_cache.stat(self.path_str)
+            return st is not None and stat.S_ISREG(st.st_mode)
         return os.path.isfile(self.path_str)
 
     def is_readable(self):
         """tests for read access"""
+        if _stat_cache is not None:
+            return _access(_stat_cache.stat(self.path_str), os.R_OK)
         return os.access(self.path_str, os.R_OK)
 
     def is_writable(self):
         """test for write access"""
+        if _stat_cache is not None:
+            return _access(_stat_cache.stat(self.path_str), os.W_OK)
         return os.access(self.path_str, os.W_OK)
 
     def is_executable(self):
+        if _stat_cache is not None:
+            return _access(_stat_cache.stat(self.path_str), os.X_OK)
         return os.access(self.path_str, os.X_OK)
 
     @property
     def file_size(self):
+        if self._entry is not None:
+            return self._entry.stat().st_size
+        if _indexes:
+            index, abs_path = _index_for(self.path_str)
+            if index is not None:
+                return index.file_size(abs_path)
+        if _stat_cache is not None:
+            st = _stat_cache.stat(self.path_str)
+            if st is None:
+                raise FileNotFoundError(self.path_str)
+            return st.st_size
         return self.path_obj.stat().st_size
     
-    def mkdir(self, raiseException=False):
-        """silent mkdir"""
-        if not self.exists():
-            os.mkdir(self.path_str)
-        else:
-            if raiseException:
-                os.mkdir(self.path_str)
+    def mkdir(self, raiseException=False, parents=False):
+        """
+        silent mkdir, with parents=True also creates the missing
+        parent directories
 
-    def touch(self):
-        """creates a file at the current path but does
-        not erase its content if it exists"""
+        :Example:
+        >>> import tempfile
+        >>> root = EPath(tempfile.mkdtemp())
+        >>> with StatCache():
+        ...     root.join("a").exists()
+        ...     root.join("a/b/c").mkdir(parents=True)
+        ...     root.join("a").exists(), root.join("a/b").exists()
+        False
+        (True, True)
+        """
+        created = []
+        try:
+            if parents:
+                # the missing ancestors, created too, are invalidated
+                head = os.path.dirname(self.path_str)
+                while head and not os.path.exists(head):
+                    created.append(head)
+                    head = os.path.dirname(head)
+                os.makedirs(self.path_str)
+            else:
+                os.mkdir(self.path_str)
+        except FileExistsError:
+            if raiseException:
+                raise
+        self._changed()
+        for path_str in created:
+            _changed(path_str)
+
+    def make_tree(self, spec, values=None, workers=None):
+        """
+        creates a whole directory tree under the current path in one call.
+        The spec is a nested dict of directory names, a leaf being None,
+        {} or a list of names. Names can contain '/' and {field}
+        templates, expanded over every combination of values[field].
+
+        Only missing directories are created : existing directories are
+        listed once with scandir, so running it again on a complete tree
+        costs one scandir per directory. Existing directories are kept.
+
+        :param values: dict of field: iterable of values for the templates
+        :param workers: creates each level of the tree in a pool of that
+                        many threads, None creates serially. Worth it on
+                        network filesystems, where each mkdir is a round
+                        trip, local ones serialize mkdirs in one directory
+        :rtype: EPathTree
+        :returns: the tree, its subdirectories are attributes
+
+        :Example:
+        >>> import tempfile
+        >>> root = EPath(tempfile.mkdtemp()).join("root_dir")
+        >>> spec = {"data": ["csv", "tex"], "images": None,
+        ...         "experiments": {"{model}_{seed}": ["logs"]}}
+        >>> values = {"model": ["cnn", "mlp"], "seed": range(2)}
+        >>> tree = root.make_tree(spec, values)
+        >>> tree.created
+        14
+        >>> tree.experiments.cnn_1.logs  # doctest: +ELLIPSIS
+        /.../root_dir/experiments/cnn_1/logs
+        >>> tree.data.csv.is_dir()
+        True
+        >>> root.make_tree(spec, values).created
+        0
+        """
+        tree = EPathTree(self)
+        _tree_children(tree, spec, values or {})
+        exists = self.is_dir()
+        if not exists:
+            self.mkdir(parents=True)
+        levels = []
+        _missing_dirs(tree, exists, levels, 0)
+        for level in levels:
+            # a level only needs its parents, created with the level above
+            if workers and len(level) > 1:
+                with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+                    list(pool.map(_mkdir_exist_ok, level))
+            else:
+                for path in level:
+                    _mkdir_exist_ok(path)
+        tree.created = int(not exists) + sum(map(len, levels))
+        return tree
+
+    def touch(self):
+        """creates a file at the current path but does
+        not erase its content if it exists"""
         self.path_obj.touch()
+        self._changed()
 
     def removefile(self):
         """removes the file at the current path"""
-        if self.is_file():
-            if self.exists():
-                return os.remove(self.path_str)
-        else:
+        try:
+            os.remove(self.path_str)
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
             raise ValueError("This is not a file !")
+        self._changed()
 
     def removedir(self):
-        """removes the directory at the current path"""
-        if self.is_dir():
-            if self.exists():
-                return os.rmdir(self.path_str)
-        else:
+        """removes the empty directory at the current path,
+        see removetree for a directory and its content"""
+        try:
+            os.rmdir(self.path_str)
+        except (FileNotFoundError, NotADirectoryError):
+            raise ValueError("This is not a directory !")
+        self._changed()
+
+    def removetree(self, root, workers=None, contents_only=False):
+        """
+        removes the directory at the current path and everything below
+        it. Directories are listed with scandir and their entries removed
+        relatively to an open directory descriptor : one unlink per file,
+        no stat, and no path resolution above the directory.
+
+        As a guard against removing the wrong tree, the path must be
+        strictly below root, which the caller declares, and can not be
+        '/' or a symlink.
+
+        :param root: directory the current path must be below
+        :param workers: removes the subdirectories in a pool of that many
+                        threads, None removes serially
+        :param contents_only: keeps the directory itself, empty
+        :rtype: RemoveReport
+
+        :Example:
+        >>> import tempfile
+        >>> root = EPath(tempfile.mkdtemp())
+        >>> run_dir = root.join("run_1")
+        >>> tree = run_dir.make_tree({"logs": None, "ckpt": None})
+        >>> for name in ["logs/a.txt", "ckpt/b.pt", "c.csv"]:
+        ...     run_dir.join(name).write("x")
+        >>> report = run_dir.removetree(root)
+        >>> report.files, report.dirs, run_dir.exists()
+        (3, 3, False)
+        >>> root.removetree(root)
+        Traceback (most recent call last):
+        ...
+        ValueError: refusing to remove a tree which is not below its root
+        """
+        path_str = os.path.realpath(self.path_str)
+        root_str = os.path.realpath(str(root))
+        if path_str == "/" or not path_str.startswith(
+                root_str.rstrip("/") + "/"):
+            raise ValueError("refusing to remove a tree which is not below "
+                             "its root")
+        try:
+            st = os.lstat(self.path_str)
+        except FileNotFoundError:
+            raise ValueError("This is not a directory !")
+        if stat.S_ISLNK(st.st_mode):
+            raise ValueError("refusing to remove a tree through a symlink")
+        if not stat.S_ISDIR(st.st_mode):
             raise ValueError("This is not a directory !")
+        return _removetree(self.path_str, workers=workers,
+                           contents_only=contents_only)
 
     def replace_parents(self, new_parents):
         """
@@ -390,20 +2013,53 @@ class EPath:
         path = os.path.join(self.parent.s, basename)
         return EPath(path)
 
-    # def add_param(self, psuffix, sep='_', obj=True):
-    #     """add parameters suffix after stem"""
-    #     # if dict then name params in psuffix
-    #     # else just put values
-    #     if isinstance(psuffix, dict):
-    #         keys = list(map(str, psuffix.keys()))
-    #         values = list(map(str, psuffix.values()))
-    #         ssuffix = "_".join("".join(item) for item in zip(keys, values))
-    #     elif isinstance(psuffix, list) or isinstance(psuffix, tuple):
-    #         ssuffix = "_".join(map(str, psuffix))
-    #     else:
-    #         raise ValueError("psuffix has not the right type")
-    #
-    #     return self.add_after_stem(ssuffix, obj=obj)
+    def add_param(self, psuffix, sep='_', codec=None):
+        """
+        add parameters suffix after stem, a dict is written as key+value
+        pairs, a list or tuple as values only. Dots of float values are
+        replaced (see ParamCodec), '.' stays for suffixes.
+
+        :param codec: ParamCodec, by default one is built from the
+                      types of the dict values
+        :rtype: EPath
+
+        :Example:
+        >>> path = EPath("/dirA/dirB/myfile.csv")
+        >>> path.add_param({"lr": 0.01, "bs": 32, "model": "cnn"})
+        /dirA/dirB/myfile_lr0f01_bs32_modelcnn.csv
+        >>> path.add_param([90.0, 3])
+        /dirA/dirB/myfile_90f0_3.csv
+        >>> path.add_param({"lr": np.float64(0.1), "bs": np.int64(8)})
+        /dirA/dirB/myfile_lr0f1_bs8.csv
+        """
+        if isinstance(psuffix, dict):
+            if codec is None:
+                codec = ParamCodec({key: _param_type(type(value))
+                                    for key, value in psuffix.items()},
+                                   sep=sep)
+            ssuffix = codec.encode(psuffix)
+        elif isinstance(psuffix, (list, tuple)):
+            ssuffix = sep.join(ParamCodec.encode_value(value)
+                               for value in psuffix)
+        else:
+            raise ValueError("psuffix has not the right type")
+        return self.add_after_stem(ssuffix, sep=sep)
+
+    def params(self, codec):
+        """
+        decodes the parameters written by add_param
+
+        :param codec: ParamCodec or schema dict of the parameters
+        :rtype: dict
+
+        :Example:
+        >>> path = EPath("/dirA/dirB/myfile_lr0f01_bs32_modelcnn.csv")
+        >>> path.params({"lr": float, "bs": int, "model": str})
+        {'lr': 0.01, 'bs': 32, 'model': 'cnn'}
+        """
+        if not isinstance(codec, ParamCodec):
+            codec = ParamCodec(codec)
+        return codec.decode(self)
 
     def join(self, extrapath):
         """receive a path and append it to the current path
@@ -442,23 +2098,250 @@ class EPath:
         return a list of EPath file names that have been globbed
         """
         p = self.join(pattern)
+        if _indexes:
+            base, prefix, parts = _split_glob(p.s)
+            index, _ = _index_for(base or '.')
+            if index is not None:
+                return list(index._iglob(base, prefix, parts,
+                                         recursive=False))
         globbed = glob.glob(str(p))
         return [EPath(f) for f in globbed]
 
-#     def imread(self, **kwds):
-#         """reads an image using OpenCV"""
-#         return cv2.imread(self.path_str, **kwds)
+    def build_index(self, db=None, full=False):
+        """
+        builds, or refreshes, a persistent EPathIndex of the tree
+        under the current path
+
+        :see: EPathIndex
+        :rtype: EPathIndex
+        """
+        index = EPathIndex(self, db=db)
+        index.refresh(full=full)
+        return index
+
+    def iglob(self, pattern, suffix=None, min_size=None, max_size=None,
+              newer_than=None, older_than=None, only=None,
+              workers=None, ordered=False):
+        """
+        lazy version of glob built on os.scandir : EPath objects are
+        yielded while directories are being scanned, '**' matches any
+        number of subdirectories (hidden directories and symlinks to
+        directories are not followed)
+
+        Unlike glob.glob(..., recursive=True), a trailing '**' yields
+        what is below the directory it starts from, not that directory
+        itself : root.iglob("**") yields the content of root, and
+        root.iglob("a/**") the content of root/a.
+
+        With workers, directories are listed (and pre-filters stat'ed) by
+        a pool of threads, which pays off on network filesystems where
+        each scandir/stat is a round trip. Results are yielded directory
+        by directory as soon as they are listed, in no particular order.
+        ordered=True yields entries sorted by name, depth first, the same
+        sequence with or without workers (scans still run ahead in
+        parallel).
+
+        The yielded EPath objects keep their os.DirEntry, so is_file,
+        is_dir, exists and file_size do not hit the filesystem again.
+
+        :param pattern: glob pattern relative to the current path
+        :param suffix: str or tuple of str, keeps names ending with it
+        :param min_size: keeps files of at least min_size bytes
+        :param max_size: keeps files of at most max_size bytes
+        :param newer_than: keeps entries modified after this timestamp
+        :param older_than: keeps entries modified before this timestamp
+        :param only: 'file' or 'dir' to keep one type of entries
+        :param workers: number of threads listing directories,
+                        None for a serial scan
+        :param ordered: deterministic, sorted by name, depth first order
+        :rtype: generator of EPath
+
+        :Example:
+        >>> import tempfile
+        >>> root = EPath(tempfile.mkdtemp())
+        >>> root.join("a").mkdir()
+        >>> root.join("a/x.png").touch()
+        >>> root.join("y.png").write("some content", mode="w")
+        >>> sorted(p.basename.s for p in root.iglob("**/*.png"))
+        ['x.png', 'y.png']
+        >>> [p.basename for p in root.iglob("**", suffix="png", min_size=1)]
+        [y.png]
+        >>> [p.basename for p in root.iglob("**", ordered=True, workers=4)]
+        [a, x.png, y.png]
+        >>> for name in ["c", "b"]:
+        ...     root.join(name).mkdir()
+        ...     root.join([name, "z.png"]).touch()
+        >>> [p.parent.basename for p in root.iglob("*/*.png", ordered=True)]
+        [a, b, c]
+        """
+        root = "/" if pattern.startswith('/') else self.path_str
+        matchers = [_compile_part(part) for part in pattern.split('/')
+                    if part]
+        if not matchers:
+            return
+        accept = _entry_filter(suffix, min_size, max_size,
+                               newer_than, older_than, only)
+        if workers:
+            entries = _iglob_entries_parallel(root, matchers, accept,
+                                              ordered, workers)
+        else:
+            entries = _iglob_entries(root, matchers, accept, ordered)
+        for entry in entries:
+            yield EPath._from_entry(entry)
+
+    def walk(self, top_down=True):
+        """
+        walks the directory tree under the current path with os.scandir,
+        like os.walk but with EPath objects
+
+        Modifying dirs in place when top_down is True prunes the walk.
+        Symlinks to directories are listed in dirs but not followed.
+
+        :rtype: generator of (EPath, list of EPath, list of EPath)
+        :returns: (dirpath, dirs, files) for each directory
+        """
+        stack = [self]
+        while stack:
+            top = stack.pop()
+            if isinstance(top, tuple):
+                # bottom-up, children already yielded
+                yield top
+                continue
+            dirs, files, subdirs = [], [], []
+            for entry in _scandir(top.path_str):
+                path = EPath._from_entry(entry)
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    dirs.append(path)
+                    if not entry.is_symlink():
+                        subdirs.append(path)
+                else:
+                    files.append(path)
+            if top_down:
+                yield top, dirs, files
+                followed = set(map(id, subdirs))
+                subdirs = [d for d in dirs if id(d) in followed]
+            else:
+                stack.append((top, dirs, files))
+            stack.extend(reversed(subdirs))
+
+    def imread(self, flags=None):
+        """reads an image using OpenCV, see imread_batch to read
+        many images in parallel and ImageCache to cache them"""
+        return _imread(self.path_str, flags)
 
-#     def imwrite(self, img):
-#         """write an image (numpy array) using OpenCV"""
-#         r = cv2.imwrite(self.path_str, img)
-#         msg = "Could not write img at {}".format(self.path_str)
-#         assert self.exists(), msg
+    def imwrite(self, img, params=None):
+        """write an image (numpy array) using OpenCV"""
+        _imwrite(self.path_str, img, params)
 
-    def write(self, content, mode=""):
-        """write content to the current path"""
-        with open(self.path_str, mode=mode) as fd:
-            fd.write(content)
+    def mmap(self, writable=False):
+        """
+        maps the file at the current path in memory : its content is
+        loaded lazily, page by page, and shared through the page cache
+        with every other process mapping it
+
+        :param writable: changes made to the map are written to the file
+        :rtype: mmap.mmap (empty files give an empty bytes object)
+        """
+        flags = os.O_RDWR if writable else os.O_RDONLY
+        fd = os.open(self.path_str, flags)
+        try:
+            if os.fstat(fd).st_size == 0:
+                return b""
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            return mmap.mmap(fd, 0, access=access)
+        finally:
+            os.close(fd)
+
+    def read_buffer(self):
+        """
+        zero-copy read of the file at the current path : a read-only
+        memoryview backed by mmap, which can be sliced, or given to
+        numpy.frombuffer, without copying the file in memory
+
+        :rtype: memoryview
+
+        :Example:
+        >>> import tempfile
+        >>> path = EPath(tempfile.mkdtemp()).join("dump.bin")
+        >>> path.write(bytes(range(10)), mode="wb")
+        >>> buffer = path.read_buffer()
+        >>> len(buffer), bytes(buffer[2:5])
+        (10, b'\\x02\\x03\\x04')
+        """
+        return memoryview(self.mmap())
+
+    def memmap(self, dtype="uint8", shape=None, offset=0, mode="r"):
+        """
+        raw NumPy array mapped on the file at the current path,
+        see numpy.memmap
+
+        :param dtype: data type of the array
+        :param shape: shape of the array, by default a 1-d array of the
+                      whole file (after offset)
+        :param offset: position of the array in the file, in bytes
+        :param mode: 'r' read-only, 'r+' read-write, 'c' copy-on-write,
+                     'w+' creates or overwrites the file (shape required)
+        :rtype: numpy.memmap
+
+        :Example:
+        >>> import tempfile
+        >>> path = EPath(tempfile.mkdtemp()).join("features.f32")
+        >>> features = path.memmap("float32", shape=(1000, 16), mode="w+")
+        >>> features[:, 0] = 1.
+        >>> features.flush()
+        >>> path.memmap("float32", shape=(1000, 16))[10:12, :2].tolist()
+        [[1.0, 0.0], [1.0, 0.0]]
+        """
+        array = np.memmap(self.path_str, dtype=dtype, mode=mode,
+                          offset=offset, shape=shape)
+        if mode != "r":
+            self._changed()
+        return array
+
+    def write(self, content, mode="w", atomic=False):
+        """
+        write content to the current path, with atomic=True
+        readers never see a half written file (see EPathWriter)
+
+        :Example:
+        >>> import tempfile
+        >>> root = EPath(tempfile.mkdtemp())
+        >>> root.join("a.txt").write("x")
+        >>> path = next(root.iglob("*.txt"))
+        >>> path.write("x" * 10)
+        >>> path.file_size
+        10
+        """
+        with EPathWriter(self, mode=mode, atomic=atomic) as writer:
+            writer.write(content)
+
+    def writer(self, mode="w", buffering=-1, flush_every=None,
+               fsync="never", atomic=False, encoding=None):
+        """
+        opens a reusable writer handle on the current path, to be closed
+        or used in a with statement. Frequent small writes go through
+        one buffered file instead of an open/close pair each.
+
+        :see: EPathWriter for the parameters
+        :rtype: EPathWriter
+        """
+        return EPathWriter(self, mode=mode, buffering=buffering,
+                           flush_every=flush_every, fsync=fsync,
+                           atomic=atomic, encoding=encoding)
+
+    def sink(self, batch_size=1000):
+        """
+        opens an append sink consolidated into the current path, which
+        many processes can open at the same time (one sink per process)
+
+        :see: EPathSink for the parameters
+        :rtype: EPathSink
+        """
+        return EPathSink(self, batch_size=batch_size)
 
     # def write_csv(self, csv_content):
     #     if self.has_suffix():
@@ -474,28 +2357,308 @@ class EPath:
             fname = self.replace_suffix(".csv").string()
         else:
             fname = self.add_suffix(".csv").string()
-        df.to_csv(fname, sep=sep)
+        EPath._from_str(fname).writedf(df, sep=sep)
+
+    def writedf(self, data, sep=";", index=True, chunksize=100000,
+                compression=None):
+        """
+        streams a pandas.DataFrame, or an iterable (e.g. a generator) of
+        DataFrame chunks with the same columns, to the current path
+        chunk by chunk, in the format given by the suffix :
+           - .csv (any other suffix) : CSV separated by sep
+           - .csv.gz, .csv.bz2, .csv.xz : compressed CSV
+           - .parquet, .pq : Parquet, one row group per chunk (pyarrow)
+           - .feather, .arrow : Feather v2 / Arrow IPC file (pyarrow)
+
+        :param chunksize: number of rows written at once when data is a
+                          single DataFrame
+        An empty iterable writes a file without columns nor rows, in
+        every format.
+
+        :param compression: Parquet/Feather codec ('snappy', 'zstd',
+                            'lz4'...), None for the pyarrow default
+        :returns: number of rows written
 
-    def write_tex(self, tex_content, mode="w"):
+        :Example:
+        >>> import tempfile
+        >>> path = EPath(tempfile.mkdtemp()).join("results.csv.gz")
+        >>> chunks = (pd.DataFrame({"run": [i], "loss": [1. / (i + 1)]})
+        ...           for i in range(3))
+        >>> path.writedf(chunks, index=False)
+        3
+        >>> pd.read_csv(path.s, sep=";").shape
+        (3, 2)
+        >>> empty = path.parent.join("empty.parquet")
+        >>> empty.writedf(iter([])), pd.read_parquet(empty.s).shape
+        (0, (0, 0))
+        """
+        suffix = self.suffix.s.lower()
+        chunks = _df_chunks(data, chunksize)
+        rows = 0
+        try:
+            if suffix in (".parquet", ".pq", ".feather", ".arrow"):
+                def open_writer(schema):
+                    if suffix in (".parquet", ".pq"):
+                        return pq.ParquetWriter(
+                            self.path_str, schema,
+                            compression=compression or "snappy")
+                    return pa.ipc.new_file(
+                        self.path_str, schema,
+                        options=pa.ipc.IpcWriteOptions(
+                            compression=compression))
+
+                writer = None
+                try:
+                    for chunk in chunks:
+                        table = pa.Table.from_pandas(chunk,
+                                                     preserve_index=index)
+                        if writer is None:
+                            writer = open_writer(table.schema)
+                        writer.write_table(table)
+                        rows += len(chunk)
+                    if writer is None:
+                        # no chunk : like the CSV, a file without columns
+                        writer = open_writer(pa.schema([]))
+                finally:
+                    if writer is not None:
+                        writer.close()
+            else:
+                if suffix in _CSV_COMPRESSIONS:
+                    module = importlib.import_module(
+                        _CSV_COMPRESSIONS[suffix])
+                    fd = module.open(self.path_str, "wt", newline="",
+                                     encoding="utf-8")
+                else:
+                    fd = open(self.path_str, "w", newline="",
+                              encoding="utf-8")
+                with fd:
+                    for n, chunk in enumerate(chunks):
+                        chunk.to_csv(fd, sep=sep, index=index, header=n == 0)
+                        rows += len(chunk)
+        finally:
+            self._changed()
+        return rows
+
+    def write_tex(self, tex_content, mode="w", atomic=False):
         """receives a latex string content and modify or add the .tex suffix
         and saves it at the Epath instance location"""
         if self.has_suffix():
             fname = self.replace_suffix(".tex").string()
         else:
             fname = self.add_suffix(".tex").string()
-        with open(fname, mode=mode) as fd:
-            fd.write(tex_content)
+        with EPathWriter(fname, mode=mode, atomic=atomic) as writer:
+            writer.write(tex_content)
+        # the current path may be the .tex file itself
+        self._changed()
+
+    def digest(self, algorithm="sha256", cache=None):
+        """
+        hex digest of the file content, read in large blocks.
+        A HashCache, given or installed, avoids hashing again a file
+        which has not changed.
+
+        :param algorithm: any hashlib algorithm
+        :param cache: HashCache, by default the installed one
+        :rtype: str
+
+        :Example:
+        >>> import tempfile
+        >>> path = EPath(tempfile.mkdtemp()).join("a.txt")
+        >>> path.write("abc")
+        >>> path.digest("md5")
+        '900150983cd24fb0d6963f7d28e17f72'
+        """
+        return _digest(self.path_str, algorithm,
+                       _hash_cache if cache is None else cache)
+
+    def digests(self, pattern, algorithm="sha256", workers=8, cache=None):
+        """
+        digests of the files matching pattern below the current path,
+        hashed in parallel
+
+        :see: digest_files
+        :rtype: dict of EPath: str
+        """
+        return digest_files((path for path in self.iglob(pattern)
+                             if path.is_file()), algorithm=algorithm,
+                            workers=workers, cache=cache)
+
+    def diff(self, dst, checksum=False, algorithm="sha256", workers=8,
+             cache=None):
+        """
+        compares the tree below the current path with the tree below dst.
+        Files are compared by size and mtime, or with checksum=True
+        by digest when they have the same size.
+
+        :param workers: both trees are scanned in a pool of that many
+                        threads, None scans serially
+        :param cache: HashCache of the digests, by default the installed
+                      one
+        :rtype: TreeDiff
+
+        :Example:
+        >>> import tempfile
+        >>> src, dst = EPath(tempfile.mkdtemp()), EPath(tempfile.mkdtemp())
+        >>> src.join("csv").mkdir()
+        >>> src.join("csv/a.csv").write("1;2")
+        >>> src.diff(dst).new, src.diff(dst).new_dirs
+        (['csv/a.csv'], ['csv'])
+        >>> src.sync(dst).report.copied
+        1
+        >>> bool(src.diff(dst))
+        False
+        """
+        return _diff_trees(self, dst, checksum=checksum, algorithm=algorithm,
+                           workers=workers, cache=cache)
+
+    def sync(self, dst, delete=False, dry_run=False, checksum=False,
+             algorithm="sha256", workers=8, cache=None, raise_errors=True):
+        """
+        makes the tree below dst a copy of the tree below the current
+        path, copying only the new and changed files (see diff), in
+        parallel. Copies keep the mtime of their source, so the next
+        sync finds them unchanged.
+
+        :param delete: also deletes the files and directories of dst
+                       which are not in the current tree
+        :param dry_run: only returns the diff, nothing is changed
+        :param raise_errors: raises the first error once all copies are
+                             done, otherwise failed copies are only
+                             listed in report.errors of the diff
+        :see: diff for the other parameters
+        :rtype: TreeDiff
+        :returns: the diff, with the copy report and deleted counts
+
+        :Example:
+        >>> import tempfile
+        >>> src, dst = EPath(tempfile.mkdtemp()), EPath(tempfile.mkdtemp())
+        >>> src.join("csv").mkdir()
+        >>> src.join("csv/a.csv").write("1;2")
+        >>> dst.join("csv").write("not a dir")
+        >>> src.sync(dst)  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+        ...
+        FileExistsError: [Errno 17] File exists: ...
+        >>> report = src.sync(dst, raise_errors=False).report
+        >>> report.copied, len(report.errors)
+        (0, 2)
+        """
+        return _sync_trees(self, dst, delete=delete, dry_run=dry_run,
+                           checksum=checksum, algorithm=algorithm,
+                           workers=workers, cache=cache,
+                           raise_errors=raise_errors)
+
+    def watch(self, recursive=True, debounce=None):
+        """
+        watches the directory at the current path with Linux inotify,
+        to be iterated or read, and closed or used in a with statement.
+        Cached stats, images and indexes are invalidated by the changes
+        it reads.
+
+        :see: EPathWatcher for the parameters and events
+        :rtype: EPathWatcher
+        """
+        return EPathWatcher(self, recursive=recursive, debounce=debounce)
 
     def copyto(self, dir):
-        """copy the file at current path to a new directory dir"""
+        """copy the file at current path to a new directory dir,
+        the copy is made inside the kernel when possible.
+        See copy_files to copy many files at once"""
         if EPath(dir).is_dir():
-            copyfile(self.string(), self.replace_parents(dir).string())
+            _copy_one(self.path_str, self.replace_parents(dir).path_str)
         else:
             raise ValueError("cannot copy, not a dir")
 
+    # asyncio versions of the filesystem methods, they run in a bounded
+    # executor, see set_async_workers
+
+    async def aexists(self):
+        """coroutine version of exists"""
+        return await _arun(self.exists)
+
+    async def amkdir(self, raiseException=False):
+        """coroutine version of mkdir"""
+        return await _arun(self.mkdir, raiseException)
+
+    async def atouch(self):
+        """coroutine version of touch"""
+        return await _arun(self.touch)
+
+    async def awrite(self, content, mode="w"):
+        """coroutine version of write"""
+        return await _arun(self.write, content, mode)
+
+    async def acopyto(self, dir):
+        """coroutine version of copyto"""
+        return await _arun(self.copyto, dir)
+
+    async def aremovefile(self):
+        """coroutine version of removefile"""
+        return await _arun(self.removefile)
+
+    async def aremovedir(self):
+        """coroutine version of removedir"""
+        return await _arun(self.removedir)
+
+    async def aglob(self, pattern):
+        """coroutine version of glob"""
+        return await _arun(self.glob, pattern)
+
+    async def aiglob(self, pattern, chunk_size=256, **kwargs):
+        """
+        asynchronous iterator version of iglob, the directory scan
+        runs in the executor chunk_size entries at a time
+
+        :see: iglob for the other parameters
+
+        :Example:
+        >>> import asyncio, tempfile
+        >>> root = EPath(tempfile.mkdtemp())
+        >>> async def main():
+        ...     await asyncio.gather(*(root.join(name).awrite("x")
+        ...                            for name in ["a.txt", "b.txt"]))
+        ...     return sorted([p.basename.s async for p in
+        ...                    root.aiglob("*.txt")])
+        >>> asyncio.run(main())
+        ['a.txt', 'b.txt']
+        """
+        iterator = self.iglob(pattern, **kwargs)
+        while True:
+            chunk = await _arun(_take, iterator, chunk_size)
+            if not chunk:
+                return
+            for path in chunk:
+                yield path
+
     def __len__(self):
         return len(self.path_str)
 
+    def _key(self):
+        """path string written the way pathlib writes it, which equality
+        and hashing are based on"""
+        if self._is_normalized():
+            return self.path_str
+        return str(self.path_obj)
+
+    def __eq__(self, other):
+        """
+        paths are equal when pathlib writes them the same way,
+        as pathlib.Path equality
+
+        :Example:
+        >>> EPath("/tmp//a/./b.png") == EPath("/tmp/a/b.png")
+        True
+        >>> len({EPath("/tmp/a"), EPath("/tmp/a/"), EPath("/tmp/b")})
+        2
+        """
+        if not isinstance(other, EPath):
+            return NotImplemented
+        return (self.path_str == other.path_str
+                or self._key() == other._key())
+
+    def __hash__(self):
+        return hash(self._key())
+
     def __str__(self):
         return "{}".format(self.path_str)
 
@@ -512,3 +2675,2856 @@ class EPath:
     @property
     def s(self):
         return self.__str__()
+
+
+def _rpartition(strings, sep):
+    """vectorized str.rpartition over a NumPy string array"""
+    if strings.size == 0:
+        return strings, strings, strings
+    parts = np.char.rpartition(strings, sep)
+    return parts[..., 0], parts[..., 1], parts[..., 2]
+
+
+def _join(heads, tails):
+    """vectorized os.path.join(head, tail) over NumPy string arrays"""
+    char = np.char
+    joined = np.where((heads == '') | char.endswith(heads, '/'),
+                      char.add(heads, tails),
+                      char.add(char.add(heads, '/'), tails))
+    return np.where(char.startswith(tails, '/'), tails, joined)
+
+
+def _as_strings(obj):
+    """converts a str, an EPath, a sequence of them or an EPathArray
+    to a NumPy string array (0-d for a single path)"""
+    if isinstance(obj, EPathArray):
+        return obj.paths
+    if isinstance(obj, (str, EPath, pathlib.Path)):
+        return np.asarray(str(obj))
+    if isinstance(obj, np.ndarray):
+        return obj if obj.dtype.kind == 'U' else obj.astype(str)
+    return np.asarray([str(item) for item in obj], dtype=str)
+
+
+class EPathArray:
+    """
+    Batch of paths stored in NumPy string arrays.
+
+    EPathArray exposes the EPath path manipulation methods, applied to the
+    whole batch at once with vectorized NumPy string operations, so that
+    renaming N output files does not construct N EPath objects.
+    Element i of any result is the string EPath(paths[i]).method() gives.
+
+    Arguments of add_after_stem, add_before_stem, replace_suffix,
+    replace_parents and join can either be a single str/EPath, applied to
+    every path, or a sequence of N values, applied element-wise.
+
+    NumPy string arrays are fixed width : every path takes 4 bytes per
+    character of the longest one (about 200 B for 30 characters paths,
+    twice a list of str). A single long path among short ones makes
+    every element that large, keep such batches in a list of str or
+    EPath (see bench_epath_array_memory in bench.py).
+
+    :attr:
+    paths : numpy.ndarray
+        unicode array holding the path strings
+
+    :Example:
+    >>> paths = EPathArray(["/tmp/a.png", "/tmp/b.png"])
+    >>> paths.add_after_stem("blur").replace_suffix("jpg")
+    EPathArray(['/tmp/a_blur.jpg', '/tmp/b_blur.jpg'])
+    >>> paths.add_after_stem(["0_1", "0_2"])
+    EPathArray(['/tmp/a_0_1.png', '/tmp/b_0_2.png'])
+    >>> paths.stem
+    EPathArray(['a', 'b'])
+    >>> paths[1]
+    /tmp/b.png
+    """
+
+    __slots__ = ("paths", "_parents", "_stems", "_suffixes")
+
+    def __init__(self, obj):
+        """init function can take :
+           - an iterable of str, pathlib.Path or EPath objects
+           - a NumPy string array
+           - an EPathArray object"""
+        if isinstance(obj, (str, EPath, pathlib.Path)):
+            raise ValueError("not a sequence of paths, "
+                             "use EPath for a single path !")
+        paths = _as_strings(obj).reshape(-1)
+        # same trailing '/' handling as EPath
+        trailing = np.char.endswith(paths, '/') & (np.char.str_len(paths) > 1)
+        if trailing.any():
+            paths = np.where(trailing, _rpartition(paths, '/')[0], paths)
+        self._set(paths)
+
+    def _set(self, paths):
+        self.paths = paths
+        self._parents = self._stems = self._suffixes = None
+
+    @classmethod
+    def _from_array(cls, paths):
+        """fast constructor for already cleaned string arrays"""
+        array = object.__new__(cls)
+        array._set(paths)
+        return array
+
+    def _odd_mask(self):
+        """mask of the paths which are not written the way pathlib would
+        write them (see EPath._is_normalized)"""
+        paths, char = self.paths, np.char
+        return ((paths == '') | (paths == '.')
+                | (char.find(paths, '//') >= 0)
+                | (char.find(paths, '/./') >= 0)
+                | char.startswith(paths, './')
+                | char.endswith(paths, '/.')
+                | (char.endswith(paths, '/') & (paths != '/')))
+
+    def _components(self):
+        """computes parents, stems and suffixes of the whole batch once"""
+        if self._parents is not None:
+            return
+        paths = self.paths
+        head, sep, name = _rpartition(paths, '/')
+        parents = np.where(sep == '', '.', np.where(head == '', '/', head))
+        before, _, after = _rpartition(name, '.')
+        has_suffix = (before != '') & (after != '')
+        stems = np.where(has_suffix, before, name)
+        suffixes = np.where(has_suffix, np.char.add('.', after), '')
+
+        odd = np.flatnonzero(self._odd_mask()) if paths.size else []
+        if len(odd):
+            # rare non normalized paths, let EPath (pathlib) handle them
+            parents = parents.astype(paths.dtype)
+            stems = stems.astype(paths.dtype)
+            suffixes = suffixes.astype(paths.dtype)
+            for i in odd:
+                path = EPath._from_str(str(paths[i]))
+                parents[i] = path.parent.s
+                stems[i] = path.stem.s
+                suffixes[i] = path.suffix.s
+        self._parents, self._stems, self._suffixes = parents, stems, suffixes
+
+    @property
+    def parent(self):
+        """parents of all the paths, as an EPathArray"""
+        self._components()
+        return EPathArray._from_array(self._parents)
+
+    @property
+    def stem(self):
+        """stems (basenames without the last extension) of all the paths"""
+        self._components()
+        return EPathArray._from_array(self._stems)
+
+    @property
+    def suffix(self):
+        """last suffixes of all the paths, '' when there is none"""
+        self._components()
+        return EPathArray._from_array(self._suffixes)
+
+    @property
+    def basename(self):
+        """basenames of all the paths"""
+        return EPathArray._from_array(_rpartition(self.paths, '/')[2])
+
+    def has_suffix(self):
+        """boolean array, True where the path has a suffix"""
+        self._components()
+        return self._suffixes != ''
+
+    def replace_suffix(self, new_suffix):
+        """replaces the last suffix of every path, or adds one
+
+        :see: EPath.replace_suffix
+        :rtype: EPathArray
+        """
+        self._components()
+        new_suffix = _as_strings(new_suffix)
+        new_suffix = np.where(np.char.startswith(new_suffix, '.'),
+                              new_suffix, np.char.add('.', new_suffix))
+        basenames = np.char.add(self._stems, new_suffix)
+        return EPathArray(_join(self._parents, basenames))
+
+    def add_before_stem(self, ssuffix, sep='_'):
+        """adds some extra stem information before the stem of every path
+
+        :see: EPath.add_before_stem
+        :rtype: EPathArray
+        """
+        self._components()
+        prefix = np.char.add(_as_strings(ssuffix), sep)
+        basenames = np.char.add(np.char.add(prefix, self._stems),
+                                self._suffixes)
+        return EPathArray(_join(self._parents, basenames))
+
+    def add_after_stem(self, ssuffix, sep='_'):
+        """adds some extra stem information after the stem of every path
+
+        :see: EPath.add_after_stem
+        :rtype: EPathArray
+        """
+        self._components()
+        extra = np.char.add(sep, _as_strings(ssuffix))
+        basenames = np.char.add(np.char.add(self._stems, extra),
+                                self._suffixes)
+        return EPathArray(_join(self._parents, basenames))
+
+    def replace_parents(self, new_parents):
+        """replaces all the parents of every path by new_parents
+
+        :see: EPath.replace_parents
+        :rtype: EPathArray
+        """
+        basenames = _rpartition(self.paths, '/')[2]
+        return EPathArray(_join(_as_strings(new_parents), basenames))
+
+    def join(self, extrapath):
+        """appends extrapath to every path, like os.path.join.
+        A list or a tuple is a sequence of path components, as in
+        EPath.join, whereas an EPathArray or a NumPy array is applied
+        element-wise
+
+        :rtype: EPathArray
+        """
+        if isinstance(extrapath, (list, tuple)):
+            parts = extrapath
+        else:
+            parts = [extrapath]
+        paths = self.paths
+        for part in parts:
+            paths = _join(paths, _as_strings(part))
+        return EPathArray(paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __iter__(self):
+        for path in self.paths.tolist():
+            yield EPath._from_str(path)
+
+    def __getitem__(self, item):
+        """an integer gives an EPath, a slice, a mask or an array
+        of indices give an EPathArray"""
+        if isinstance(item, (int, np.integer)):
+            return EPath._from_str(str(self.paths[item]))
+        return EPathArray._from_array(self.paths[item])
+
+    def tolist(self):
+        """:returns: list of EPath objects"""
+        return list(self)
+
+    def strings(self):
+        """:returns: list of str"""
+        return self.paths.tolist()
+
+    def __str__(self):
+        return np.array2string(self.paths, separator=', ')
+
+    def __repr__(self):
+        return "EPathArray({})".format(self)
+
+
+def _glob_part_regex(part):
+    """regex of one glob pattern component, never matching '/'.
+    Like glob, wildcards do not match names starting with '.'
+    unless the component itself starts with '.'"""
+    if not glob.has_magic(part):
+        return re.escape(part)
+    out = [] if part.startswith('.') else [r'(?!\.)']
+    i, n = 0, len(part)
+    while i < n:
+        c = part[i]
+        i += 1
+        if c == '*':
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            j = i
+            if j < n and part[j] == '!':
+                j += 1
+            if j < n and part[j] == ']':
+                j += 1
+            while j < n and part[j] != ']':
+                j += 1
+            if j >= n:
+                out.append(r'\[')
+            else:
+                # '[', and set operation characters, are literal in a
+                # glob class but not in a regex one
+                stuff = re.sub(r'([&~|[])', r'\\\1',
+                               part[i:j].replace('\\', r'\\'))
+                if stuff.startswith('!'):
+                    stuff = '^' + stuff[1:]
+                elif stuff.startswith('^'):
+                    stuff = '\\' + stuff
+                out.append('[' + stuff + ']')
+                i = j + 1
+        else:
+            out.append(re.escape(c))
+    return ''.join(out)
+
+
+def _glob_regex(parts, recursive=True):
+    """compiled regex matching the paths, relative to the glob base
+    directory, of the pattern components parts"""
+    pieces = []
+    for k, part in enumerate(parts):
+        last = k == len(parts) - 1
+        if part == "**" and recursive:
+            if last:
+                pieces.append(r'(?!\.)[^/]+(?:/(?!\.)[^/]+)*')
+            else:
+                pieces.append(r'(?:(?!\.)[^/]+/)*')
+                continue
+        else:
+            pieces.append(_glob_part_regex(part))
+        if not last:
+            pieces.append('/')
+    return re.compile(''.join(pieces) + r'\Z')
+
+
+def _split_glob(pattern):
+    """splits a glob pattern in :
+       - its base, the literal directory before the first wildcard
+       - the prefix written before matched names, as glob.glob does
+       - the list of components from the first wildcard"""
+    parts = pattern.split('/')
+    n_literal = 0
+    while n_literal < len(parts) and not glob.has_magic(parts[n_literal]):
+        n_literal += 1
+    base = '/'.join(parts[:n_literal])
+    if not base and pattern.startswith('/'):
+        base = '/'
+    if not base or base.endswith('/'):
+        prefix = base
+    else:
+        prefix = base + '/'
+    return base, prefix, [part for part in parts[n_literal:] if part]
+
+
+def _subtree_range(path_str):
+    """bounds of the keys strictly below path_str, '0' being the
+    character after '/'"""
+    if path_str == '/':
+        return '/', '0'
+    return path_str + '/', path_str + '0'
+
+
+class EPathIndex:
+    """
+    Persistent index of a directory tree (paths, types, sizes, mtimes)
+    stored in a SQLite database, answering glob, exists and size
+    queries without touching the indexed filesystem.
+
+    refresh() only lists again the directories whose mtime changed
+    since the last scan, which costs one stat per directory instead
+    of one per file. As a directory mtime only changes when entries are
+    added, removed or renamed, size and mtime of files rewritten in
+    place are only updated by refresh(full=True), or when the change
+    is made through EPath methods. Symlinks to directories are indexed
+    but not followed.
+
+    Used as a context manager (or with install()), the index answers
+    EPath.exists, is_dir, is_file, file_size and glob for every path
+    below its root.
+
+    :Example:
+    >>> import tempfile
+    >>> root = EPath(tempfile.mkdtemp())
+    >>> root.join("csv").mkdir()
+    >>> root.join("csv/res_1.csv").write("1;2", mode="w")
+    >>> index = root.build_index(db=root.join(".index.sqlite"))
+    >>> index.exists(root.join("csv/res_1.csv")), index.file_size(root.join("csv/res_1.csv"))
+    (True, 3)
+    >>> [p.basename for p in index.glob("**/*.csv")]
+    [res_1.csv]
+    >>> with index:
+    ...     root.join("csv/res_2.csv").exists()
+    False
+    >>> index.close()
+    """
+
+    def __init__(self, root, db=None):
+        """root is the indexed directory, db the SQLite file of the index,
+        by default in $XDG_CACHE_HOME/epath (~/.cache/epath)"""
+        self.root = EPath(os.path.abspath(str(root)))
+        if db is None:
+            cache_dir = os.environ.get("XDG_CACHE_HOME",
+                                       os.path.expanduser("~/.cache"))
+            cache_dir = os.path.join(cache_dir, "epath")
+            os.makedirs(cache_dir, exist_ok=True)
+            key = hashlib.sha1(self.root.s.encode()).hexdigest()[:16]
+            db = os.path.join(cache_dir, "index_{}.sqlite".format(key))
+        self.db = EPath(str(db))
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db.s, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                path TEXT PRIMARY KEY,
+                parent TEXT NOT NULL,
+                is_dir INTEGER NOT NULL,
+                is_link INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent);
+            CREATE TABLE IF NOT EXISTS listings (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL
+            );
+        """)
+
+    def covers(self, path_str):
+        """tests if the absolute path path_str is the root or below it"""
+        root = self.root.path_str
+        return (path_str == root or root == '/'
+                or path_str.startswith(root + '/'))
+
+    @staticmethod
+    def _row(path_str, st, is_link):
+        return (path_str, os.path.dirname(path_str),
+                int(stat.S_ISDIR(st.st_mode)), int(is_link),
+                st.st_size, st.st_mtime_ns)
+
+    def _delete(self, path_str):
+        """removes path_str and everything below it from the index"""
+        low, high = _subtree_range(path_str)
+        for table in ("entries", "listings"):
+            self._conn.execute("DELETE FROM {} WHERE path = ? "
+                               "OR (path >= ? AND path < ?)".format(table),
+                               (path_str, low, high))
+
+    def _scan(self, dirname):
+        """lists dirname again and replaces its children in the index,
+        returns the subdirectories to visit"""
+        rows, subdirs = [], []
+        for entry in _scandir(dirname):
+            try:
+                st = entry.stat()
+                is_link = entry.is_symlink()
+            except OSError:
+                # broken symlink, os.path.exists says it does not exist
+                continue
+            rows.append(self._row(entry.path, st, is_link))
+            if stat.S_ISDIR(st.st_mode) and not is_link:
+                subdirs.append(entry.path)
+        names = set(row[0] for row in rows)
+        stale = [path for path, in self._conn.execute(
+            "SELECT path FROM entries WHERE parent = ?", (dirname,))
+            if path not in names]
+        for path in stale:
+            self._delete(path)
+        self._conn.executemany("INSERT OR REPLACE INTO entries "
+                               "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return subdirs
+
+    def refresh(self, full=False):
+        """
+        updates the index : every directory is stat'ed, and only the ones
+        whose mtime changed since the last scan are listed again.
+        full=True lists everything again.
+
+        :returns: dict with the number of directories checked and
+                  scanned, and the time taken in seconds
+        """
+        t0 = time.perf_counter()
+        checked = scanned = 0
+        with self._lock, self._conn:
+            stack = [self.root.path_str]
+            while stack:
+                dirname = stack.pop()
+                checked += 1
+                try:
+                    st = os.stat(dirname)
+                except OSError:
+                    self._delete(dirname)
+                    continue
+                known = self._conn.execute(
+                    "SELECT mtime_ns FROM listings WHERE path = ?",
+                    (dirname,)).fetchone()
+                if full or known is None or known[0] != st.st_mtime_ns:
+                    scanned += 1
+                    stack.extend(self._scan(dirname))
+                    self._conn.execute("INSERT OR REPLACE INTO listings "
+                                       "VALUES (?, ?)",
+                                       (dirname, st.st_mtime_ns))
+                else:
+                    stack.extend(path for path, in self._conn.execute(
+                        "SELECT path FROM entries WHERE parent = ? "
+                        "AND is_dir = 1 AND is_link = 0", (dirname,)))
+                self._conn.execute("INSERT OR REPLACE INTO entries "
+                                   "VALUES (?, ?, ?, ?, ?, ?)",
+                                   self._row(dirname, st, False))
+        return {"checked_dirs": checked, "scanned_dirs": scanned,
+                "seconds": time.perf_counter() - t0}
+
+    build = refresh
+
+    def invalidate(self, path=None):
+        """
+        marks the directories below path, or all of them when path is
+        None, as changed : the next refresh lists them again and updates
+        the size and mtime of every file they hold
+
+        :Example:
+        >>> import tempfile
+        >>> root = EPath(tempfile.mkdtemp())
+        >>> csv = root.join("a.csv")
+        >>> csv.write("1;2")
+        >>> db = EPath(tempfile.mkdtemp()).join("index.sqlite")
+        >>> index = root.build_index(db=db)
+        >>> with open(csv.s, "w") as f:
+        ...     _ = f.write("1;2;3")
+        >>> index.refresh()["scanned_dirs"], index.file_size(csv)
+        (0, 3)
+        >>> index.invalidate()
+        >>> index.refresh()["scanned_dirs"], index.file_size(csv)
+        (1, 5)
+        >>> index.close()
+        """
+        path_str = (self.root.path_str if path is None
+                    else os.path.abspath(str(path)))
+        low, high = _subtree_range(path_str)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM listings WHERE path = ? "
+                               "OR (path >= ? AND path < ?)",
+                               (path_str, low, high))
+
+    def update(self, path):
+        """updates the index entry of a single path (and its subtree if it
+        has been removed), the parent directory being rescanned at the
+        next refresh"""
+        path_str = os.path.abspath(str(path))
+        with self._lock, self._conn:
+            try:
+                st = os.stat(path_str)
+                is_link = os.path.islink(path_str)
+            except OSError:
+                self._delete(path_str)
+                return
+            self._conn.execute("INSERT OR REPLACE INTO entries "
+                               "VALUES (?, ?, ?, ?, ?, ?)",
+                               self._row(path_str, st, is_link))
+
+    def stat(self, path):
+        """:returns: (is_dir, size, mtime) of an indexed path,
+                     None if it is not in the index"""
+        path_str = os.path.abspath(str(path))
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT is_dir, size, mtime_ns FROM entries "
+                "WHERE path = ?", (path_str,)).fetchone()
+        if row is None:
+            return None
+        return bool(row[0]), row[1], row[2] / 1e9
+
+    def exists(self, path):
+        """tests if path is in the index"""
+        return self.stat(path) is not None
+
+    def is_dir(self, path):
+        """tests if path is an indexed directory"""
+        info = self.stat(path)
+        return info is not None and info[0]
+
+    def is_file(self, path):
+        """tests if path is an indexed file (not a directory)"""
+        info = self.stat(path)
+        return info is not None and not info[0]
+
+    def file_size(self, path):
+        """:returns: indexed size of path in bytes"""
+        info = self.stat(path)
+        if info is None:
+            raise FileNotFoundError(str(path))
+        return info[1]
+
+    def iglob(self, pattern, recursive=True):
+        """
+        yields the indexed paths matching a glob pattern, either absolute
+        or relative to the index root, as EPath objects written like
+        the pattern (absolute or relative)
+
+        :param recursive: '**' matches any number of directories,
+                          otherwise it works like '*'
+        """
+        pattern = os.path.join(self.root.path_str, str(pattern))
+        yield from self._iglob(*_split_glob(pattern), recursive=recursive)
+
+    def _iglob(self, base, prefix, parts, recursive=True):
+        """iglob from the pieces given by _split_glob"""
+        abs_base = os.path.abspath(base or '.')
+        if not parts:
+            if self.exists(abs_base):
+                yield EPath(base)
+            return
+
+        regex = _glob_regex(parts, recursive)
+        low, high = _subtree_range(abs_base)
+        skip = len(low)
+        # narrows the range with the literal start of the first component
+        head = re.split(r'[*?[]', parts[0])[0]
+        if head:
+            low, high = low + head, low + head[:-1] + chr(ord(head[-1]) + 1)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path FROM entries WHERE path >= ? AND path < ? "
+                "ORDER BY path", (low, high)).fetchall()
+        for path, in rows:
+            relative = path[skip:]
+            if regex.match(relative):
+                yield EPath._from_str(prefix + relative)
+
+    def glob(self, pattern, recursive=True):
+        """:see: iglob
+           :rtype: list of EPath"""
+        return list(self.iglob(pattern, recursive))
+
+    def install(self):
+        """makes EPath methods answer from this index"""
+        if self not in _indexes:
+            _indexes.append(self)
+
+    def uninstall(self):
+        """stops answering EPath methods from this index"""
+        if self in _indexes:
+            _indexes.remove(self)
+
+    def close(self):
+        self.uninstall()
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.uninstall()
+
+    def __repr__(self):
+        return "<EPathIndex {} in {}>".format(self.root, self.db)
+
+
+_umask_lock = threading.Lock()
+
+
+def _umask():
+    """current process umask, read from /proc/self/status (Linux 4.7+)
+    without changing it"""
+    try:
+        with open("/proc/self/status") as fd:
+            for line in fd:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except OSError:
+        pass
+    # elsewhere, the umask is only read by setting it : other threads
+    # creating files meanwhile get the 0o022 mask
+    with _umask_lock:
+        mask = os.umask(0o022)
+        os.umask(mask)
+    return mask
+
+
+class EPathWriter:
+    """
+    Reusable, buffered writer handle on an EPath, see EPath.writer.
+
+    Many small writes go through one open file instead of one
+    open/close pair each. With atomic=True, content is written in a
+    temporary file of the same directory which is renamed over the path
+    when the writer is closed : readers see either the previous file or
+    the complete new one, never a half written file. The new file keeps
+    the mode (and owner, when allowed) of the file it replaces. Leaving
+    the with block on an exception discards the temporary file.
+
+    :Example:
+    >>> import tempfile
+    >>> path = EPath(tempfile.mkdtemp()).join("log.txt")
+    >>> with path.writer(atomic=True, flush_every=100) as writer:
+    ...     for i in range(3):
+    ...         writer.write("record {}\\n".format(i))
+    ...     path.exists()
+    False
+    >>> open(path.s).read()
+    'record 0\\nrecord 1\\nrecord 2\\n'
+    >>> os.chmod(path.s, 0o600)
+    >>> path.write("private", atomic=True)
+    >>> oct(stat.S_IMODE(os.stat(path.s).st_mode))
+    '0o600'
+    """
+
+    FSYNC_POLICIES = ("never", "flush", "close")
+
+    def __init__(self, path, mode="w", buffering=-1, flush_every=None,
+                 fsync="never", atomic=False, encoding=None):
+        """
+        :param mode: open mode, 'w', 'a', 'wb', 'ab'... atomic writers
+                     only accept 'w' and 'wb'
+        :param buffering: as in open, size of the write buffer in bytes
+        :param flush_every: flushes every flush_every writes, None leaves
+                            flushing to the buffer
+        :param fsync: 'never', 'flush' (at every flush) or 'close'
+        :param atomic: writes to a temporary file renamed at close
+        :param encoding: text encoding, as in open
+        """
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError("fsync must be one of {}".format(
+                self.FSYNC_POLICIES))
+        if atomic and mode not in ("w", "wb"):
+            raise ValueError("atomic writers only support modes w and wb")
+        # the caller's EPath is kept, so that its cached entry is dropped
+        self.path = path if isinstance(path, EPath) else EPath(path)
+        self.mode = mode
+        self.flush_every = flush_every
+        self.fsync = fsync
+        self.atomic = atomic
+        self.writes = 0
+        self.closed = False
+        self._tmp = None
+        if atomic:
+            fd, self._tmp = tempfile.mkstemp(
+                dir=self.path.parent.s, suffix=".tmp",
+                prefix=".{}.".format(self.path.basename.s))
+            try:
+                st = os.stat(self.path.s)
+            except OSError:
+                st = None
+            if st is not None and stat.S_ISREG(st.st_mode):
+                # the new file keeps the owner and mode of the old one
+                try:
+                    os.chown(self._tmp, st.st_uid, st.st_gid)
+                except OSError:
+                    # only root can give a file to another user
+                    pass
+                os.chmod(self._tmp, stat.S_IMODE(st.st_mode))
+            else:
+                os.chmod(self._tmp, 0o666 & ~_umask())
+            self._fd = os.fdopen(fd, mode, buffering, encoding=encoding)
+        else:
+            self._fd = open(self.path.s, mode, buffering, encoding=encoding)
+
+    def write(self, content):
+        """writes content (str, or bytes in binary mode)"""
+        self._fd.write(content)
+        self.writes += 1
+        if self.flush_every and self.writes % self.flush_every == 0:
+            self.flush()
+
+    def writelines(self, lines):
+        """writes an iterable of str or bytes, counted as one write"""
+        self._fd.writelines(lines)
+        self.writes += 1
+        if self.flush_every and self.writes % self.flush_every == 0:
+            self.flush()
+
+    def flush(self):
+        """flushes the buffer to the file (the temporary one when atomic)
+        and fsyncs it if the policy is 'flush'"""
+        self._fd.flush()
+        if self.fsync == "flush":
+            os.fsync(self._fd.fileno())
+        if not self.atomic:
+            self.path._changed()
+
+    def close(self):
+        """flushes, fsyncs according to the policy, and for atomic writers
+        renames the temporary file over the path"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._fd.flush()
+            if self.fsync != "never":
+                os.fsync(self._fd.fileno())
+            self._fd.close()
+            if self.atomic:
+                os.replace(self._tmp, self.path.s)
+                self._tmp = None
+                if self.fsync != "never":
+                    # makes the rename itself durable
+                    dirfd = os.open(self.path.parent.s, os.O_RDONLY)
+                    try:
+                        os.fsync(dirfd)
+                    finally:
+                        os.close(dirfd)
+        except BaseException:
+            self.abort()
+            raise
+        finally:
+            self.path._changed()
+
+    def abort(self):
+        """closes the writer, an atomic writer leaves the path untouched"""
+        self.closed = True
+        self._fd.close()
+        if self._tmp is not None:
+            try:
+                os.remove(self._tmp)
+            except FileNotFoundError:
+                pass
+            self._tmp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and self.atomic:
+            self.abort()
+        else:
+            self.close()
+
+    def __repr__(self):
+        return "<EPathWriter {} mode={} atomic={} {}>".format(
+            self.path, self.mode, self.atomic,
+            "closed" if self.closed else "open")
+
+
+def _read_segment(path_str):
+    """records of a sink segment, a sequence of pickled batches. A batch
+    truncated by a crashed writer ends the segment."""
+    records = []
+    with open(path_str, "rb") as fd:
+        unpickler = pickle.Unpickler(fd)
+        while True:
+            try:
+                records.extend(unpickler.load())
+            except (EOFError, pickle.UnpicklingError):
+                return records
+
+
+class EPathSink:
+    """
+    Append sink aggregating records (dicts) from many processes into a
+    single CSV/Parquet/Feather file, see EPath.sink.
+
+    Each sink writes its own segment file in the hidden directory
+    .<basename>.parts next to the path, so writers never lock each
+    other. Records are batched in memory and appended to the segment as
+    one pickled batch per flush. Closing the sink seals its segment.
+    compact() merges all segments, under an exclusive file lock, and
+    writes the consolidated file atomically with EPath.writedf : sealed
+    segments are merged into a single one, segments of sinks still open
+    are included but left in place.
+
+    A sink belongs to one process : open it in each worker, not before
+    forking.
+
+    :Example:
+    >>> import tempfile
+    >>> path = EPath(tempfile.mkdtemp()).join("results.csv")
+    >>> for worker in range(3):
+    ...     with path.sink(batch_size=10) as sink:
+    ...         sink.append({"worker": worker, "loss": 0.5})
+    >>> EPathSink.compact(path)
+    3
+    >>> pd.read_csv(path.s, sep=";").shape
+    (3, 2)
+    """
+
+    def __init__(self, path, batch_size=1000):
+        """
+        :param path: consolidated file, its suffix gives the format
+                     (see EPath.writedf)
+        :param batch_size: number of records kept in memory between two
+                           appends to the segment
+        """
+        self.path = EPath(path)
+        self.batch_size = batch_size
+        self.records = 0
+        self.closed = False
+        self._batch = []
+        self._fd = None
+        self._segment = None
+
+    @staticmethod
+    def _parts(path):
+        return path.parent.join(".{}.parts".format(path.basename.s))
+
+    def _open_segment(self):
+        parts = self._parts(self.path)
+        os.makedirs(parts.s, exist_ok=True)
+        self._segment = os.path.join(parts.s, "{}-{}-{}.part".format(
+            os.uname().nodename, os.getpid(), os.urandom(4).hex()))
+        self._fd = os.open(self._segment,
+                           os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o666)
+
+    def append(self, record):
+        """adds one record, a dict of column: value"""
+        if self.closed:
+            raise ValueError("append to a closed EPathSink")
+        self._batch.append(record)
+        self.records += 1
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def extend(self, records):
+        """adds an iterable of records, or the rows of a DataFrame"""
+        if isinstance(records, pd.DataFrame):
+            records = records.to_dict("records")
+        for record in records:
+            self.append(record)
+
+    def flush(self):
+        """appends the batched records to the segment in one write"""
+        if not self._batch:
+            return
+        if self._fd is None:
+            self._open_segment()
+        data = pickle.dumps(self._batch, pickle.HIGHEST_PROTOCOL)
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self._fd, view):]
+        self._batch = []
+
+    def close(self, compact=False):
+        """flushes and seals the segment, with compact=True also writes
+        the consolidated file"""
+        if not self.closed:
+            self.closed = True
+            self.flush()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+                # not while compact lists and reads the segments
+                lock = self._lock(self._parts(self.path))
+                try:
+                    os.replace(self._segment,
+                               self._segment[:-len(".part")] + ".seg")
+                finally:
+                    os.close(lock)
+        if compact:
+            return EPathSink.compact(self.path)
+
+    @staticmethod
+    def _lock(parts):
+        """takes the exclusive lock of the parts directory
+
+        :returns: file descriptor to close to release the lock
+        """
+        lock = os.open(os.path.join(parts.s, ".lock"),
+                       os.O_WRONLY | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        except BaseException:
+            os.close(lock)
+            raise
+        return lock
+
+    @staticmethod
+    def compact(path):
+        """
+        merges the segments of all the sinks of path, sealed and open,
+        into the consolidated file, and the sealed ones into a single
+        segment. Safe to call from any process at any time.
+
+        :returns: number of records in the consolidated file
+        """
+        path = EPath(path)
+        parts = EPathSink._parts(path)
+        if not parts.is_dir():
+            return 0
+        lock = EPathSink._lock(parts)
+        try:
+            merged = os.path.join(parts.s, "merged.seg")
+            names = sorted(entry.name for entry in _scandir(parts.s)
+                           if entry.name.endswith((".seg", ".part"))
+                           and entry.name != "merged.seg")
+            sealed = [os.path.join(parts.s, name) for name in names
+                      if name.endswith(".seg")]
+            records = _read_segment(merged) if os.path.exists(merged) else []
+            for segment in sealed:
+                records.extend(_read_segment(segment))
+            if sealed:
+                tmp = merged + ".tmp"
+                with open(tmp, "wb") as fd:
+                    pickle.dump(records, fd, pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, merged)
+                for segment in sealed:
+                    os.remove(segment)
+            for name in names:
+                if name.endswith(".part"):
+                    records.extend(_read_segment(os.path.join(parts.s,
+                                                              name)))
+            tmp = path.parent.join(".{}.tmp.{}".format(os.getpid(),
+                                                        path.basename.s))
+            try:
+                tmp.writedf(pd.DataFrame.from_records(records), index=False)
+                os.replace(tmp.s, path.s)
+            except BaseException:
+                try:
+                    os.remove(tmp.s)
+                except OSError:
+                    # not created, the original error matters
+                    pass
+                raise
+            finally:
+                path._changed()
+            return len(records)
+        finally:
+            os.close(lock)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "<EPathSink {} records={} {}>".format(
+            self.path, self.records, "closed" if self.closed else "open")
+
+
+def _param_type(kind):
+    """int, float, bool or str type of the values of kind, which can be
+    a NumPy scalar type (np.float64, np.int32, np.bool_...), None for
+    other types"""
+    if not isinstance(kind, type):
+        return None
+    if issubclass(kind, bool) or (kind.__module__ == "numpy"
+                                  and kind.__name__ in ("bool_", "bool")):
+        return bool
+    if issubclass(kind, str):
+        return str
+    if issubclass(kind, numbers.Integral):
+        return int
+    if issubclass(kind, numbers.Real):
+        return float
+    return None
+
+
+class ParamCodec:
+    """
+    Schema driven encoder/decoder of parameters in file names.
+
+    The schema is an ordered dict of name: type (int, float, bool or
+    str, or a NumPy scalar type standing for one of them). Parameters are written after the stem as name+value pairs
+    joined by sep, e.g. myfile_lr0f01_bs32.csv. '.' only marks suffixes :
+    the dot of float values is written as dot ('f' by default, as
+    90.0 -> 90f0), and str values can not contain '.', '/' or sep.
+
+    The decoding regex is compiled once. decode_many runs it over all the
+    paths joined in one string and parses each numeric column with one
+    NumPy call : decode a glob once, then look results up with masks over
+    the typed columns instead of parsing file names again.
+
+    :Example:
+    >>> codec = ParamCodec({"lr": float, "bs": int, "model": str})
+    >>> codec.encode({"lr": 1e-05, "bs": 32, "model": "cnn"})
+    'lr1e-05_bs32_modelcnn'
+    >>> codec.decode("/res/run_lr1e-05_bs32_modelcnn.csv")
+    {'lr': 1e-05, 'bs': 32, 'model': 'cnn'}
+    >>> columns = codec.decode_many(["/res/run_lr0f1_bs8_modela.csv",
+    ...                              "/res/notes.txt",
+    ...                              "/res/run_lr0f5_bs16_modelb.csv"])
+    >>> columns["bs"]
+    array([ 8, 16])
+    >>> columns["lr"]
+    array([0.1, 0.5])
+    """
+
+    TYPES = (int, float, bool, str)
+
+    def __init__(self, schema, sep="_", dot="f"):
+        """
+        :param schema: dict of parameter name: type, in file name order
+        :param sep: separator between the parameters
+        :param dot: replacement of the dot of float values
+        """
+        if not schema:
+            raise ValueError("schema is empty")
+        schema = {name: _param_type(kind) for name, kind in schema.items()}
+        for name, kind in schema.items():
+            if kind is None:
+                raise ValueError("type of {} must be one of int, float, "
+                                 "bool, str".format(name))
+        if dot in "0123456789e+-." or len(dot) != 1:
+            raise ValueError("dot must be a single character which does "
+                             "not appear in numbers")
+        self.schema = dict(schema)
+        self.sep = sep
+        self.dot = dot
+        esep = re.escape(sep)
+        values = {
+            int: r"[-+]?\d+",
+            float: r"[-+]?(?:\d+(?:{0}\d*)?(?:e[-+]?\d+)?|inf)|nan".format(
+                re.escape(dot)),
+            bool: r"True|False",
+            str: r"[^/.\n{}]+".format(re.escape(sep)),
+        }
+        params = esep.join("{}({})".format(re.escape(name), values[kind])
+                           for name, kind in self.schema.items())
+        # parameters end the stem, anything after the first dot is suffix
+        self._regex = re.compile(r"(?:^|[/{}]){}(?:\.[^/\n]*)?$".format(
+            esep, params))
+        # starts with a literal, which the regex engine scans for quickly.
+        # Parameters starting the file name are left to the _regex fallback
+        self._bulk_regex = re.compile(r"{}{}(?:\.[^/\n]*)?$".format(
+            esep, params), re.MULTILINE)
+
+    @staticmethod
+    def encode_value(value, dot="f"):
+        """file name form of one parameter value"""
+        if hasattr(value, "item") and not isinstance(value, str):
+            # NumPy scalar, whose repr is not the one of the value
+            value = value.item()
+        if isinstance(value, float):
+            return repr(value).replace(".", dot)
+        return str(value)
+
+    def encode(self, params):
+        """
+        stem suffix of a dict of parameters, see EPath.add_param.
+        Values must have the type of the schema (NumPy scalars included),
+        an int is accepted for a float when it converts exactly.
+
+        :rtype: str
+
+        :Example:
+        >>> ParamCodec({"bs": int}).encode({"bs": 3.7})
+        Traceback (most recent call last):
+        ...
+        ValueError: parameter bs must be int, got 3.7
+        >>> ParamCodec({"flip": bool}).encode({"flip": "False"})
+        Traceback (most recent call last):
+        ...
+        ValueError: parameter flip must be bool, got 'False'
+        """
+        if set(params) != set(self.schema):
+            raise ValueError("parameters {} do not match the schema {}".format(
+                sorted(params), list(self.schema)))
+        parts = []
+        for name, kind in self.schema.items():
+            value = params[name]
+            given = _param_type(type(value))
+            if given is not kind and not (
+                    kind is float and given is int
+                    and float(value) == value):
+                raise ValueError("parameter {} must be {}, got {!r}".format(
+                    name, kind.__name__, value))
+            value = self.encode_value(kind(value), self.dot)
+            if kind is str and (not value or "." in value or "/" in value
+                                or self.sep in value):
+                raise ValueError("str parameter {} can not be empty or "
+                                 "contain '.', '/' or {!r}".format(
+                                     name, self.sep))
+            parts.append(name + value)
+        return self.sep.join(parts)
+
+    def _convert(self, kind, value):
+        if kind is bool:
+            return value == "True"
+        if kind is float and value.lstrip("+-") not in ("inf", "nan"):
+            value = value.replace(self.dot, ".")
+        return kind(value)
+
+    def decode(self, path):
+        """
+        parameters of a path built by encode
+
+        :rtype: dict
+        """
+        match = self._regex.search(str(path))
+        if match is None:
+            raise ValueError("{} does not match the parameters {}".format(
+                path, list(self.schema)))
+        return {name: self._convert(kind, value) for (name, kind), value
+                in zip(self.schema.items(), match.groups())}
+
+    def decode_many(self, paths):
+        """
+        decodes a batch of paths (str, EPath, an EPathArray or the result
+        of a glob), paths which do not match the schema are skipped
+
+        :rtype: dict
+        :returns: dict of NumPy arrays, 'path' and one per parameter
+        """
+        if isinstance(paths, EPathArray):
+            paths = paths.paths.tolist()
+        else:
+            paths = [str(path) for path in paths]
+        rows = self._bulk_regex.findall("\n".join(paths))
+        if len(self.schema) == 1:
+            rows = [(row,) for row in rows]
+        if len(rows) != len(paths):
+            # some paths do not match, find which ones
+            matches = [self._regex.search(path) for path in paths]
+            paths = [path for path, match in zip(paths, matches) if match]
+            rows = [match.groups() for match in matches if match]
+        columns = {"path": np.array(paths, dtype=str)}
+        for i, (name, kind) in enumerate(self.schema.items()):
+            values = [row[i] for row in rows]
+            if kind is bool:
+                column = np.array(values, dtype=str) == "True"
+            elif kind in (int, float):
+                # numbers are parsed by NumPy in one call over one string
+                text = "\n".join(values)
+                if kind is float:
+                    text = text.replace(self.dot, ".")
+                    for special in ("inf", "nan"):
+                        text = text.replace(special.replace(self.dot, "."),
+                                            special)
+                column = np.fromstring(text, dtype=np.int64 if kind is int
+                                       else float, sep="\n")
+            else:
+                column = np.array(values, dtype=str)
+            columns[name] = column
+        return columns
+
+    def to_frame(self, paths):
+        """
+        decode_many as a pandas.DataFrame, one row per matching path
+
+        :rtype: pandas.DataFrame
+        """
+        return pd.DataFrame(self.decode_many(paths))
+
+    def __repr__(self):
+        return "ParamCodec({})".format(", ".join(
+            "{}: {}".format(name, kind.__name__)
+            for name, kind in self.schema.items()))
+
+
+_TEMPLATE_FIELD = re.compile(r"(?<!{){(\w+)[^{}]*}")
+
+
+def _expand_names(name, values):
+    """names given by a directory name template, one per combination of
+    the values of its fields"""
+    if "{" not in name:
+        return [name]
+    fields = list(dict.fromkeys(_TEMPLATE_FIELD.findall(name)))
+    if not fields:
+        return [name]
+    missing = [field for field in fields if field not in values]
+    if missing:
+        raise ValueError("no values for the template fields {}".format(
+            missing))
+    return [name.format(**dict(zip(fields, combination)))
+            for combination in itertools.product(*(values[field]
+                                                   for field in fields))]
+
+
+def _tree_children(node, spec, values):
+    """adds the subdirectories described by spec to the EPathTree node"""
+    if spec is None:
+        return
+    if isinstance(spec, dict):
+        items = spec.items()
+    elif isinstance(spec, str):
+        items = [(spec, None)]
+    else:
+        items = [(name, None) for name in spec]
+    for name, sub_spec in items:
+        for expanded in _expand_names(str(name), values):
+            child = node
+            for part in expanded.split("/"):
+                if part:
+                    child = child._child(part)
+            _tree_children(child, sub_spec, values)
+
+
+def _missing_dirs(node, exists, levels, depth):
+    """appends the subdirectories of node which do not exist to
+    levels[depth], levels[depth + 1]... A missing directory has no
+    subdirectories, they are not looked up."""
+    listing = {}
+    if node.children and exists:
+        listing = {entry.name: entry.is_dir()
+                   for entry in _scandir(node.path_str)}
+    for name, child in node.children.items():
+        child_exists = name in listing
+        if child_exists and not listing[name]:
+            raise ValueError("{} exists and is not a dir".format(child))
+        if not child_exists:
+            if len(levels) <= depth:
+                levels.append([])
+            levels[depth].append(child)
+        _missing_dirs(child, child_exists, levels, depth + 1)
+
+
+def _mkdir_exist_ok(path):
+    try:
+        os.mkdir(path.path_str)
+    except FileExistsError:
+        if not os.path.isdir(path.path_str):
+            raise
+    _changed(path.path_str)
+
+
+class EPathTree(EPath):
+    """
+    Directory of a tree created by EPath.make_tree.
+
+    An EPathTree is an EPath whose subdirectories are also reachable as
+    attributes, tree.data.csv, or in the children dict for names which
+    are not identifiers or are EPath attributes, tree.children["join"].
+
+    :attr:
+    children : dict
+        name: EPathTree of the subdirectories
+    created : int
+        number of directories created by make_tree, on the root only
+    """
+
+    def __init__(self, obj):
+        super().__init__(obj)
+        self.children = {}
+        self.created = 0
+
+    def _child(self, name):
+        child = self.children.get(name)
+        if child is None:
+            child = self.children[name] = EPathTree(
+                os.path.join(self.path_str, name))
+        return child
+
+    def __getattr__(self, name):
+        children = self.__dict__.get("children", {})
+        if name in children:
+            return children[name]
+        raise AttributeError("{} has no subdirectory {}".format(
+            self.path_str, name))
+
+    def dirs(self):
+        """all the directories of the tree, parents first
+
+        :rtype: list of EPathTree"""
+        dirs = [self]
+        for child in self.children.values():
+            dirs.extend(child.dirs())
+        return dirs
+
+    def leaves(self):
+        """the directories of the tree without subdirectories
+
+        :rtype: list of EPathTree"""
+        return [path for path in self.dirs() if not path.children]
+
+
+class HashCache:
+    """
+    Persistent store of file digests in a SQLite database, keyed by
+    (device, inode, size, mtime) : a file is hashed again only when it
+    has been replaced or rewritten. Files are not read to be looked up,
+    one stat is enough.
+
+    The cache is used by EPath.digest, digest_files and find_duplicates
+    when given to them, or for all of them when installed with
+    enable_hash_cache() or as a context manager. New digests are
+    committed every commit_every insertions, by flush() and close().
+
+    :Example:
+    >>> import tempfile
+    >>> root = EPath(tempfile.mkdtemp())
+    >>> root.join("a.txt").write("abc")
+    >>> with HashCache(root.join(".hashes.sqlite")) as cache:
+    ...     first = root.join("a.txt").digest()
+    ...     again = root.join("a.txt").digest()
+    >>> first == again, cache.hits, cache.misses
+    (True, 1, 1)
+    """
+
+    def __init__(self, db=None, commit_every=1000):
+        """db is the SQLite file of the cache, by default
+        $XDG_CACHE_HOME/epath/hashes.sqlite (~/.cache/epath)"""
+        if db is None:
+            cache_dir = os.environ.get("XDG_CACHE_HOME",
+                                       os.path.expanduser("~/.cache"))
+            cache_dir = os.path.join(cache_dir, "epath")
+            os.makedirs(cache_dir, exist_ok=True)
+            db = os.path.join(cache_dir, "hashes.sqlite")
+        self.db = EPath(str(db))
+        self.commit_every = commit_every
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._previous = None
+        self._conn = sqlite3.connect(self.db.s, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS digests (
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                algorithm TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (dev, ino, algorithm)
+            );
+        """)
+
+    def get(self, st, algorithm):
+        """:returns: digest of the file of os.stat result st, None if
+                     unknown or if the file changed since"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, digest FROM digests "
+                "WHERE dev = ? AND ino = ? AND algorithm = ?",
+                (st.st_dev, st.st_ino, algorithm)).fetchone()
+            if row is not None and row[:2] == (st.st_size, st.st_mtime_ns):
+                self.hits += 1
+                return row[2]
+            self.misses += 1
+            return None
+
+    def put(self, st, algorithm, digest):
+        """stores the digest of the file of os.stat result st"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?)",
+                (st.st_dev, st.st_ino, algorithm, st.st_size,
+                 st.st_mtime_ns, digest))
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+
+    def flush(self):
+        """commits the new digests"""
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def info(self):
+        """:returns: dict of hit/miss counters and number of digests"""
+        with self._lock:
+            size = self._conn.execute(
+                "SELECT COUNT(*) FROM digests").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "size": size}
+
+    def __len__(self):
+        return self.info()["size"]
+
+    def __enter__(self):
+        global _hash_cache
+        self._previous, _hash_cache = _hash_cache, self
+        return self
+
+    def __exit__(self, *exc_info):
+        global _hash_cache
+        _hash_cache, self._previous = self._previous, None
+        self.flush()
+
+    def __repr__(self):
+        return "<HashCache {}>".format(self.db)
+
+
+# hash cache used by EPath, None when disabled
+_hash_cache = None
+_HASH_BLOCK = 2 ** 20
+_hash_buffers = threading.local()
+
+
+def enable_hash_cache(db=None):
+    """installs a new HashCache used by all EPath objects
+
+    :rtype: HashCache
+    """
+    global _hash_cache
+    _hash_cache = HashCache(db)
+    return _hash_cache
+
+
+def disable_hash_cache():
+    """stops using the hash cache, and commits it"""
+    global _hash_cache
+    if _hash_cache is not None:
+        _hash_cache.flush()
+    _hash_cache = None
+
+
+def get_hash_cache():
+    """:returns: the HashCache in use, None if disabled"""
+    return _hash_cache
+
+
+def _hash_file(path_str, algorithm, size, limit=None):
+    """digest of the first limit bytes (all by default) of a file of
+    size bytes. Large files are read in blocks into a buffer reused by
+    each thread, hashlib releases the GIL while hashing them."""
+    digest = hashlib.new(algorithm)
+    if limit is not None:
+        size = min(size, limit)
+    with open(path_str, "rb", buffering=0) as fd:
+        if size <= _HASH_BLOCK:
+            digest.update(fd.read(size) if limit is not None else fd.read())
+            return digest.hexdigest()
+        view = getattr(_hash_buffers, "view", None)
+        if view is None:
+            view = _hash_buffers.view = memoryview(bytearray(_HASH_BLOCK))
+        remaining = size if limit is not None else None
+        while remaining is None or remaining > 0:
+            n = fd.readinto(view if remaining is None or
+                            remaining >= _HASH_BLOCK else view[:remaining])
+            if not n:
+                break
+            digest.update(view[:n])
+            if remaining is not None:
+                remaining -= n
+    return digest.hexdigest()
+
+
+def _digest(path_str, algorithm, cache, st=None):
+    """digest of a file, looked up in and stored to cache when given"""
+    if st is None:
+        st = os.stat(path_str)
+    if cache is not None:
+        digest = cache.get(st, algorithm)
+        if digest is not None:
+            return digest
+    digest = _hash_file(path_str, algorithm, st.st_size)
+    if cache is not None:
+        after = os.stat(path_str)
+        # not cached if the file changed while it was read
+        if (after.st_size, after.st_mtime_ns) == (st.st_size,
+                                                  st.st_mtime_ns):
+            cache.put(st, algorithm, digest)
+    return digest
+
+
+def digest_files(paths, algorithm="sha256", workers=8, cache=None):
+    """
+    digests of many files, hashed in a pool of threads
+
+    :param paths: iterable of file paths
+    :param algorithm: any hashlib algorithm
+    :param workers: number of hashing threads
+    :param cache: HashCache, by default the installed one
+    :rtype: dict of EPath: str
+
+    :Example:
+    >>> import tempfile
+    >>> root = EPath(tempfile.mkdtemp())
+    >>> for name in ["a.txt", "b.txt"]:
+    ...     root.join(name).write("abc")
+    >>> digests = digest_files(root.glob("*.txt"), algorithm="md5")
+    >>> sorted(set(digests.values()))
+    ['900150983cd24fb0d6963f7d28e17f72']
+    """
+    if cache is None:
+        cache = _hash_cache
+    paths = [EPath(path) for path in paths]
+
+    def digest(path):
+        return _digest(path.path_str, algorithm, cache)
+
+    try:
+        with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(zip(paths, pool.map(digest, paths)))
+    finally:
+        if cache is not None:
+            cache.flush()
+
+
+def find_duplicates(paths, algorithm="sha256", workers=8, cache=None,
+                    min_size=1, head=64 * 1024):
+    """
+    groups of files with the same content. Only files sharing their size
+    are read, files larger than head bytes are first compared by the
+    digest of their first head bytes, and fully hashed (or looked up in
+    the HashCache) only if it matches.
+
+    :param paths: iterable of file paths, e.g. EPath.iglob("**/*")
+    :param min_size: smaller files are ignored, empty ones by default
+    :rtype: list of lists of EPath
+    :returns: the groups of at least 2 identical files, largest first
+
+    :Example:
+    >>> import tempfile
+    >>> root = EPath(tempfile.mkdtemp())
+    >>> for name, content in [("a", "abc"), ("b", "abd"), ("c", "abc")]:
+    ...     root.join(name).write(content)
+    >>> find_duplicates(root.iglob("*"))  # doctest: +ELLIPSIS
+    [[/.../a, /.../c]]
+    """
+    if cache is None:
+        cache = _hash_cache
+    by_size = collections.defaultdict(list)
+    for path in paths:
+        path = EPath(path)
+        if path.is_file():
+            st = os.stat(path.path_str)
+            if st.st_size >= min_size:
+                by_size[st.st_size].append((path, st))
+    candidates = [group for group in by_size.values() if len(group) > 1]
+
+    def head_digest(item):
+        path, st = item
+        if st.st_size <= head:
+            return _digest(path.path_str, algorithm, cache, st)
+        return "head:" + _hash_file(path.path_str, algorithm, st.st_size,
+                                    limit=head)
+
+    def full_digest(item):
+        path, st = item
+        return _digest(path.path_str, algorithm, cache, st)
+
+    groups = []
+    try:
+        with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            for step in (head_digest, full_digest):
+                items = [item for group in candidates for item in group]
+                keys = pool.map(step, items)
+                by_key = collections.defaultdict(list)
+                for item, key in zip(items, keys):
+                    by_key[item[1].st_size, key].append(item)
+                candidates = []
+                for (size, key), group in by_key.items():
+                    if len(group) < 2:
+                        continue
+                    if key.startswith("head:"):
+                        candidates.append(group)
+                    else:
+                        groups.append((size, [path for path, _ in group]))
+    finally:
+        if cache is not None:
+            cache.flush()
+    groups = [(size, sorted(group, key=lambda path: path.path_str))
+              for size, group in groups]
+    groups.sort(key=lambda group: (-group[0], group[1][0].path_str))
+    return [group for _, group in groups]
+
+
+# marks a PathTrie node which is a member without children
+_LEAF = 0
+# key marking a PathTrie node with children as a member
+_MEMBER = None
+
+
+def _trie_parts(key):
+    return [""] if key == "/" else key.split("/")
+
+
+def _trie_split(node):
+    """(is member, children dict) of a PathTrie node, the dict may
+    contain the _MEMBER key"""
+    if node is _LEAF:
+        return True, {}
+    return _MEMBER in node, node
+
+
+def _trie_make(member, children):
+    """PathTrie node from its parts, None for an empty node"""
+    if not children:
+        return _LEAF if member else None
+    if member:
+        children[_MEMBER] = True
+    return children
+
+
+def _trie_copy(node):
+    if node is _LEAF:
+        return _LEAF
+    return {name: child if name is _MEMBER else _trie_copy(child)
+            for name, child in node.items()}
+
+
+def _trie_count(node):
+    if node is _LEAF:
+        return 1
+    return sum(1 if name is _MEMBER else _trie_count(child)
+               for name, child in node.items())
+
+
+def _trie_union(a, b):
+    member_a, children_a = _trie_split(a)
+    member_b, children_b = _trie_split(b)
+    children = {}
+    for name, child in children_a.items():
+        if name is not _MEMBER:
+            other = children_b.get(name)
+            children[name] = (_trie_copy(child) if other is None
+                              else _trie_union(child, other))
+    for name, child in children_b.items():
+        if name is not _MEMBER and name not in children_a:
+            children[name] = _trie_copy(child)
+    return _trie_make(member_a or member_b, children)
+
+
+def _trie_intersection(a, b):
+    member_a, children_a = _trie_split(a)
+    member_b, children_b = _trie_split(b)
+    if len(children_b) < len(children_a):
+        children_a, children_b = children_b, children_a
+    children = {}
+    for name, child in children_a.items():
+        other = children_b.get(name)
+        if name is not _MEMBER and other is not None:
+            node = _trie_intersection(child, other)
+            if node is not None:
+                children[name] = node
+    return _trie_make(member_a and member_b, children)
+
+
+def _trie_difference(a, b):
+    member_a, children_a = _trie_split(a)
+    member_b, children_b = _trie_split(b)
+    children = {}
+    for name, child in children_a.items():
+        if name is _MEMBER:
+            continue
+        other = children_b.get(name)
+        node = (_trie_copy(child) if other is None
+                else _trie_difference(child, other))
+        if node is not None:
+            children[name] = node
+    return _trie_make(member_a and not member_b, children)
+
+
+class PathTrie:
+    """
+    Set of paths stored as a tree of their components : the components
+    shared by many paths, their parent directories, are stored once.
+
+    Membership, insertion and removal cost one dict lookup per
+    component. prefix queries (everything under a directory) only visit
+    that subtree, and the set operations (|, &, -, ^, <=) work on whole
+    subtrees at once. Iterating yields EPath objects. Paths are compared
+    as EPath equality does.
+
+    :Example:
+    >>> trie = PathTrie(["/root/data/csv/a.csv", "/root/data/csv/b.csv",
+    ...                  "/root/data/tex/a.tex", "/root/images/a.png"])
+    >>> EPath("/root/data/csv/a.csv") in trie, "/root/data/csv" in trie
+    (True, False)
+    >>> list(trie.iter_prefix("/root/data/csv"))
+    [/root/data/csv/a.csv, /root/data/csv/b.csv]
+    >>> len(trie - PathTrie(["/root/images/a.png"]))
+    3
+    >>> trie.children("/root/data")
+    [/root/data/csv, /root/data/tex]
+    """
+
+    __slots__ = ("_root", "_len")
+
+    def __init__(self, paths=()):
+        """paths is an iterable of str, pathlib.Path or EPath objects"""
+        self._root = {}
+        self._len = 0
+        self.update(paths)
+
+    @classmethod
+    def _from_node(cls, node):
+        trie = cls()
+        if node is not None:
+            trie._root = node
+            trie._len = _trie_count(node)
+        return trie
+
+    @staticmethod
+    def _parts(path):
+        if not isinstance(path, EPath):
+            path = EPath(str(path))
+        return _trie_parts(path._key())
+
+    def _find(self, parts):
+        """node of the path given by parts, None if not in the trie"""
+        node = self._root
+        for name in parts:
+            if node is _LEAF:
+                return None
+            node = node.get(name)
+            if node is None:
+                return None
+        return node
+
+    def add(self, path):
+        """adds a path"""
+        parts = self._parts(path)
+        node = self._root
+        for i, name in enumerate(parts[:-1]):
+            child = node.get(name)
+            if child is None:
+                # fresh branch, built from the bottom
+                child = _LEAF
+                for rest in reversed(parts[i + 1:]):
+                    child = {rest: child}
+                node[name] = child
+                self._len += 1
+                return
+            if child is _LEAF:
+                child = node[name] = {_MEMBER: True}
+            node = child
+        child = node.get(parts[-1])
+        if child is None:
+            node[parts[-1]] = _LEAF
+        elif child is not _LEAF and _MEMBER not in child:
+            child[_MEMBER] = True
+        else:
+            return
+        self._len += 1
+
+    def update(self, paths):
+        """adds all the paths of an iterable"""
+        for path in paths:
+            self.add(path)
+
+    def discard(self, path):
+        """removes a path if present"""
+        parts = self._parts(path)
+        nodes = [self._root]
+        for name in parts[:-1]:
+            node = nodes[-1].get(name)
+            if node is None or node is _LEAF:
+                return
+            nodes.append(node)
+        node = nodes[-1].get(parts[-1])
+        if node is None or (node is not _LEAF and _MEMBER not in node):
+            return
+        self._len -= 1
+        if node is not _LEAF:
+            del node[_MEMBER]
+            return
+        del nodes[-1][parts[-1]]
+        # removes the directories left empty
+        for parent, name in zip(reversed(nodes[:-1]), reversed(parts[:-1])):
+            child = parent[name]
+            if child:
+                if list(child) == [_MEMBER]:
+                    parent[name] = _LEAF
+                break
+            del parent[name]
+
+    def remove(self, path):
+        """removes a path, raises KeyError if it is absent"""
+        if path not in self:
+            raise KeyError(path)
+        self.discard(path)
+
+    def __contains__(self, path):
+        node = self._find(self._parts(path))
+        return node is _LEAF or (node is not None and _MEMBER in node)
+
+    def __len__(self):
+        return self._len
+
+    def _iter_node(self, node, prefix):
+        stack = [(prefix, node)]
+        while stack:
+            prefix, node = stack.pop()
+            if node is _LEAF or _MEMBER in node:
+                yield EPath._from_str(prefix or "/")
+            if node is not _LEAF:
+                for name in reversed([name for name in node
+                                      if name is not _MEMBER]):
+                    stack.append((prefix + "/" + name, node[name]))
+
+    def __iter__(self):
+        for name, node in self._root.items():
+            if name is not _MEMBER:
+                yield from self._iter_node(node, name)
+
+    def iter_prefix(self, prefix):
+        """
+        yields the paths of the trie at or under prefix, a directory
+
+        :rtype: generator of EPath
+        """
+        parts = self._parts(prefix)
+        node = self._find(parts)
+        if node is not None:
+            yield from self._iter_node(node, "/".join(parts))
+
+    def subtree(self, prefix):
+        """
+        :rtype: PathTrie
+        :returns: a new trie of the paths at or under prefix
+        """
+        parts = self._parts(prefix)
+        node = self._find(parts)
+        if node is None:
+            return PathTrie()
+        node = _trie_copy(node)
+        for name in reversed(parts):
+            node = {name: node}
+        return PathTrie._from_node(node)
+
+    def children(self, path):
+        """
+        :rtype: list of EPath
+        :returns: the direct children of path in the trie, members or
+                  directories of members
+        """
+        parts = self._parts(path)
+        node = self._find(parts)
+        if node is None or node is _LEAF:
+            return []
+        prefix = "/".join(parts)
+        return [EPath._from_str(prefix + "/" + name) for name in node
+                if name is not _MEMBER]
+
+    def __or__(self, other):
+        return PathTrie._from_node(_trie_union(self._root, other._root))
+
+    def __and__(self, other):
+        return PathTrie._from_node(_trie_intersection(self._root,
+                                                      other._root))
+
+    def __sub__(self, other):
+        return PathTrie._from_node(_trie_difference(self._root, other._root))
+
+    def __xor__(self, other):
+        return (self - other) | (other - self)
+
+    union, intersection, difference = __or__, __and__, __sub__
+    symmetric_difference = __xor__
+
+    def __le__(self, other):
+        return len(self) <= len(other) and not (self - other)
+
+    issubset = __le__
+
+    def __eq__(self, other):
+        if not isinstance(other, PathTrie):
+            return NotImplemented
+        return len(self) == len(other) and not (self - other)
+
+    __hash__ = None
+
+    def __bool__(self):
+        return self._len > 0
+
+    def __repr__(self):
+        return "<PathTrie {} paths>".format(self._len)
+
+
+# inotify(7) flags, see <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ONLYDIR = 0x01000000
+_IN_EXCL_UNLINK = 0x04000000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = (_IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE
+               | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR
+               | _IN_EXCL_UNLINK)
+_libc = None
+
+WatchEvent = collections.namedtuple("WatchEvent", ["kind", "path"])
+WatchEvent.__doc__ = """change reported by an EPathWatcher : kind is
+"created", "modified", "deleted" or "overflow", path an EPath"""
+
+
+def _inotify():
+    """the C library, with the inotify functions typed"""
+    global _libc
+    if _libc is None:
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                               ctypes.c_uint32]
+            libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        except (OSError, AttributeError):
+            raise ValueError("watching a directory needs Linux inotify")
+        _libc = libc
+    return _libc
+
+
+class EPathWatcher:
+    """
+    Feed of the changes below a directory, read from Linux inotify
+    instead of polling with glob, see EPath.watch.
+
+    Events are WatchEvent(kind, path) tuples :
+       - created : a file or directory appeared (created or moved in)
+       - modified : a file opened for writing was closed, wait for this
+         event before reading a new file
+       - deleted : a file or directory disappeared (deleted or moved out)
+       - overflow : the kernel queue overflowed and events were lost,
+         path is the watched directory
+    Every change invalidates the stat cache, the image cache and the
+    installed indexes as soon as it is read, debounced or not. On
+    overflow, both caches are cleared and the watched tree is marked
+    for a full refresh in the installed indexes (see
+    EPathIndex.invalidate), call their refresh() before relying on them.
+
+    Directories created below a recursive watcher are watched in turn,
+    and their content already present is reported as created, so a
+    file may be reported twice when it is created at that moment.
+
+    With debounce, the events of a path are merged until the path has
+    been quiet for debounce seconds : created then modified is
+    created, created then deleted is nothing, deleted then created is
+    modified.
+
+    :Example:
+    >>> import tempfile
+    >>> root = EPath(tempfile.mkdtemp())
+    >>> with root.watch(debounce=0.05) as watcher:
+    ...     root.join("a.csv").write("1;2")
+    ...     root.join("run").mkdir()
+    ...     root.join("run/b.csv").write("3;4")
+    ...     root.join("a.csv").removefile()
+    ...     sorted((e.kind, e.path.basename.s) for e in watcher.read(1))
+    [('created', 'b.csv'), ('created', 'run')]
+    """
+
+    def __init__(self, path, recursive=True, debounce=None):
+        """
+        :param path: watched directory
+        :param recursive: also watches all the directories below path
+        :param debounce: quiet period in seconds before the events of a
+                         path are reported, None reports them at once
+        """
+        self._fd = None
+        self.path = EPath(os.path.abspath(str(path)))
+        self.recursive = recursive
+        self.debounce = debounce
+        if not os.path.isdir(self.path.path_str):
+            raise ValueError("This is not a directory !")
+        self._libc = _inotify()
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._dirs = {}  # watch descriptor: directory
+        self._wds = {}  # directory: watch descriptor
+        self._pending = collections.OrderedDict()  # path: [kind, time]
+        self._ready = collections.deque()
+        self._add_tree(self.path.path_str, report=False)
+
+    def fileno(self):
+        """inotify file descriptor, readable when events are waiting"""
+        return self._fd
+
+    @property
+    def closed(self):
+        return self._fd is None
+
+    def _add_tree(self, dir_str, report=True):
+        """watches dir_str and, when recursive, the directories below it,
+        reporting their entries as created"""
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dir_str),
+                                          _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                # already gone, its deletion is in the queue
+                return
+            raise OSError(err, os.strerror(err), dir_str)
+        self._dirs[wd] = dir_str
+        self._wds[dir_str] = wd
+        if not self.recursive and dir_str != self.path.path_str:
+            return
+        now = time.monotonic()
+        for entry in _scandir(dir_str):
+            if report:
+                self._push("created", entry.path, now)
+            if self.recursive and entry.is_dir(follow_symlinks=False):
+                self._add_tree(entry.path, report)
+
+    def _remove_tree(self, dir_str):
+        """stops watching dir_str and the directories below it"""
+        prefix = dir_str + "/"
+        for path_str in [p for p in self._wds
+                         if p == dir_str or p.startswith(prefix)]:
+            wd = self._wds.pop(path_str)
+            if self._dirs.get(wd) == path_str:
+                del self._dirs[wd]
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _push(self, kind, path_str, now):
+        """queues one event, merged with the pending one of the same path
+        when debounced"""
+        if not self.debounce:
+            self._ready.append(WatchEvent(kind, EPath._from_str(path_str)))
+            return
+        pending = self._pending.pop(path_str, None)
+        if pending is not None:
+            if pending[0] == "created":
+                if kind == "deleted":
+                    return
+                kind = "created"
+            elif pending[0] == "deleted" and kind == "created":
+                kind = "modified"
+        self._pending[path_str] = [kind, now]
+
+    def _flush(self, now):
+        """moves the events of the paths quiet for debounce seconds to
+        the ready queue"""
+        while self._pending:
+            path_str, (kind, last) = next(iter(self._pending.items()))
+            if now - last < self.debounce:
+                break
+            del self._pending[path_str]
+            self._ready.append(WatchEvent(kind, EPath._from_str(path_str)))
+
+    def _read_events(self):
+        """reads and translates the waiting inotify events"""
+        try:
+            buf = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return
+        now = time.monotonic()
+        pos = 0
+        while pos < len(buf):
+            wd, mask, _, length = struct.unpack_from("iIII", buf, pos)
+            name = buf[pos + 16:pos + 16 + length].rstrip(b"\0")
+            pos += 16 + length
+            if mask & _IN_Q_OVERFLOW:
+                if _stat_cache is not None:
+                    _stat_cache.invalidate()
+                if _image_cache is not None:
+                    _image_cache.invalidate()
+                root = self.path.path_str
+                for index in _indexes:
+                    if index.covers(root):
+                        index.invalidate(root)
+                    elif index.root.path_str.startswith(
+                            _subtree_range(root)[0]):
+                        index.invalidate()
+                self._ready.append(WatchEvent("overflow", self.path))
+                continue
+            dir_str = self._dirs.get(wd)
+            if dir_str is None:
+                continue
+            if mask & _IN_IGNORED:
+                del self._dirs[wd]
+                if self._wds.get(dir_str) == wd:
+                    del self._wds[dir_str]
+                continue
+            if not name:
+                # the watched directory itself, only reported for the root
+                # as its parent reports the others
+                if (mask & (_IN_DELETE_SELF | _IN_MOVE_SELF)
+                        and dir_str == self.path.path_str):
+                    _changed(dir_str)
+                    self._push("deleted", dir_str, now)
+                    self._remove_tree(dir_str)
+                continue
+            path_str = os.path.join(dir_str, os.fsdecode(name))
+            _changed(path_str)
+            if mask & (_IN_CREATE | _IN_MOVED_TO):
+                self._push("created", path_str, now)
+                if mask & _IN_ISDIR and self.recursive:
+                    self._add_tree(path_str)
+            elif mask & (_IN_DELETE | _IN_MOVED_FROM):
+                self._push("deleted", path_str, now)
+                if mask & _IN_ISDIR:
+                    self._remove_tree(path_str)
+            elif mask & _IN_CLOSE_WRITE:
+                self._push("modified", path_str, now)
+
+    def read(self, timeout=None):
+        """
+        waits for events
+
+        :param timeout: maximum wait in seconds, None waits until there
+                        are events
+        :rtype: list of WatchEvent
+        :returns: the events ready, empty after timeout or when nothing
+                  is left to watch
+        """
+        if self._fd is None:
+            raise ValueError("read from a closed EPathWatcher")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            if self._pending:
+                self._flush(now)
+            if self._ready or not (self._dirs or self._pending) or (
+                    deadline is not None and now >= deadline):
+                events = list(self._ready)
+                self._ready.clear()
+                return events
+            wait = None if deadline is None else deadline - now
+            if self._pending:
+                due = next(iter(self._pending.values()))[1] + self.debounce
+                wait = due - now if wait is None else min(wait, due - now)
+            if select.select([self._fd], [], [], wait)[0]:
+                self._read_events()
+
+    def events(self, timeout=None):
+        """
+        yields events until none comes during timeout seconds (None :
+        until the watched directory is deleted or the watcher closed)
+        """
+        while self._fd is not None:
+            events = self.read(timeout)
+            if not events:
+                return
+            yield from events
+
+    def __iter__(self):
+        return self.events()
+
+    def close(self):
+        """removes all the watches"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._dirs.clear()
+            self._wds.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def __repr__(self):
+        return "<EPathWatcher {} ({} directories)>".format(self.path,
+                                                           len(self._dirs))
+
+
+_MEMO_SUFFIXES = {"pickle": ".pkl", "npz": ".npz", "csv": ".csv"}
+# str values written like an int, a float or a bool by add_param
+_MEMO_AMBIGUOUS = re.compile(
+    r"[-+]?(?:\d+(?:f\d*)?(?:e[-+]?\d+)?|inf)|nan|True|False")
+_memo_lock = threading.Lock()
+_memo_bytes = {}  # cache root: bytes held, known since the last scan
+
+
+def _memo_files(dir_str):
+    """(mtime_ns, size, path) of the results stored in the directory of
+    a function, temporary files of writes in progress excepted"""
+    files = []
+    for entry in _scandir(dir_str):
+        if entry.name.startswith(".") or not entry.is_file(
+                follow_symlinks=False):
+            continue
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+        files.append((st.st_mtime_ns, st.st_size, entry.path))
+    return files
+
+
+def _memo_evict(root_str, max_bytes):
+    """removes the least recently used results below root_str until they
+    hold max_bytes at most
+
+    :returns: number of files removed
+    """
+    files = [item for sub in _scandir(root_str)
+             if sub.is_dir(follow_symlinks=False)
+             for item in _memo_files(sub.path)]
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    if total > max_bytes:
+        for _, size, path_str in sorted(files):
+            try:
+                os.remove(path_str)
+            except FileNotFoundError:
+                pass
+            _changed(path_str)
+            total -= size
+            removed += 1
+            if total <= max_bytes:
+                break
+    _memo_bytes[root_str] = total
+    return removed
+
+
+class DiskMemo:
+    """
+    Disk-backed memoization of a function, see memoize.
+
+    The arguments of a call, defaults applied, are written in the file
+    name with add_param : results of train(lr=0.01, bs=32) are stored
+    in <root>/<module>.train/train_lr0f01_bs32.pkl and can be decoded
+    with EPath.params. Arguments which are not int, float, bool or str
+    (arrays, lists...), or str written like another type ("1", "True"),
+    are replaced by a digest of their pickle, so that calls with
+    different arguments never share a file. NumPy scalars share the
+    file of the equal Python value. When the file exists, the result is
+    loaded instead of computed.
+
+    Results are written atomically (temporary file renamed over the
+    path) so that concurrent processes and interrupted runs never leave
+    a partial result. Loading a result touches its file : with
+    max_bytes, the least recently used results below root are removed
+    when they hold more than max_bytes.
+
+    The cache is not invalidated when the code of the function changes,
+    call clear().
+
+    Methods are memoized like functions of self, which has to be
+    picklable, otherwise a ValueError is raised : pass key, a function
+    of self returning what identifies it, such as one of its
+    attributes.
+
+    :Example:
+    >>> import tempfile
+    >>> root = tempfile.mkdtemp()
+    >>> @memoize(root)
+    ... def power(x, n=2):
+    ...     return x ** n
+    >>> power(3), power(3), power(2.5, n=3)
+    (9, 9, 15.625)
+    >>> power.path(2.5, n=3).basename
+    power_x2f5_n3.pkl
+    >>> power.path(1) == power.path("1"), power.path(1) == power.path(True)
+    (False, False)
+    >>> power.info()["hits"], power.info()["misses"]
+    (1, 2)
+    >>> class Model:
+    ...     def __init__(self, name):
+    ...         self.name = name
+    ...         self.lock = threading.Lock()
+    ...     @memoize(root, key=lambda self: self.name)
+    ...     def score(self, x):
+    ...         return len(self.name) * x
+    ...     @memoize(root)
+    ...     def unkeyed(self, x):
+    ...         return x
+    >>> Model("cnn").score(2), Model.score.path(Model("cnn"), 2).basename
+    (6, score_selfcnn_x2.pkl)
+    >>> Model("cnn").unkeyed(2)  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    ValueError: cannot pickle the arguments of Model.unkeyed (...), see key
+    """
+
+    FORMATS = tuple(_MEMO_SUFFIXES)
+
+    def __init__(self, func, root=None, format="pickle", max_bytes=None,
+                 key=None):
+        """
+        :param func: memoized function
+        :param root: cache directory, by default
+                     $XDG_CACHE_HOME/epath/memo (~/.cache/epath/memo)
+        :param format: storage of the results :
+                       - pickle : any picklable result
+                       - npz : a NumPy array, or a dict of arrays
+                       - csv : a pandas.DataFrame, with its index
+        :param max_bytes: size limit of the cache directory, None for no
+                          limit
+        :param key: function of the first argument (self for methods)
+                    whose result replaces it in the file name, None
+                    keeps the argument
+        """
+        if format not in _MEMO_SUFFIXES:
+            raise ValueError("format must be one of {}".format(self.FORMATS))
+        if root is None:
+            root = os.path.join(os.environ.get(
+                "XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+                "epath", "memo")
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.root = EPath(os.path.abspath(str(root)))
+        self.dir = self.root.join("{}.{}".format(func.__module__,
+                                                 func.__qualname__))
+        self.format = format
+        self.max_bytes = max_bytes
+        self.key = key
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._signature = inspect.signature(func)
+        self._lock = threading.Lock()
+
+    def path(self, *args, **kwargs):
+        """
+        file of the result of a call
+
+        :rtype: EPath
+        """
+        bound = self._signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = bound.arguments
+        path = self.dir.join(self.func.__name__ + _MEMO_SUFFIXES[self.format])
+        if not params:
+            return path
+        if self.key is not None:
+            first = next(iter(params))
+            params[first] = self.key(params[first])
+        kinds = [_param_type(type(value)) for value in params.values()]
+        if None not in kinds and not any(
+                kind is str and _MEMO_AMBIGUOUS.fullmatch(value)
+                for kind, value in zip(kinds, params.values())):
+            try:
+                named = path.add_param(dict(params))
+                if len(named.basename.s) < 200:
+                    return named
+            except ValueError:
+                # str values which can not be written in a file name
+                pass
+        try:
+            data = pickle.dumps(list(params.items()), protocol=4)
+        except (pickle.PicklingError, TypeError, AttributeError) as err:
+            raise ValueError("cannot pickle the arguments of {} ({}), see "
+                             "key".format(self.func.__qualname__,
+                                          err)) from err
+        digest = hashlib.sha1(data)
+        return path.add_after_stem(digest.hexdigest()[:20])
+
+    def _load(self, fd):
+        if self.format == "pickle":
+            return pickle.load(fd)
+        if self.format == "npz":
+            with np.load(fd, allow_pickle=False) as data:
+                if data.files == ["arr_0"]:
+                    return data["arr_0"]
+                return {name: data[name] for name in data.files}
+        return pd.read_csv(fd, sep=";", index_col=0)
+
+    def _store(self, path, result):
+        os.makedirs(path.parent.s, exist_ok=True)
+        if self.format == "csv":
+            tmp = path.parent.join(".{}.tmp.{}".format(os.getpid(),
+                                                        path.basename.s))
+            try:
+                tmp.writedf(result)
+                os.replace(tmp.s, path.s)
+            except BaseException:
+                try:
+                    os.remove(tmp.s)
+                except OSError:
+                    pass
+                raise
+            finally:
+                path._changed()
+            return
+        with EPathWriter(path, mode="wb", atomic=True) as writer:
+            if self.format == "pickle":
+                pickle.Pickler(writer, protocol=4).dump(result)
+            elif isinstance(result, dict):
+                # NumPy only writes to real file objects
+                np.savez(writer._fd, **result)
+            else:
+                np.savez(writer._fd, result)
+
+    def __call__(self, *args, **kwargs):
+        path = self.path(*args, **kwargs)
+        try:
+            with open(path.s, "rb") as fd:
+                result = self._load(fd)
+                try:
+                    # the mtime tells the last use to the eviction
+                    os.utime(fd.fileno())
+                except PermissionError:
+                    pass
+        except FileNotFoundError:
+            pass
+        else:
+            with self._lock:
+                self.hits += 1
+            return result
+        with self._lock:
+            self.misses += 1
+        result = self.func(*args, **kwargs)
+        self._store(path, result)
+        if self.max_bytes is not None:
+            self._account(os.stat(path.s).st_size)
+        return result
+
+    def _account(self, size):
+        """counts size new bytes in the cache root, evicts when full"""
+        root_str = self.root.path_str
+        with _memo_lock:
+            total = _memo_bytes.get(root_str)
+            if total is not None:
+                total = _memo_bytes[root_str] = total + size
+            if total is None or total > self.max_bytes:
+                # first use of the root, or full : sizes are read again
+                # as other processes may share the directory
+                removed = _memo_evict(root_str, self.max_bytes)
+                with self._lock:
+                    self.evictions += removed
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return functools.partial(self, obj)
+
+    def clear(self):
+        """removes the stored results of the function
+
+        :returns: number of files removed"""
+        if not self.dir.exists():
+            return 0
+        report = _removetree(self.dir.path_str)
+        with _memo_lock:
+            _memo_bytes.pop(self.root.path_str, None)
+        return report.files
+
+    def info(self):
+        """:returns: dict of hit/miss counters, files and bytes stored"""
+        files = [size for _, size, _ in _memo_files(self.dir.path_str)]
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "files": len(files),
+                "bytes": sum(files), "max_bytes": self.max_bytes,
+                "hit_rate": self.hits / float(total) if total else 0.}
+
+    def __repr__(self):
+        return "<DiskMemo {} in {}>".format(self.func.__qualname__,
+                                             self.dir)
+
+
+def memoize(root=None, format="pickle", max_bytes=None, key=None):
+    """
+    decorator storing the results of a function on disk, under file
+    names built from its arguments : a call whose result file exists
+    loads it instead of computing it again
+
+    :see: DiskMemo for the parameters
+    :returns: decorator of a function into a DiskMemo
+    """
+    if callable(root):
+        # used without parentheses
+        return DiskMemo(root)
+
+    def decorator(func):
+        return DiskMemo(func, root=root, format=format, max_bytes=max_bytes,
+                        key=key)
+    return decorator
+
+
+# os functions counted as system calls by the Profiler
+_SYSCALLS = ("stat", "lstat", "scandir", "listdir", "open", "mkdir", "rmdir",
+             "remove", "unlink", "rename", "replace", "access", "chmod",
+             "utime", "fsync", "sendfile", "copy_file_range", "statvfs")
+# os.path functions doing system calls, counted as path.<name>
+_PATH_SYSCALLS = ("exists", "lexists", "isdir", "isfile", "islink",
+                  "getsize", "getmtime", "realpath")
+# EPath special methods timed by the Profiler, besides the public ones
+_PROFILED_SPECIALS = ("__init__", "__getitem__", "__add__", "__div__",
+                      "__truediv__", "__floordiv__")
+# original EPath attributes and os module while instrumented
+_originals = {}
+# number of installed profilers sharing the instrumentation
+_instrumented = 0
+_instrument_lock = threading.Lock()
+
+
+def _profiled(name, func):
+    """func timed by the Profiler in use. Generator functions are timed
+    while they run, each resume is one trace event."""
+    if func.__code__.co_flags & inspect.CO_GENERATOR:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _profiler
+            iterator = func(*args, **kwargs)
+            if profiler is None:
+                yield from iterator
+                return
+            first = True
+            try:
+                while True:
+                    start = profiler._begin(name)
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                    finally:
+                        profiler._end(name, start, first)
+                        first = False
+                    yield item
+            finally:
+                iterator.close()
+        return wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _profiler
+        if profiler is None:
+            return func(*args, **kwargs)
+        start = profiler._begin(name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler._end(name, start)
+    return wrapper
+
+
+def _counted(name, func):
+    """func counted as a system call by the Profiler in use"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _profiler
+        if profiler is not None:
+            profiler._syscall(name)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+class _CountedOS:
+    """stands for the os module (or os.path) in this module while
+    profiling : the functions of _SYSCALLS (or _PATH_SYSCALLS) are
+    counted, the other attributes are the ones of the module. The
+    module itself is left untouched, so code outside epath is not
+    affected."""
+
+    def __init__(self, module, names=_SYSCALLS, prefix=""):
+        self._module = module
+        for name in names:
+            if hasattr(module, name):
+                setattr(self, name, _counted(prefix + name,
+                                             getattr(module, name)))
+        if module is os:
+            self.path = _CountedOS(os.path, _PATH_SYSCALLS, "path.")
+
+    def __getattr__(self, attr):
+        return getattr(self._module, attr)
+
+
+def _instrument():
+    """wraps the EPath methods and properties, and the system calls made
+    by this module, for the Profiler. Calls are counted, the last
+    matching _uninstrument removes the wrappers."""
+    global _instrumented
+    with _instrument_lock:
+        _instrumented += 1
+        if _instrumented == 1:
+            _wrap()
+
+
+def _wrap():
+    for name, attr in list(vars(EPath).items()):
+        if name.startswith("_") and name not in _PROFILED_SPECIALS:
+            continue
+        label = "EPath." + name
+        if isinstance(attr, property):
+            wrapped = property(_profiled(label, attr.fget), attr.fset,
+                               attr.fdel, attr.__doc__)
+        elif (inspect.isfunction(attr)
+              and not inspect.iscoroutinefunction(attr)
+              and not inspect.isasyncgenfunction(attr)):
+            wrapped = _profiled(label, attr)
+        else:
+            continue
+        _originals[name] = attr
+        setattr(EPath, name, wrapped)
+    # os and open as seen by this module only
+    globals()["os"] = _CountedOS(os)
+    globals()["open"] = _counted("open", builtins.open)
+
+
+def _uninstrument():
+    """undoes one _instrument, restores what was wrapped after the
+    last one"""
+    global _instrumented
+    with _instrument_lock:
+        if _instrumented == 0:
+            return
+        _instrumented -= 1
+        if _instrumented:
+            return
+        for name, attr in _originals.items():
+            setattr(EPath, name, attr)
+        _originals.clear()
+        globals()["os"] = os._module
+        globals().pop("open", None)
+
+
+class Profiler:
+    """
+    Opt-in instrumentation of EPath : call counts, cumulative wall time
+    and system calls (os.stat, os.scandir, open...) of every EPath method
+    and property, to tell string work from filesystem work.
+
+    EPath methods and the os functions used by this module are wrapped
+    while a profiler is installed, with enable_profiler(), as a context
+    manager, or for a whole program with the EPATH_PROFILE environment
+    variable : 1 prints the summary at exit, a file name also writes the
+    Chrome trace there. Nothing is wrapped otherwise.
+
+    Only the calls made by epath are seen : the os module and open are
+    replaced in the epath namespace, not for the rest of the process.
+    The EPath class is instrumented for every thread, and there is one
+    profiler in use at a time, the last installed. Installing and
+    removing are thread safe and counted, the instrumentation goes
+    away with the last profiler.
+
+    Times are inclusive of nested EPath calls. A system call is counted
+    for the innermost EPath method running in its thread, system calls
+    made by os.DirEntry methods, pathlib or shutil are not seen.
+
+    :Example:
+    >>> with Profiler() as profiler:
+    ...     path = EPath("/")
+    ...     path.exists(), path.is_dir()
+    (True, True)
+    >>> calls, seconds, syscalls = profiler.stats["EPath.is_dir"]
+    >>> calls, syscalls
+    (1, 1)
+    >>> print(profiler.summary())  # doctest: +ELLIPSIS
+    method          calls   total ms   mean us   syscalls
+    ...
+    """
+
+    def __init__(self, max_events=10 ** 6):
+        """max_events bounds the number of trace events kept"""
+        self.max_events = max_events
+        # method: [calls, seconds, system calls]
+        self.stats = {}
+        # (method, system call): count
+        self.syscalls = collections.Counter()
+        # (method, start, duration, thread id, system calls)
+        self.events = []
+        self.dropped_events = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._previous = None
+
+    def _begin(self, name):
+        try:
+            stack = self._local.stack
+        except AttributeError:
+            stack = self._local.stack = []
+        stack.append([name, 0])
+        return time.perf_counter()
+
+    def _end(self, name, start, call=True):
+        duration = time.perf_counter() - start
+        syscalls = self._local.stack.pop()[1]
+        with self._lock:
+            stat = self.stats.get(name)
+            if stat is None:
+                stat = self.stats[name] = [0, 0., 0]
+            stat[0] += call
+            stat[1] += duration
+            stat[2] += syscalls
+            if len(self.events) < self.max_events:
+                self.events.append((name, start, duration,
+                                    threading.get_ident(), syscalls))
+            else:
+                self.dropped_events += 1
+
+    def _syscall(self, name):
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            stack[-1][1] += 1
+            with self._lock:
+                self.syscalls[stack[-1][0], name] += 1
+
+    def reset(self):
+        """forgets everything recorded so far"""
+        with self._lock:
+            self.stats.clear()
+            self.syscalls.clear()
+            self.events = []
+            self.dropped_events = 0
+            self._t0 = time.perf_counter()
+
+    def info(self):
+        """:returns: dict of method: dict of calls, seconds, syscalls and
+                     syscalls by name"""
+        by_method = collections.defaultdict(dict)
+        for (method, syscall), count in self.syscalls.items():
+            by_method[method][syscall] = count
+        return {name: {"calls": calls, "seconds": seconds,
+                       "syscalls": syscalls,
+                       "syscalls_by_name": by_method.get(name, {})}
+                for name, (calls, seconds, syscalls) in self.stats.items()}
+
+    def summary(self, sort="seconds"):
+        """
+        table of the methods, the slowest first
+
+        :param sort: 'seconds', 'calls' or 'syscalls'
+        :rtype: str
+        """
+        column = {"calls": 0, "seconds": 1, "syscalls": 2}[sort]
+        rows = sorted(self.stats.items(), key=lambda item: -item[1][column])
+        width = max([len("method")] + [len(name) for name, _ in rows])
+        lines = ["{:<{}} {:>6} {:>10} {:>9} {:>10}".format(
+            "method", width, "calls", "total ms", "mean us", "syscalls")]
+        for name, (calls, seconds, syscalls) in rows:
+            lines.append("{:<{}} {:>6} {:>10.3f} {:>9.2f} {:>10}".format(
+                name, width, calls, seconds * 1e3,
+                seconds * 1e6 / max(calls, 1), syscalls))
+        return "\n".join(lines)
+
+    def write_trace(self, path):
+        """
+        writes the recorded calls as a Chrome trace JSON file, to be
+        opened in chrome://tracing or https://ui.perfetto.dev
+        """
+        pid = os.getpid()
+        events = [{"name": name, "cat": "EPath", "ph": "X", "pid": pid,
+                   "tid": tid, "ts": (start - self._t0) * 1e6,
+                   "dur": duration * 1e6, "args": {"syscalls": syscalls}}
+                  for name, start, duration, tid, syscalls in self.events]
+        with builtins.open(str(path), "w") as fd:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fd)
+
+    def __enter__(self):
+        global _profiler
+        self._previous, _profiler = _profiler, self
+        _instrument()
+        return self
+
+    def __exit__(self, *exc_info):
+        global _profiler
+        _profiler, self._previous = self._previous, None
+        _uninstrument()
+
+    def __repr__(self):
+        return "<Profiler {} methods, {} events>".format(len(self.stats),
+                                                         len(self.events))
+
+
+# profiler used by EPath, None when disabled
+_profiler = None
+# the instrumentation taken by enable_profiler, released by disable_profiler
+_profiler_enabled = False
+
+
+def enable_profiler(max_events=10 ** 6):
+    """installs a new Profiler recording all EPath calls
+
+    :rtype: Profiler
+    """
+    global _profiler, _profiler_enabled
+    with _instrument_lock:
+        enabled, _profiler_enabled = _profiler_enabled, True
+    if not enabled:
+        _instrument()
+    _profiler = Profiler(max_events=max_events)
+    return _profiler
+
+
+def disable_profiler():
+    """stops profiling and removes the instrumentation, unless a
+    Profiler context is still open"""
+    global _profiler, _profiler_enabled
+    _profiler = None
+    with _instrument_lock:
+        enabled, _profiler_enabled = _profiler_enabled, False
+    if enabled:
+        _uninstrument()
+
+
+def get_profiler():
+    """:returns: the Profiler in use, None if disabled"""
+    return _profiler
+
+
+def _profile_at_exit(profiler, trace):
+    disable_profiler()
+    print(profiler.summary(), file=sys.stderr)
+    if trace:
+        profiler.write_trace(trace)
+
+
+if os.environ.get("EPATH_PROFILE"):
+    atexit.register(_profile_at_exit, enable_profiler(),
+                    None if os.environ["EPATH_PROFILE"] == "1"
+                    else os.environ["EPATH_PROFILE"])
@@ -36,7 +36,11 @@ setup(
     description="This module contains tools for manipulating Linux paths.",
     license="MIT License",
     classifiers=classif,
-    install_requires=["pathlib", "opencv-python"]
+    install_requires=[],
+    extras_require={
+        "image": ["opencv-python", "numpy"],
+        "pandas": ["pandas", "pyarrow"],
+    },
 )
 
 